@@ -0,0 +1,198 @@
+"""Flag parsed entries whose fields don't add back up to the original entry.
+
+The checks from ai_output_accuracy_check.ipynb, computed a column at a time
+instead of with a row-wise apply. For each row the seven fields are stitched
+back together and compared with original_entry:
+
+* levenshtein: edit distance between the two strings with every non-word
+  character removed and lowercased
+* jaccard: token overlap of the two strings with non-word characters turned
+  into spaces and lowercased, computed only where levenshtein > 1 (1.0 otherwise)
+* flagged: levenshtein >= 1 and jaccard <= 0.99, or no author(s) and no title,
+  or no publisher
+
+Non-word characters are removed with one character class listing those that
+actually occur, so `\\W` keeps the `regex` module's meaning the notebook
+relied on; the edit distances come from rapidfuzz's bit-parallel
+pairwise routine in one call.
+
+    python accuracy_check.py
+    python accuracy_check.py --years 1917 1918 --jobs 4 --output flagged_entries.csv
+"""
+import sys, time, argparse
+import re as std_re
+import regex as re
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+from llm_prompt import fieldnames
+
+parsed_directory = Path.cwd().parent / 'parsed_dataframes'
+
+NON_WORD_RE = re.compile(r"\W")
+
+
+def non_word_pattern(texts):
+    """A plain character class of every non-word character occurring in texts."""
+    characters = set("".join(texts))
+    non_word = sorted(c for c in characters if NON_WORD_RE.match(c))
+    return std_re.compile("[" + std_re.escape("".join(non_word)) + "]" if non_word else "(?!)")
+
+
+def as_text(series):
+    """str() of every value, as a plain object column so .str uses Python semantics."""
+    return pd.Series([str(value) for value in series.to_numpy(dtype=object)], index=series.index, dtype=object)
+
+
+def stitch_fields(df):
+    """The parsed fields joined back into one string per row; missing fields count as a space."""
+    parts = [as_text(df[field]).where(df[field].notna(), " ") for field in fieldnames]
+    return parts[0].str.cat(parts[1:], sep=" ").str.strip()
+
+
+def levenshtein_strings(texts, non_word):
+    """texts as levenshtein compares them: non-word characters removed, lowercased."""
+    return texts.str.replace(non_word, "", regex=True).str.lower()
+
+
+def jaccard_tokens(texts, non_word):
+    """texts as jaccard compares them: lists of lowercase tokens between non-word characters."""
+    return texts.str.replace(non_word, " ", regex=True).str.lower().str.split()
+
+
+def jaccard_similarity(a_tokens, b_tokens):
+    """Token-level jaccard similarity."""
+    a, b = set(a_tokens), set(b_tokens)
+    union = len(a | b)
+    return len(a & b) / union if union != 0 else 0
+
+
+def token_diff(a, b):
+    """Show which tokens are shared vs only in original/parsed."""
+    a_tokens = set(NON_WORD_RE.sub(" ", a).split())
+    b_tokens = set(NON_WORD_RE.sub(" ", b).split())
+
+    shared = a_tokens & b_tokens
+    return {
+        'shared': sorted(shared),
+        'only_in_a': sorted(a_tokens - b_tokens),
+        'only_in_b': sorted(b_tokens - a_tokens),
+        'jaccard': len(shared) / len(a_tokens | b_tokens) if a_tokens | b_tokens else 1.0
+    }
+
+
+def score_frame(df, diff="flagged", workers=-1):
+    """Add levenshtein, jaccard, flagged and diff columns to a parsed dataframe.
+
+    diff is "all", "flagged" (token diffs for flagged rows only, the ones the
+    notebook prints) or "none". workers is passed to rapidfuzz; -1 uses every core.
+    """
+    df = df.copy()
+    original = as_text(df["original_entry"])
+    stitched = stitch_fields(df)
+
+    non_word = non_word_pattern(pd.concat([original, stitched]))
+
+    levenshtein = process.cpdist(levenshtein_strings(original, non_word).tolist(),
+                                 levenshtein_strings(stitched, non_word).tolist(),
+                                 scorer=Levenshtein.distance, workers=workers)
+
+    jaccard = np.ones(len(df))
+    rescore = np.flatnonzero(levenshtein > 1)
+    if len(rescore):
+        original_tokens = jaccard_tokens(original.iloc[rescore], non_word)
+        stitched_tokens = jaccard_tokens(stitched.iloc[rescore], non_word)
+        for i, a, b in zip(rescore, original_tokens, stitched_tokens):
+            jaccard[i] = jaccard_similarity(a, b)
+
+    df["levenshtein"] = levenshtein
+    df["jaccard"] = jaccard
+    df["flagged"] = (((levenshtein >= 1) & (jaccard <= 0.99))
+                     | (df["author(s)"].isna() & df["title"].isna()).to_numpy()
+                     | df["publisher"].isna().to_numpy())
+
+    df["diff"] = None
+    if diff != "none":
+        rows = np.arange(len(df)) if diff == "all" else np.flatnonzero(df["flagged"].to_numpy())
+        df.iloc[rows, df.columns.get_loc("diff")] = pd.Series(
+            [token_diff(original.iat[i], stitched.iat[i]) for i in rows], index=df.index[rows], dtype=object)
+    return df
+
+
+def score_year(year, directory=parsed_directory, diff="flagged", workers=-1):
+    """score_frame over one entries_YYYY.csv."""
+    return score_frame(pd.read_csv(Path(directory) / f"entries_{year}.csv"), diff, workers)
+
+
+def score_years(years, directory=parsed_directory, diff="flagged", jobs=1):
+    """Score several years, one process per year when jobs > 1; rows come back in year order."""
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            frames = list(executor.map(score_year, years, [directory] * len(years),
+                                       [diff] * len(years), [1] * len(years)))
+    else:
+        frames = [score_year(year, directory, diff) for year in years]
+    return pd.concat(frames, ignore_index=True)
+
+
+def print_entry(entry):
+    """Pretty-print a single entry for inspection."""
+    print(f"{entry['original_entry']}")
+    print("- - - - -")
+    for field in fieldnames:
+        print(f"{field}: {entry[field]}")
+    print(f"levenshtein: {entry['levenshtein']}")
+    print(f"jaccard: {entry['jaccard']}")
+    print(f"diff: {entry['diff']['shared']}")
+    print(f"only in original entry: {entry['diff']['only_in_a']}")
+    print(f"only in parsed entry: {entry['diff']['only_in_b']}")
+    print("–––––––\n")
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Flag LLM-parsed entries that lost or gained text.')
+    parser.add_argument("--years", type=str, nargs="+",
+            default=[str(year) for year in range(1912, 1923)])
+    parser.add_argument("--input", type=str,
+            help="Score one combined CSV (e.g. all_entries.csv) instead of the per-year files.",
+            default=None)
+    parser.add_argument("--directory", type=str, default=str(parsed_directory))
+    parser.add_argument("--jobs", type=int,
+            help="Score years in this many worker processes.",
+            default=1)
+    parser.add_argument("--output", type=str,
+            help="Write flagged entries, worst first, to this CSV.",
+            default=None)
+    parser.add_argument("--show", type=int,
+            help="Print this many of the worst flagged entries.",
+            default=0)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    start = time.perf_counter()
+    if args.input:
+        df = score_frame(pd.read_csv(args.input))
+    else:
+        df = score_years(args.years, args.directory, jobs=args.jobs)
+    seconds = time.perf_counter() - start
+
+    print(f"Total entries: {len(df)} (scored in {seconds:.2f}s)")
+    print(f"Flagged: {df['flagged'].sum()} ({df['flagged'].mean()*100:.1f}%)")
+    print(f"\nLevenshtein > 0: {(df['levenshtein'] > 0).sum()}")
+    print(f"Jaccard < 1.0: {(df['jaccard'] < 1.0).sum()}")
+    print(f"Jaccard < 0.9: {(df['jaccard'] < 0.9).sum()}")
+
+    low_accuracy = df[df['flagged']].sort_values('jaccard', kind="stable")
+    for _, entry in low_accuracy.head(args.show).iterrows():
+        print_entry(entry)
+
+    if args.output:
+        low_accuracy.to_csv(args.output, index=True)
+        print(f"Exported {len(low_accuracy)} flagged entries to {args.output}")
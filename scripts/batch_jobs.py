@@ -0,0 +1,357 @@
+"""Bulk parsing through a batch-job API instead of one generate_content call per entry.
+
+`submit` enqueues every year's main entries in the job queue (job_queue.py),
+answers what the response cache already holds, and claims the rest for a new
+batch: one request record per distinct entry text is written to
+batches/<batch id>/requests.jsonl, keyed by its response-cache key, and the
+file is handed to a backend. `poll` asks the backend about every open batch;
+when one has finished it streams the result file line by line through
+response_decoder.decode_answer (clean_parse's JSON repair plus the schema
+and conservation checks), caches and completes the jobs that pass, returns
+the rest to the queue, and rebuilds the affected years' parsed_dataframes
+CSVs from the queue.
+
+Backends:
+
+* gemini: the Gemini Batch API (files.upload + batches.create), billed at
+  batch rates with no client-side rate limiting;
+* local: a directory standing in for the service, answering each request
+  with stub_model_server.stub_parse (or recorded answers with --recorded)
+  once --delay seconds have passed; for testing the whole round trip offline.
+
+    python batch_jobs.py submit --backend local
+    python batch_jobs.py poll --wait --interval 60
+    python batch_jobs.py status
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+from job_queue import JobQueue, default_queue_path, materialise
+from response_cache import ResponseCache, cache_key, default_cache_path
+from response_decoder import DecodeStats, decode_answer, cached_rows
+from llm_prompt import model, generation_config, prompt, prompt_version
+
+batch_directory = Path.cwd().parent / 'batches'
+
+FINAL_STATES = ("collected", "failed")
+BATCH_LEASE_SECONDS = 3 * 24 * 3600  # past the batch API's 24h window, so online workers leave these jobs alone
+
+
+class GeminiBatchBackend:
+    """Batch jobs on the Gemini API: the request file is uploaded and run by batches.create."""
+
+    name = "gemini"
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, requests_path, display_name):
+        from google.genai import types
+        uploaded = self.client.files.upload(
+            file=str(requests_path), config=types.UploadFileConfig(display_name=display_name, mime_type="jsonl"))
+        job = self.client.batches.create(model=model, src=uploaded.name, config={"display_name": display_name})
+        return job.name
+
+    def status(self, remote):
+        """'running', 'succeeded' or 'failed'."""
+        state = self.client.batches.get(name=remote).state.name
+        if state in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            return "succeeded"
+        if state in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+            return "failed"
+        return "running"
+
+    def download(self, remote, results_path):
+        job = self.client.batches.get(name=remote)
+        Path(results_path).write_bytes(self.client.files.download(file=job.dest.file_name))
+
+
+class LocalBatchBackend:
+    """A directory standing in for the batch service: results appear once delay seconds have passed."""
+
+    name = "local"
+
+    def __init__(self, directory, delay=0.0, answer=None):
+        from stub_model_server import stub_parse
+        self.directory = Path(directory)
+        self.delay = delay
+        self.answer = answer or stub_parse
+
+    def submit(self, requests_path, display_name):
+        job_directory = self.directory / display_name
+        job_directory.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(requests_path, job_directory / "requests.jsonl")
+        (job_directory / "submitted").write_text(str(time.time()))
+        return str(job_directory)
+
+    def status(self, remote):
+        submitted = float((Path(remote) / "submitted").read_text())
+        return "succeeded" if time.time() - submitted >= self.delay else "running"
+
+    def download(self, remote, results_path):
+        """Answer every request, one line at a time, in the result-file shape the Gemini API writes."""
+        from stub_model_server import INPUT_MARKER
+        with open(Path(remote) / "requests.jsonl", "r", encoding="utf-8") as requests, \
+                open(results_path, "w", encoding="utf-8") as results:
+            for line in requests:
+                record = json.loads(line)
+                contents = record["request"]["contents"][0]["parts"][0]["text"]
+                text = self.answer(contents.split(INPUT_MARKER)[-1].strip())
+                response = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+                results.write(json.dumps({"key": record["key"], "response": response}, ensure_ascii=False) + "\n")
+
+
+def make_backend(args):
+    if args.backend == "gemini":
+        from llm_parser import load_client
+        return GeminiBatchBackend(load_client(args.base_url))
+    answer = None
+    if args.recorded:
+        from recorded_client import RecordedClient, load_recordings
+        recorded = RecordedClient(load_recordings(args.recorded))
+        answer = lambda entry: "```json\n" + json.dumps(recorded.answer(entry), ensure_ascii=False) + "\n```"
+    return LocalBatchBackend(batch_directory / "local_backend", args.delay, answer)
+
+
+def request_record(key, entry):
+    """One line of a batch request file: the key and a GenerateContentRequest."""
+    config = generation_config.model_dump(mode="json", exclude_none=True)
+    return {"key": key, "request": {"contents": [{"role": "user", "parts": [{"text": prompt + entry}]}],
+                                    "generation_config": config}}
+
+
+def result_text(record):
+    """(text, error) from one line of a batch result file."""
+    if record.get("error"):
+        return None, json.dumps(record["error"])
+    candidates = record.get("response", {}).get("candidates") or []
+    parts = candidates[0].get("content", {}).get("parts", []) if candidates else []
+    text = "".join(part.get("text", "") for part in parts).strip()
+    return (text, None) if text else (None, "empty response")
+
+
+def read_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest):
+    path = batch_directory / manifest["id"] / "batch.json"
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    temporary.replace(path)
+
+
+def submit(args, backend):
+    """Claim every pending job the cache can't answer and send them as one batch. Returns the manifest (or None)."""
+    from llm_parser import year_files, load_main_entries
+
+    queue = JobQueue(args.queue)
+    for file, file_name in year_files(args.classified):
+        queue.enqueue(file_name, load_main_entries(file, args.main_threshold))
+    queue.close()
+
+    batch_id = f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    queue = JobQueue(args.queue, worker=batch_id)
+    cache = ResponseCache(args.cache)
+    claimed = queue.claim(args.limit, lease_seconds=BATCH_LEASE_SECONDS)
+    keys = [cache_key(model, prompt_version, generation_config, entry) for _, entry in claimed]
+
+    # already answered: finish those jobs now instead of paying for them again
+    cached = {key: cached_rows(parsed) for key, (_, parsed) in cache.get_many(keys).items()}
+    queue.complete([(job_id, cached[key], None) for (job_id, _), key in zip(claimed, keys) if cached.get(key)],
+                   source="cache")
+    cache.close()
+
+    requests = {}
+    for (_, entry), key in zip(claimed, keys):
+        if not cached.get(key):
+            requests.setdefault(key, entry)
+    print(f"Claimed {len(claimed)} jobs: {len(claimed) - sum(1 for key in keys if not cached.get(key))} answered "
+          f"from the cache, {len(requests)} distinct entries to send")
+    if not requests:
+        queue.close()
+        return None
+
+    directory = batch_directory / batch_id
+    directory.mkdir(parents=True, exist_ok=True)
+    requests_path = directory / "requests.jsonl"
+    with open(requests_path, "w", encoding="utf-8") as f:
+        for key, entry in requests.items():
+            f.write(json.dumps(request_record(key, entry), ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    manifest = {"id": batch_id, "backend": backend.name, "remote": None, "state": "submitting",
+                "requests": len(requests), "jobs": len(claimed), "created": time.time(), "queue": str(args.queue)}
+    write_manifest(manifest)
+    try:
+        manifest["remote"] = backend.submit(requests_path, batch_id)
+    except Exception:
+        # nothing was sent: give the jobs back
+        queue.release()
+        manifest["state"] = "failed"
+        write_manifest(manifest)
+        raise
+    manifest["state"] = "running"
+    write_manifest(manifest)
+    queue.close()
+    print(f"Submitted {batch_id} ({manifest['requests']} requests) as {manifest['remote']}")
+    return manifest
+
+
+def collect(manifest, backend, cache_path, max_attempts=3, chunk_size=500):
+    """Stream a finished batch's results into the cache and the queue. Returns (decode stats, years touched)."""
+    queue = JobQueue(manifest["queue"], worker=manifest["id"])
+    # this batch's jobs, grouped by the request key they were sent under
+    jobs = {}
+    for job_id, entry, year in queue.db.execute(
+            "SELECT id, entry, year FROM jobs WHERE state = 'in_flight' AND worker = ?", (manifest["id"],)):
+        jobs.setdefault(cache_key(model, prompt_version, generation_config, entry), []).append((job_id, entry, year))
+
+    results_path = batch_directory / manifest["id"] / "results.jsonl"
+    backend.download(manifest["remote"], results_path)
+
+    cache = ResponseCache(cache_path)
+    stats, years = DecodeStats(), set()
+    passed, failures, new_rows = [], [], []
+
+    def flush():
+        cache.put_many(new_rows)
+        queue.complete(passed, source="batch")
+        queue.fail(failures, max_attempts)
+        passed.clear(), failures.clear(), new_rows.clear()
+
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key_jobs = jobs.pop(record.get("key"), [])
+            if not key_jobs:
+                continue
+            text, error = result_text(record)
+            entry = key_jobs[0][1]
+            answer = decode_answer(text, entry) if text is not None else None
+            if answer is not None:
+                stats.record(answer)
+            for job_id, _, year in key_jobs:
+                years.add(year)
+                if answer is not None and answer.problem is None:
+                    passed.append((job_id, answer.rows, text))
+                else:
+                    failures.append((job_id, error or answer.problem, answer.rows if answer else None, text))
+            if answer is not None and answer.problem is None:
+                new_rows.append((record["key"], entry, text, answer.rows[0] if len(answer.rows) == 1 else answer.rows))
+            elif answer is not None:
+                stats.unresolved += 1
+            if len(passed) + len(failures) >= chunk_size:
+                flush()
+
+    # requests the service dropped go back to the queue
+    for key_jobs in jobs.values():
+        for job_id, _, year in key_jobs:
+            years.add(year)
+            failures.append((job_id, "missing from the batch results", None, None))
+    flush()
+    cache.close()
+    queue.close()
+    return stats, years
+
+
+def poll(args, backend, parsed_directory, batch_size):
+    """Check every open batch once, collecting finished ones. Returns the batches still running."""
+    running = 0
+    for path in sorted(batch_directory.glob("batch-*/batch.json")):
+        manifest = read_manifest(path)
+        if manifest["state"] in FINAL_STATES or manifest["backend"] != backend.name or manifest["remote"] is None:
+            continue
+        state = backend.status(manifest["remote"])
+        if state == "running":
+            running += 1
+            print(f"{manifest['id']}: running ({manifest['requests']} requests)")
+            continue
+
+        years = set()
+        if state == "succeeded":
+            stats, years = collect(manifest, backend, args.cache, args.max_attempts)
+            decoding = stats.summary()
+            manifest.update(state="collected", decoding=decoding)
+            print(f"{manifest['id']}: {decoding['answers']} answers, {decoding['clean']} clean, "
+                  f"{decoding['repaired']} repaired, {decoding['failed']} failed checks (back in the queue)")
+        else:
+            queue = JobQueue(manifest["queue"], worker=manifest["id"])
+            failed = queue.db.execute("SELECT id, year FROM jobs WHERE state = 'in_flight' AND worker = ?",
+                                      (manifest["id"],)).fetchall()
+            queue.fail([(job_id, "batch job failed", None, None) for job_id, _ in failed], args.max_attempts)
+            queue.close()
+            years = {year for _, year in failed}
+            manifest["state"] = "failed"
+            print(f"{manifest['id']}: the batch job failed; its {len(failed)} jobs are back in the queue")
+        manifest["finished"] = time.time()
+        write_manifest(manifest)
+
+        queue = JobQueue(manifest["queue"])
+        for year in sorted(years):
+            materialise(queue, year, parsed_directory, batch_size)
+        queue.close()
+    return running
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Parse entries in bulk through a batch-job API.')
+    parser.add_argument("command", choices=["submit", "poll", "status"])
+    parser.add_argument("--backend", choices=["gemini", "local"], default="gemini")
+    parser.add_argument("--queue", type=str, default=str(default_queue_path))
+    parser.add_argument("--cache", type=str, default=str(default_cache_path))
+    parser.add_argument("--limit", type=int,
+            help="submit: most jobs in one batch.",
+            default=50000)
+    parser.add_argument("--classified", action="store_true",
+            help="submit: also enqueue the years in entries/classified_entries (see llm_parser.py).")
+    parser.add_argument("--main-threshold", type=float, default=None)
+    parser.add_argument("--max-attempts", type=int,
+            help="poll: tries before a job that keeps failing is left failed.",
+            default=3)
+    parser.add_argument("--wait", action="store_true",
+            help="poll: keep polling until no batch is running.")
+    parser.add_argument("--interval", type=float,
+            help="poll --wait: seconds between polls.",
+            default=60.0)
+    parser.add_argument("--base-url", type=str, default=None)
+    parser.add_argument("--delay", type=float,
+            help="local backend: seconds before a batch counts as finished.",
+            default=0.0)
+    parser.add_argument("--recorded", type=str,
+            help="local backend: answer from the recorded parses in this parsed_dataframes directory.",
+            default=None)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    if args.command == "status":
+        for path in sorted(batch_directory.glob("batch-*/batch.json")):
+            manifest = read_manifest(path)
+            print(f"{manifest['id']}  {manifest['backend']:<7}{manifest['state']:<11}{manifest['requests']:>8} requests"
+                  f"{manifest['jobs']:>8} jobs  {manifest['remote'] or ''}")
+        sys.exit()
+
+    backend = make_backend(args)
+    if args.command == "submit":
+        submit(args, backend)
+        sys.exit()
+
+    from llm_parser import parsed_dataframe_directory, file_batch_size
+    while poll(args, backend, parsed_dataframe_directory, file_batch_size) and args.wait:
+        time.sleep(args.interval)
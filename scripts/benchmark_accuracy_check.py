@@ -0,0 +1,119 @@
+import sys, time, argparse
+import regex as re
+import numpy as np
+import pandas as pd
+from Levenshtein import distance
+from accuracy_check import parsed_directory, score_frame, score_years
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Time accuracy_check.py against the notebook\'s row-wise apply and check they agree.')
+    parser.add_argument("--years", type=str, nargs="+",
+            default=[str(year) for year in range(1912, 1923)])
+    parser.add_argument("--jobs", type=int, nargs="+",
+            help="Process counts to time the per-year fan-out with.",
+            default=[2, 4])
+    parser.add_argument("--skip-legacy", action="store_true",
+            help="Only time the vectorised check.")
+    return parser.parse_args(args)
+
+
+# ai_output_accuracy_check.ipynb as it was, for timing and for checking the new scores against
+def legacy_entry_clean(entry):
+    fields = ['opening_bits', 'author(s)', 'title', 'format', 'little_bits', 'publisher', 'date']
+    parts = [str(entry[field]) if pd.notna(entry[field]) else ' ' for field in fields]
+    return ' '.join(parts).strip()
+
+
+def legacy_strip_string_levenshtein(entry):
+    if not isinstance(entry, str) or pd.isna(entry):
+        return ''
+    return re.sub(r"[\W]", "", entry).lower()
+
+
+def legacy_strip_string(entry):
+    return " ".join(re.sub(r"\W", " ", entry).split())
+
+
+def legacy_jaccard_similarity(str1, str2):
+    set1 = set(str1.split())
+    set2 = set(str2.split())
+    intersection = len(set1.intersection(set2))
+    union = len(set1.union(set2))
+    return intersection / union if union != 0 else 0
+
+
+def legacy_token_diff(a, b):
+    a_tokens = set(legacy_strip_string(a).split())
+    b_tokens = set(legacy_strip_string(b).split())
+    shared = a_tokens & b_tokens
+    return {
+        'shared': sorted(shared),
+        'only_in_a': sorted(a_tokens - b_tokens),
+        'only_in_b': sorted(b_tokens - a_tokens),
+        'jaccard': len(shared) / len(a_tokens | b_tokens) if a_tokens | b_tokens else 1.0
+    }
+
+
+def legacy_compute_row_scores(row):
+    stiched_entry = legacy_entry_clean(row)
+    lev_score = distance(legacy_strip_string_levenshtein(str(row['original_entry'])),
+                         legacy_strip_string_levenshtein(stiched_entry))
+    if lev_score > 1:
+        jaccard_score = legacy_jaccard_similarity(legacy_strip_string(str(row['original_entry'])).lower(),
+                                                  legacy_strip_string(stiched_entry).lower())
+    else:
+        jaccard_score = 1.0
+    flagged = (lev_score >= 1) and (jaccard_score <= 0.99)
+    diff = legacy_token_diff(str(row['original_entry']), stiched_entry)
+    return pd.Series({'levenshtein': lev_score, 'jaccard': jaccard_score,
+                      'flagged_for_correction': flagged, 'diff': diff})
+
+
+def legacy_score_frame(df):
+    df = df.copy()
+    df[['levenshtein', 'jaccard', 'flagged', 'diff']] = df.apply(legacy_compute_row_scores, axis=1)
+    df.loc[(df['author(s)'].isna()) & (df['title'].isna()), 'flagged'] = True
+    df.loc[df['publisher'].isna(), 'flagged'] = True
+    return df
+
+
+def mismatches(new_df, legacy_df):
+    """Rows whose levenshtein, jaccard, flag, or (flagged rows') token diff differ."""
+    same = ((new_df["levenshtein"].to_numpy() == legacy_df["levenshtein"].astype(int).to_numpy())
+            & (new_df["jaccard"].to_numpy() == legacy_df["jaccard"].astype(float).to_numpy())
+            & (new_df["flagged"].to_numpy() == legacy_df["flagged"].astype(bool).to_numpy()))
+    flagged = np.flatnonzero(new_df["flagged"].to_numpy())
+    same[flagged] &= [new_df["diff"].iat[i] == legacy_df["diff"].iat[i] for i in flagged]
+    return int((~same).sum())
+
+
+def time_call(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    frames, read_seconds = time_call(lambda: [pd.read_csv(parsed_directory / f"entries_{year}.csv")
+                                              for year in args.years])
+    rows = sum(len(frame) for frame in frames)
+    print(f"{len(args.years)} years, {rows} entries (reading the CSVs: {read_seconds:.2f}s)\n")
+    print(f"{'method':<28}{'seconds':>9}{'entries/s':>12}{'mismatches':>12}")
+
+    new_frames, seconds = time_call(lambda: [score_frame(frame) for frame in frames])
+    print(f"{'vectorised':<28}{seconds:>9.2f}{rows / seconds:>12,.0f}{'':>12}")
+
+    for jobs in args.jobs:
+        _, seconds = time_call(score_years, args.years, jobs=jobs)
+        print(f"{f'vectorised, --jobs {jobs} (+read)':<28}{seconds:>9.2f}{rows / seconds:>12,.0f}{'':>12}")
+
+    if not args.skip_legacy:
+        legacy_frames, seconds = time_call(lambda: [legacy_score_frame(frame) for frame in frames])
+        different = sum(mismatches(new, legacy) for new, legacy in zip(new_frames, legacy_frames))
+        print(f"{'row-wise apply (notebook)':<28}{seconds:>9.2f}{rows / seconds:>12,.0f}{different:>12}")
+        if different:
+            sys.exit(1)
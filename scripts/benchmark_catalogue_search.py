@@ -0,0 +1,78 @@
+import sys, time, argparse
+import numpy as np
+from catalogue_search import (CatalogueIndex, default_index_path, document_columns, normalise,
+                              author_surnames, title_trigrams, parse_year)
+from parsed_store import store_directory, load_parsed
+
+queries = [
+    {"publisher": "CONSTABLE", "year": "'18"},
+    {"author": "Pollock"},
+    {"author": "Pollock", "title": "law of torts"},
+    {"publisher": "MACMILLAN"},
+    {"author": "Smith", "year": "1915"},
+    {"author": "Shak*"},
+    {"title": "Spcctre gold"},
+    {"title": "history of england"},
+    {"title": "the"},
+]
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Query latency of catalogue_search.py against a pandas full scan.')
+    parser.add_argument("--repeat", type=int,
+            help="Runs per query; the table shows the median and the slowest.",
+            default=50)
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    return parser.parse_args(args)
+
+
+def full_scan(df, title=None, author=None, publisher=None, year=None, min_score=0.6):
+    """The same query by scanning every row, as one would with the dataframe alone."""
+    keep = np.ones(len(df), dtype=bool)
+    if author:
+        prefix = author.endswith("*")
+        key = normalise(author.rstrip("*"))
+        keep &= np.array([any(s.startswith(key) if prefix else s == key for s in author_surnames(a))
+                          for a in df["author(s)"]])
+    if publisher:
+        keep &= np.array([isinstance(p, str) and normalise(p) == normalise(publisher) for p in df["publisher"]])
+    if year is not None:
+        keep &= df["catalogue_year"].to_numpy() == parse_year(year)
+    if title:
+        grams = title_trigrams(title)
+        keep &= np.array([isinstance(t, str) and len(grams & title_trigrams(t)) / len(grams) >= min_score
+                          for t in df["title"]])
+    return np.flatnonzero(keep)
+
+
+def timings(function, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, np.median(seconds), max(seconds)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    CatalogueIndex.open(default_index_path, store_directory)  # build if missing or stale
+    index, load_seconds, _ = timings(lambda: CatalogueIndex.open(default_index_path, store_directory), 3)
+    df, scan_load_seconds, _ = timings(lambda: load_parsed(columns=document_columns), 3)
+    print(f"index load {load_seconds * 1000:.0f} ms, store load for scanning {scan_load_seconds * 1000:.0f} ms\n")
+
+    print(f"{'query':<42}{'matches':>8}{'index ms':>10}{'max ms':>8}{'scan ms':>10}{'speedup':>9}  same")
+    all_same = True
+    for query in queries:
+        (total, _), median, slowest = timings(lambda: index.search(**query, limit=20), args.repeat)
+        scanned, scan_median, _ = timings(lambda: full_scan(df, **query), args.scan_repeat)
+        same = np.array_equal(np.sort(index.match(**query)[0]), scanned)
+        all_same &= same
+        label = ", ".join(f"{key}={value}" for key, value in query.items())
+        print(f"{label:<42}{total:>8}{median * 1000:>10.2f}{slowest * 1000:>8.2f}{scan_median * 1000:>10.1f}"
+              f"{scan_median / median:>8.0f}x  {'yes' if same else 'NO'}")
+
+    if not all_same:
+        sys.exit("Index and full scan disagree.")
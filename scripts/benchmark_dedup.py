@@ -0,0 +1,101 @@
+import sys, time, argparse
+import numpy as np
+import pandas as pd
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+from dedup_entries import entry_texts, find_duplicates, verify_pairs
+from accuracy_check import non_word_pattern, levenshtein_strings, jaccard_tokens
+from parsed_store import load_parsed
+
+OCR_CONFUSIONS = {"e": "c", "c": "e", "n": "u", "u": "n", "l": "1", "i": "l", "o": "0", "h": "b", "s": "a"}
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Timings and recall of dedup_entries.py on the catalogue and a 10x synthetic corpus.')
+    parser.add_argument("--scale", type=int,
+            help="Copies of the catalogue in the synthetic corpus.",
+            default=10)
+    parser.add_argument("--sample", type=int,
+            help="Entries compared against every other entry to measure LSH recall.",
+            default=300)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    return parser.parse_args(args)
+
+
+def perturb(text, random, rate=0.03):
+    """Text with OCR-like slips: swapped look-alike letters and dropped characters."""
+    if not isinstance(text, str):
+        return text
+    characters = []
+    for character in text:
+        roll = random.random()
+        if roll < rate / 3:
+            continue
+        characters.append(OCR_CONFUSIONS.get(character, character) if roll < rate else character)
+    return "".join(characters)
+
+
+def synthetic_corpus(df, scale, seed=0):
+    """scale copies of df; every copy after the first has perturbed authors and titles."""
+    random = np.random.default_rng(seed)
+    copies = [df]
+    for _ in range(scale - 1):
+        copy = df.copy()
+        for column in ("author(s)", "title"):
+            copy[column] = [perturb(value, random) for value in copy[column]]
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def brute_force_recall(df, clusters, sample, min_ratio, min_jaccard, seed=0):
+    """Share of truly close pairs (sampled entry vs every entry) that ended up in the same cluster."""
+    texts = entry_texts(df)
+    non_word = non_word_pattern(texts)
+    lev_strings = levenshtein_strings(texts, non_word).tolist()
+    tokens = jaccard_tokens(texts, non_word).tolist()
+    labels = clusters["cluster_id"].to_numpy()
+
+    random = np.random.default_rng(seed)
+    found = total = 0
+    for i in random.choice(np.flatnonzero([bool(s) for s in lev_strings]), size=sample, replace=False):
+        # edit-distance prefilter over everything, then the real check on what passes
+        distances = process.cdist([lev_strings[i]], lev_strings, scorer=Levenshtein.distance, workers=-1)[0]
+        lengths = np.maximum(np.fromiter(map(len, lev_strings), dtype=np.int64), len(lev_strings[i]))
+        others = np.flatnonzero(1 - distances / np.maximum(lengths, 1) >= min_ratio)
+        others = others[(others != i) & np.array([bool(lev_strings[j]) for j in others], dtype=bool)]
+        pairs = np.stack([np.full(len(others), i), others], axis=1)
+        close = others[verify_pairs(pairs, lev_strings, tokens, min_ratio, min_jaccard)]
+        total += len(close)
+        found += (labels[close] == labels[i]).sum()
+    return found / total if total else 1.0, total
+
+
+def report(name, df, clusters, stats, seconds):
+    stages = ", ".join(f"{stage} {stats[stage]:.2f}s" for stage in ("normalise", "minhash", "lsh", "verify", "cluster"))
+    repeated = (clusters["cluster_size"] > 1).sum()
+    print(f"{name:<18}{len(df):>9}{seconds:>9.2f}{stats['candidates']:>12}{stats['verified']:>10}{repeated:>10}  {stages}")
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    df = load_parsed(columns=["author(s)", "title", "catalogue_year"])
+    print(f"{'corpus':<18}{'entries':>9}{'seconds':>9}{'candidates':>12}{'verified':>10}{'in groups':>10}  stages")
+    results = {}
+    for name, corpus in [("catalogue", df), (f"synthetic {args.scale}x", synthetic_corpus(df, args.scale))]:
+        start = time.perf_counter()
+        clusters, stats = find_duplicates(corpus)
+        seconds = time.perf_counter() - start
+        report(name, corpus, clusters, stats, seconds)
+        results[name] = (corpus, clusters, seconds)
+
+    base_seconds = results["catalogue"][2]
+    scaled_seconds = results[f"synthetic {args.scale}x"][2]
+    print(f"\n{args.scale}x the entries took {scaled_seconds / base_seconds:.1f}x the time")
+
+    corpus, clusters, _ = results["catalogue"]
+    recall, pairs = brute_force_recall(corpus, clusters, args.sample, 0.85, 0.6)
+    print(f"LSH recall against brute force on {args.sample} sampled entries: {recall:.3f} of {pairs} close pairs")
+    if recall < args.min_recall:
+        sys.exit(f"Recall {recall:.3f} is below {args.min_recall}")
@@ -0,0 +1,165 @@
+import io
+import os
+import re
+import sys
+import time
+import argparse
+import contextlib
+import tracemalloc
+
+from create_entries import (
+    get_entries, get_file_path, get_header_patterns, get_splitters_by_year,
+    remove_patterns, write_entries,
+)
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Time get_entries against the original splitter and check its output.')
+    parser.add_argument("--years", type=str, nargs="+",
+            help="Two-digit catalogue years to benchmark.",
+            default=[str(year) for year in range(12, 23)])
+    parser.add_argument("--skip-legacy", action="store_true",
+            help="Only time the current splitter (the original takes minutes).")
+    parser.add_argument("--memory", action="store_true",
+            help="Report tracemalloc peak memory per year instead of time.")
+    parsed_args = parser.parse_args(args)
+    return parsed_args
+
+def legacy_get_entries(year_string, file_path, pattern, verbose):
+    """The original get_entries, kept verbatim (bar the year global) as the timing baseline."""
+    infile = open(file_path, "r", encoding="utf-8", errors="ignore")
+    contents = infile.read()
+    infile.close()
+
+    front_pattern, appendix_pattern, year_variations = get_splitters_by_year(year_string)
+
+    text_raw = re.split(front_pattern, contents)
+    front_matter = text_raw[0]
+    document_page_delta = len(front_matter.split("\f")) - 2
+    ecb_content = text_raw[1]
+
+    appendix_list = re.split(appendix_pattern, ecb_content, flags=re.DOTALL)
+    ecb_content = appendix_list[0]
+
+    ecb_pages = ecb_content.split("\f")
+    ecb_pe = [remove_patterns(page, pattern) for page in ecb_pages]
+
+    entry_terminator_regex = r'(\W({})\.?$)'.format('|'.join(year_variations))
+    ecb_pe = [re.sub(entry_terminator_regex, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>".format(i, i+document_page_delta), page, flags=re.M) for i, page in enumerate(ecb_pe, start=1)]
+    ecb_pe = [re.split(r"<ENTRY_CUT>", page, flags=re.M) for page in ecb_pe]
+
+    entries = [
+        re.sub(r"\n", " ", entry.strip()) for entries in ecb_pe for entry in entries
+    ]
+
+    month_abbrvs = [
+        "Jan", "Feb", "Mar", "Apr", "May", "June",
+        "July", "Aug", "Sept", "Oct", "Nov", "Dec",
+    ]
+
+    line_mid_re = re.compile(r".*({})\.?\W{}\.?[^\.]+".format("|".join(month_abbrvs), year_string))
+    line_mid_entries = [entry for entry in entries if line_mid_re.search(entry)]
+
+    split_line_mid_re = re.compile(r"(({})\.?\W{}\.?(?!$))".format("|".join(month_abbrvs), year_string))
+    line_mid_index = [entries.index(entry) for entry in line_mid_entries]
+
+    counter = 0
+    for index in line_mid_index:
+        match = re.search(r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>", entries[index + counter])
+        if match:
+            page_num, document_page_num = match.group(1), match.group(2)
+            entries[index + counter] = re.sub(split_line_mid_re, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>\\1<ENTRY_CUT>".format(page_num, document_page_num), entries[index + counter])
+        else:
+            entries[index + counter] = re.sub(split_line_mid_re, "\\1<ENTRY_CUT>", entries[index + counter])
+        new_entry = re.split(r"<ENTRY_CUT>", entries[index + counter], flags=re.M)
+        new_entry[1] = re.sub(r"^\W+(?=[A-Z])", "", new_entry[1])
+        entries[index + counter] = new_entry[1]
+        entries.insert(index + counter, new_entry[0])
+        counter += 1
+
+    return entries
+
+def time_call(function, *args):
+    """Run function(*args) with stdout silenced, returning (result, seconds)."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+def peak_memory(function, *args):
+    """Run function(*args) with stdout silenced, returning (result, peak traced bytes, bytes still held by the result)."""
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, held
+
+def report_memory(years, cwd_path, skip_legacy):
+    """Peak Python heap per year; the mmap'd file itself is page cache, not heap, so it isn't counted."""
+    print(f"{'year':<6}{'file MB':>9}{'legacy peak':>13}{'new peak':>10}{'output':>9}{'reduction':>11}")
+    for year_string in years:
+        file_path = get_file_path(year_string, cwd_path)
+        header_patterns = get_header_patterns(year_string)
+        get_entries(year_string, file_path, header_patterns, False)  # compile and cache the patterns first
+
+        _, new_peak, held = peak_memory(get_entries, year_string, file_path, header_patterns, False)
+        if skip_legacy:
+            legacy_cell, reduction_cell = "-", "-"
+        else:
+            _, legacy_peak, _ = peak_memory(legacy_get_entries, year_string, file_path, header_patterns, False)
+            legacy_cell, reduction_cell = f"{legacy_peak / 1e6:.1f}", f"{legacy_peak / new_peak:.1f}x"
+
+        file_mb = os.path.getsize(file_path) / 1e6
+        print(f"19{year_string:<4}{file_mb:>9.1f}{legacy_cell:>13}{new_peak / 1e6:>10.1f}{held / 1e6:>9.1f}{reduction_cell:>11}")
+    print("(MB; output is what the returned entry list itself holds)")
+
+def matches_extracted_csv(entries, csv_path):
+    """True if entries serialise to exactly the bytes of an existing entries CSV."""
+    tmp_path = csv_path + ".bench"
+    try:
+        write_entries(entries, tmp_path)
+        with open(tmp_path, "rb") as new, open(csv_path, "rb") as old:
+            return new.read() == old.read()
+    finally:
+        os.remove(tmp_path)
+
+if __name__ == "__main__":
+
+    args = argparse_create((sys.argv[1:]))
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    extracted_directory = f"{cwd_path}/entries/extracted_entries"
+
+    if args.memory:
+        report_memory(args.years, cwd_path, args.skip_legacy)
+        sys.exit()
+
+    print(f"{'year':<6}{'entries':>9}{'legacy s':>11}{'new s':>9}{'speedup':>9}  output")
+    total_legacy, total_new, all_match = 0.0, 0.0, True
+
+    for year_string in args.years:
+        file_path = get_file_path(year_string, cwd_path)
+        header_patterns = get_header_patterns(year_string)
+
+        entries, new_seconds = time_call(get_entries, year_string, file_path, header_patterns, False)
+        total_new += new_seconds
+
+        if args.skip_legacy:
+            legacy_cell, speedup_cell = "-", "-"
+        else:
+            legacy, legacy_seconds = time_call(legacy_get_entries, year_string, file_path, header_patterns, False)
+            total_legacy += legacy_seconds
+            if legacy != entries:
+                all_match = False
+            legacy_cell = f"{legacy_seconds:.2f}"
+            speedup_cell = f"{legacy_seconds / new_seconds:.1f}x"
+
+        same = matches_extracted_csv(entries, f"{extracted_directory}/entries_19{year_string}.csv")
+        all_match = all_match and same
+
+        print(f"19{year_string:<4}{len(entries):>9}{legacy_cell:>11}{new_seconds:>9.2f}{speedup_cell:>9}  {'identical' if same else 'DIFFERS'}")
+
+    print(f"{'total':<6}{'':>9}{total_legacy:>11.2f}{total_new:>9.2f}")
+
+    if not all_match:
+        sys.exit("Output differs from entries/extracted_entries.")
@@ -0,0 +1,77 @@
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+
+from create_entries import PAGE_TAG_RE, get_entries, get_file_path, get_header_patterns, write_entries
+from entry_table import build_year, GAPS, LINE_MID_FIRST
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Check entry tables against get_entries and compare their size and speed.')
+    parser.add_argument("--years", type=str, nargs="+",
+            help="Two-digit catalogue years to benchmark.",
+            default=["{:02d}".format(year) for year in range(2, 23)])
+    parsed_args = parser.parse_args(args)
+    return parsed_args
+
+def string_bytes(entries):
+    """Memory held by a list of entry strings: the list's pointers and every str object."""
+    return sys.getsizeof(entries) + sum(sys.getsizeof(entry) for entry in entries)
+
+def exported_csv(table, entries, directory):
+    """(table.export_csv bytes, write_entries bytes) for the same year."""
+    table.export_csv(os.path.join(directory, "table.csv"))
+    write_entries(entries, os.path.join(directory, "entries.csv"))
+    with open(os.path.join(directory, "table.csv"), "rb") as a, open(os.path.join(directory, "entries.csv"), "rb") as b:
+        return a.read(), b.read()
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    print(f"{'year':<6}{'entries':>9}{'str bytes':>12}{'table bytes':>13}{'ratio':>7}{'gaps':>7}{'splits':>8}"
+          f"{'get_entries s':>15}{'build s':>9}{'text us':>9}")
+    failures = []
+    totals = [0, 0, 0]
+    for year_string in args.years:
+        file_path, header_patterns = get_file_path(year_string, cwd_path), get_header_patterns(year_string)
+
+        # get_entries prints notes about line-mid splits; both sides are quiet here
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            entries = get_entries(year_string, file_path, header_patterns, False)
+            legacy_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            table = build_year(year_string, file_path, header_patterns)
+            build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        clean = list(table.texts())
+        text_us = (time.perf_counter() - start) / len(table) * 1e6
+
+        legacy = list(table.texts(legacy=True))
+        if legacy != entries:
+            differing = sum(a != b for a, b in zip(legacy, entries)) + abs(len(legacy) - len(entries))
+            failures.append(f"19{year_string}: {differing} entries differ from get_entries")
+        with tempfile.TemporaryDirectory() as directory:
+            exported, written = exported_csv(table, entries, directory)
+        if exported != written:
+            failures.append(f"19{year_string}: the CSV export differs from create_entries.py's")
+        tagged = sum(PAGE_TAG_RE.sub("", entry) != text for entry, text in zip(entries, clean))
+        if tagged:
+            failures.append(f"19{year_string}: {tagged} entries' text isn't get_entries' less its page tag")
+
+        str_bytes, table_bytes = string_bytes(entries), table.nbytes()
+        totals = [totals[0] + len(table), totals[1] + str_bytes, totals[2] + table_bytes]
+        print(f"19{year_string:<4}{len(table):>9}{str_bytes:>12,}{table_bytes:>13,}{str_bytes / table_bytes:>7.1f}"
+              f"{int((table.flags & GAPS > 0).sum()):>7}{int((table.flags & LINE_MID_FIRST > 0).sum()):>8}"
+              f"{legacy_seconds:>15.2f}{build_seconds:>9.2f}{text_us:>9.2f}")
+        table.close()
+
+    print(f"{'total':<6}{totals[0]:>9}{totals[1]:>12,}{totals[2]:>13,}{totals[1] / totals[2]:>7.1f}")
+    if failures:
+        sys.exit("\n".join(failures))
@@ -0,0 +1,67 @@
+import sys, time, asyncio, argparse
+import pandas as pd
+from pathlib import Path
+from llm_engine import make_client, RequestEngine
+from stub_model_server import start_stub_server
+from llm_prompt import prompt, model, generation_config, clean_parse
+from llm_parser import corrected_entries_directory
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Measure RequestEngine throughput against a local stub model server.')
+    parser.add_argument("--concurrency", type=int, nargs="+",
+            help="Concurrency levels to measure.",
+            default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--entries", type=int,
+            help="Entries sent at each concurrency level.",
+            default=200)
+    parser.add_argument("--latency", type=float,
+            help="Mean stub response time in seconds.",
+            default=0.2)
+    parser.add_argument("--quota", type=float,
+            help="Stub requests/sec before it answers 429 (0 = unlimited).",
+            default=0)
+    parser.add_argument("--base-url", type=str,
+            help="Measure an already running server instead of starting one.",
+            default=None)
+    return parser.parse_args(args)
+
+
+def sample_entries(count, year_file="entries_1917.csv"):
+    """The first `count` main entries of one hand-corrected year."""
+    entries_df = pd.read_csv(Path(corrected_entries_directory) / year_file)
+    return list(entries_df[entries_df["main_entry"] == True]["entry"][:count])
+
+
+async def measure(base_url, entries, concurrency):
+    client = make_client("stub", base_url)
+    engine = RequestEngine(client, model, generation_config, concurrency=concurrency,
+                           rate=max(1.0, concurrency * 10), base_delay=0.2)
+    start = time.perf_counter()
+    outputs = await engine.generate_all([prompt + str(entry) for entry in entries])
+    seconds = time.perf_counter() - start
+    parsed = sum(1 for output in outputs if not isinstance(output, Exception) and clean_parse(output))
+    return seconds, parsed, engine
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    entries = sample_entries(args.entries)
+
+    server, base_url = None, args.base_url
+    if base_url is None:
+        server, base_url = start_stub_server(latency=args.latency, quota=args.quota)
+
+    print(f"{'workers':>8}{'entries/s':>11}{'parsed':>8}{'retries':>9}{'429s':>6}{'p50 s':>8}{'p95 s':>8}{'final rate':>12}")
+    for concurrency in args.concurrency:
+        seconds, parsed, engine = asyncio.run(measure(base_url, entries, concurrency))
+        stats = engine.stats.summary()
+        print(f"{concurrency:>8}{len(entries) / seconds:>11.1f}{parsed:>8}{stats['retries']:>9}{stats['throttled']:>6}"
+              f"{stats['latency_p50']:>8.3f}{stats['latency_p95']:>8.3f}{engine.bucket.rate:>12.1f}")
+
+    # the old loop: one call at a time plus a fixed 1.2s sleep
+    print(f"\nsequential loop with sleep(1.2) at {args.latency}s latency: {1 / (args.latency + 1.2):.2f} entries/s")
+
+    if server is not None:
+        server.shutdown()
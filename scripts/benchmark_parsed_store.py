@@ -0,0 +1,46 @@
+import sys, time, argparse
+import pandas as pd
+from parsed_store import parsed_directory, store_directory, load_parsed, stored_years
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Load times for the parsed data: CSV roll-ups vs. the Parquet store.')
+    parser.add_argument("--repeat", type=int,
+            help="Take the best of this many runs.",
+            default=3)
+    return parser.parse_args(args)
+
+
+def best_time(function, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    years = stored_years(store_directory)
+    if not years:
+        sys.exit(f"No store in {store_directory}; run `python parsed_store.py compact` first")
+
+    cases = [
+        ("CSV roll-ups, all years", lambda: pd.concat(
+            [pd.read_csv(parsed_directory / f"entries_{year}.csv") for year in years], ignore_index=True)),
+        ("CSV batches, all years", lambda: pd.concat(
+            [pd.read_csv(batch_file) for year in years
+             for batch_file in (parsed_directory / f"entries_{year}").glob("*_batch_*.csv")], ignore_index=True)),
+        ("store, all years", lambda: load_parsed()),
+        ("store, title + publisher", lambda: load_parsed(columns=["title", "publisher"])),
+        ("store, 1915-1918", lambda: load_parsed(years=range(1915, 1919))),
+        ("store, publisher in 1920", lambda: load_parsed(columns=["publisher"], years=[1920])),
+    ]
+
+    print(f"{'load':<28}{'rows':>8}{'seconds':>9}{'memory MB':>11}")
+    for name, load in cases:
+        df, seconds = best_time(load, args.repeat)
+        memory = df.memory_usage(deep=True).sum() / 1024 / 1024
+        print(f"{name:<28}{len(df):>8}{seconds:>9.3f}{memory:>11.1f}")
@@ -0,0 +1,62 @@
+import sys, time, asyncio, argparse
+import pandas as pd
+from pathlib import Path
+from llm_engine import RequestEngine
+from llm_prompt import prompt, model, generation_config, clean_parse
+from prompt_packing import generate_packed
+from recorded_client import RecordedClient, load_recordings
+
+# the committed Gemini output doubles as the recorded-response fixture
+recorded_directory = Path.cwd().parent / 'parsed_dataframes'
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Compare packed and one-per-call parsing on recorded responses.')
+    parser.add_argument("--pack", type=int, nargs="+",
+            help="Pack sizes to measure against the one-entry-per-call path.",
+            default=[4, 8, 16, 32])
+    parser.add_argument("--entries", type=int, default=512)
+    parser.add_argument("--year", type=str, default="1917")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--token-budget", type=int, default=8000)
+    parser.add_argument("--latency", type=float,
+            help="Simulated seconds per call before output.",
+            default=0.4)
+    parser.add_argument("--per-token-latency", type=float,
+            help="Simulated seconds per output token.",
+            default=0.004)
+    parser.add_argument("--drop-rate", type=float,
+            help="Chance the recorded model leaves an entry out of a packed answer.",
+            default=0.02)
+    return parser.parse_args(args)
+
+
+async def run(client, entries, concurrency, pack, token_budget):
+    engine = RequestEngine(client, model, generation_config, concurrency=concurrency, rate=1000.0)
+    start = time.perf_counter()
+    if pack > 1:
+        outputs, retried = await generate_packed(engine, entries, pack, token_budget)
+    else:
+        outputs, retried = await engine.generate_all([prompt + entry for entry in entries]), 0
+    return outputs, retried, time.perf_counter() - start, engine.stats
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    recordings = load_recordings(recorded_directory)
+    year_df = pd.read_csv(recorded_directory / f"entries_{args.year}.csv", dtype=str, keep_default_na=False)
+    entries = list(year_df["original_entry"][:args.entries])
+
+    print(f"{'pack':>5}{'calls':>7}{'retried':>9}{'tok in/entry':>14}{'tok out/entry':>15}{'entries/s':>11}{'agree':>8}")
+    baseline = None
+    for pack in [1] + args.pack:
+        client = RecordedClient(recordings, args.latency, args.per_token_latency, args.drop_rate)
+        outputs, retried, seconds, stats = asyncio.run(run(client, entries, args.concurrency, pack, args.token_budget))
+        parsed = [clean_parse(output) if isinstance(output, str) else {} for output in outputs]
+        if baseline is None:
+            baseline = parsed
+        agree = sum(a == b for a, b in zip(parsed, baseline)) / len(entries)
+        print(f"{pack:>5}{client.calls:>7}{retried:>9}{stats.tokens_in / len(entries):>14.0f}"
+              f"{stats.tokens_out / len(entries):>15.0f}{len(entries) / seconds:>11.1f}{agree:>8.1%}")
@@ -0,0 +1,156 @@
+import sys, ast, json, time, random, argparse
+from pathlib import Path
+from recorded_client import load_recordings
+from response_decoder import decode_answer, conserved_text
+from llm_prompt import fieldnames
+
+# the committed Gemini output doubles as the recorded-response fixture
+recorded_directory = Path.cwd().parent / 'parsed_dataframes'
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Compare response_decoder.py with the old clean_parse on recorded and damaged answers.')
+    parser.add_argument("--entries", type=int,
+            help="Recorded answers to sample.",
+            default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+def legacy_clean_parse(entry_str):
+    """llm_prompt.clean_parse before json_repair.py, kept here as the baseline."""
+    s = entry_str.strip()
+    if s.startswith("```json"):
+        s = s[len("```json"):].strip()
+    if s.endswith("```"):
+        s = s[:-3].strip()
+
+    try:
+        return json.loads(s)
+    except json.JSONDecodeError:
+        try:
+            return ast.literal_eval(s)  # fallback for weird quotes
+        except Exception as e:
+            raise ValueError(f"Clean parse failed: {e}")
+
+
+def fenced(body):
+    return "```json\n" + body + "\n```"
+
+
+def damaged(fields, random):
+    """(kind, answer text, fields the answer should decode to, or None if it should be re-asked)."""
+    quoted = {**fields, "title": '"' + fields["title"] + '"'}
+    broken = {**fields, "title": fields["title"].replace(" ", "\n", 1)}
+    answer = json.dumps(fields)
+    cut = random.randint(len(answer) // 3, len(answer) - 5)
+    dropped = {**fields, "title": fields["title"][:len(fields["title"]) // 3]}
+    cases = [
+        ("unescaped_quote", fenced(json.dumps(quoted).replace('\\"', '"')), quoted),
+        ("leading_prose", "Here is the parsed entry:\n" + fenced(answer), fields),
+        ("trailing_prose", fenced(answer) + "\nThe date field was left empty.", fields),
+        ("python_repr", fenced(repr(fields)), fields),
+        ("trailing_comma", fenced(answer[:-1] + ", }"), fields),
+        ("raw_newline", fenced(json.dumps(broken).replace("\\n", "\n")), broken),
+        ("list_wrapped", fenced(json.dumps([fields])), fields),
+        # a comma dropped after a string value, pretty-printed and on one line
+        ("comma_newline", fenced(json.dumps(fields, indent=1).replace('",\n', '"\n', 1)), fields),
+        ("comma_inline", fenced(answer.replace('", "', '" "', 1)), fields),
+        ("truncated", fenced(answer[:cut]), None),
+    ]
+    # a couple of lost characters is within the decoder's tolerance for OCR fixes
+    if len(conserved_text(fields["title"])) - len(conserved_text(dropped["title"])) > 2:
+        cases.append(("dropped_text", fenced(json.dumps(dropped)), None))
+    return cases
+
+
+def legacy_outcome(output, expected):
+    """'ok', 'reask' (raised) or 'wrong' (accepted something other than expected)."""
+    try:
+        value = legacy_clean_parse(output)
+    except (ValueError, SyntaxError):
+        return "reask"
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]  # llm_parser.py used to unwrap these itself
+    if expected is not None and isinstance(value, dict) and {k: value.get(k, "") for k in fieldnames} == expected:
+        return "ok"
+    return "wrong"
+
+
+def new_outcome(output, entry, expected):
+    decoded = decode_answer(output, entry)
+    if decoded.problem is not None:
+        return "reask"
+    return "ok" if expected is not None and decoded.rows == [expected] else "wrong"
+
+
+def time_per_call(function, outputs, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for output in outputs:
+            function(output)
+        best = min(best, time.perf_counter() - start)
+    return best / len(outputs) * 1e6
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    recordings = load_recordings(recorded_directory)
+    rng = random.Random(args.seed)
+    sample = rng.sample(sorted(recordings), min(args.entries, len(recordings)))
+
+    # recorded answers as the model sent them: every one must decode to the same fields
+    clean = [(entry, fenced(json.dumps(recordings[entry]))) for entry in sample]
+    differs = flagged = 0
+    passing = []
+    for entry, output in clean:
+        decoded = decode_answer(output, entry)
+        differs += decoded.rows != [recordings[entry]]
+        if decoded.problem is None:
+            passing.append(entry)
+        else:
+            flagged += 1
+    print(f"{len(clean)} recorded answers: {differs} decode differently, "
+          f"{flagged} ({flagged / len(clean):.2%}) fail the conservation check and would be re-asked")
+
+    outputs = [output for _, output in clean]
+    legacy_us = time_per_call(legacy_clean_parse, outputs)
+    new_us = time_per_call(lambda output: decode_answer(output, ""), outputs)
+    print(f"clean answers: legacy {legacy_us:.1f} us, new {new_us:.1f} us per response "
+          f"(new includes the schema and conservation checks)")
+
+    # the same answers damaged the ways model output goes wrong
+    cases = {}
+    for entry in passing:
+        for kind, output, expected in damaged(recordings[entry], rng):
+            cases.setdefault(kind, []).append((entry, output, expected))
+
+    print(f"\n{'damage':<17}{'answers':>8}{'legacy ok':>11}{'new ok':>8}{'legacy re-asks':>16}{'new re-asks':>13}"
+          f"{'legacy wrong':>14}{'new wrong':>11}{'new us':>8}")
+    failures = []
+    totals = {"legacy": 0, "new": 0}
+    for kind, kind_cases in cases.items():
+        legacy = [legacy_outcome(output, expected) for _, output, expected in kind_cases]
+        new = [new_outcome(output, entry, expected) for entry, output, expected in kind_cases]
+        us = time_per_call(lambda case: decode_answer(case[1], case[0]), kind_cases, repeat=1)
+        counts = {name: {outcome: outcomes.count(outcome) for outcome in ("ok", "reask", "wrong")}
+                  for name, outcomes in (("legacy", legacy), ("new", new))}
+        totals["legacy"] += counts["legacy"]["reask"]
+        totals["new"] += counts["new"]["reask"]
+        print(f"{kind:<17}{len(kind_cases):>8}{counts['legacy']['ok']:>11}{counts['new']['ok']:>8}"
+              f"{counts['legacy']['reask']:>16}{counts['new']['reask']:>13}"
+              f"{counts['legacy']['wrong']:>14}{counts['new']['wrong']:>11}{us:>8.1f}")
+        if counts["new"]["ok"] < counts["legacy"]["ok"]:
+            failures.append(f"{kind}: new decoder recovers fewer answers than the old one")
+        if counts["new"]["wrong"]:
+            failures.append(f"{kind}: new decoder accepted {counts['new']['wrong']} wrong answers")
+
+    print(f"\nPaid re-asks for the damaged answers: legacy {totals['legacy']}, new {totals['new']} "
+          f"(the old parser wrote the dropped-text answers as they were)")
+    if differs:
+        failures.append(f"{differs} recorded answers decode differently")
+    if failures:
+        sys.exit("\n".join(failures))
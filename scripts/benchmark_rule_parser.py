@@ -0,0 +1,48 @@
+import re, sys, time, argparse
+import pandas as pd
+from pathlib import Path
+from llm_prompt import fieldnames
+from rule_parser import parse_entries
+
+parsed_directory = Path.cwd().parent / 'parsed_dataframes'
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Agreement and throughput of rule_parser.py against the Gemini output.')
+    parser.add_argument("--years", type=str, nargs="+",
+            default=[str(year) for year in range(1912, 1923)])
+    parser.add_argument("--thresholds", type=float, nargs="+",
+            default=[0.0, 0.5, 0.7, 0.9])
+    return parser.parse_args(args)
+
+
+def normalise(value):
+    """Letters and digits only, so dot leaders and stray commas don't count as disagreement."""
+    return re.sub(r"\W", "", value).lower()
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    parsed_df = pd.concat([pd.read_csv(parsed_directory / f"entries_{year}.csv", dtype=str, keep_default_na=False)
+                           for year in args.years], ignore_index=True)
+
+    start = time.perf_counter()
+    rule_fields, confidences = parse_entries(parsed_df["original_entry"])
+    seconds = time.perf_counter() - start
+    print(f"{len(parsed_df)} entries in {seconds:.2f}s: {len(parsed_df) / seconds:,.0f} entries/s\n")
+
+    llm_rows = parsed_df[fieldnames].to_dict("records")
+    exact = [{k: rule[k].strip() == llm[k].strip() for k in fieldnames} for rule, llm in zip(rule_fields, llm_rows)]
+    loose = [all(normalise(rule[k]) == normalise(llm[k]) for k in fieldnames) for rule, llm in zip(rule_fields, llm_rows)]
+
+    print(f"{'confidence':>10}{'share':>8}{'all fields':>12}{'normalised':>12}  " + "".join(f"{k[:11]:>12}" for k in fieldnames))
+    for threshold in args.thresholds:
+        selected = [i for i, confidence in enumerate(confidences) if confidence >= threshold]
+        if not selected:
+            continue
+        share = len(selected) / len(parsed_df)
+        all_fields = sum(all(exact[i].values()) for i in selected) / len(selected)
+        normalised = sum(loose[i] for i in selected) / len(selected)
+        per_field = "".join(f"{sum(exact[i][k] for i in selected) / len(selected):>12.1%}" for k in fieldnames)
+        print(f"{'>= ' + str(threshold):>10}{share:>8.1%}{all_fields:>12.1%}{normalised:>12.1%}  {per_field}")
@@ -0,0 +1,410 @@
+"""Regression benchmark for entry extraction and parsing over a fixed sample of every year.
+
+benchmark_corpus.json fixes the sample: a handful of body pages from each
+ecb_ocr_text year (byte spans and a hash of their bytes) and, for each page,
+the rows of entries/extracted_entries it produces. `run` then checks and
+times, over those pages:
+
+* extraction (get_entries' page pipeline, and get_entries itself on whole
+  files): output must equal the golden extracted_entries rows, and entry
+  boundaries are scored (precision/recall/F1) against
+  entries/hand_corrected_entries for 1912-1922;
+* remove_patterns, the header strip;
+* parsing: the recorded answers in parsed_dataframes are served through
+  RequestEngine by RecordedClient (no network) and decoded; they must come
+  back as the recorded fields. clean_parse is timed on its own;
+* accuracy scoring (accuracy_check.score_frame) on the parsed rows of the
+  sampled pages, whose flags must match the ones recorded at build.
+
+Timings follow pytest-benchmark: warmup, several rounds, min/median/mean/
+stddev, with throughput from the fastest round. The run exits non-zero when an
+output differs from its golden, F1 drops below the corpus's, or (given a
+--baseline from an earlier `--save`) a throughput falls by more than
+--tolerance.
+
+    python benchmark_suite.py run --save ../run_logs/benchmark_baseline.json
+    python benchmark_suite.py run --baseline ../run_logs/benchmark_baseline.json
+    python benchmark_suite.py build  # re-sample after the golden files change
+"""
+import gc
+import io
+import os
+import csv
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import contextlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from rapidfuzz import process, fuzz
+
+from create_entries import (
+    YEAR_STRINGS, PAGE_TAG_RE, compile_year_patterns, decode_span, find_body, fix_line_mid_entries,
+    get_entries, get_file_path, get_header_patterns, iter_entries, iter_page_spans, open_ocr, remove_patterns,
+)
+from extraction_manifest import digest
+from accuracy_check import score_frame
+from response_decoder import decode_answer, conserved_text
+from recorded_client import RecordedClient
+from llm_engine import RequestEngine
+from llm_prompt import prompt, model, generation_config, clean_parse, fieldnames
+
+corpus_path = Path(__file__).parent / "benchmark_corpus.json"
+extracted_directory = Path.cwd().parent / 'entries' / 'extracted_entries'
+hand_corrected_directory = Path.cwd().parent / 'entries' / 'hand_corrected_entries'
+parsed_directory = Path.cwd().parent / 'parsed_dataframes'
+
+HAND_CORRECTED_YEARS = ["{:02d}".format(year) for year in range(12, 23)]
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Check and time extraction and parsing on a fixed sample of every year.')
+    parser.add_argument("command", choices=["run", "build"])
+    parser.add_argument("--pages-per-year", type=int,
+            help="build: body pages sampled from each year.",
+            default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--full-years", type=str, nargs="*",
+            help="run: years also timed through get_entries on the whole OCR file.",
+            default=["17"])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--save", type=str,
+            help="run: write the results as JSON, to use later as --baseline.",
+            default=None)
+    parser.add_argument("--baseline", type=str,
+            help="run: results of an earlier run to compare throughput against.",
+            default=None)
+    parser.add_argument("--tolerance", type=float,
+            help="run: fail when a throughput is this fraction below the baseline.",
+            default=0.2)
+    return parser.parse_args(args)
+
+
+def read_extracted(year_string):
+    """The golden entries of a year, one string per row of entries/extracted_entries."""
+    with open(extracted_directory / f"entries_19{year_string}.csv", "r", newline="", encoding="utf-8") as f:
+        return [row[0] for row in csv.reader(f)]
+
+
+def extract_pages(pages, patterns, document_page_delta):
+    """Entries of each (page number, page text), split on its own: get_entries' pipeline on one page."""
+    with contextlib.redirect_stdout(io.StringIO()):  # the line-mid fix prints untagged splits
+        return [fix_line_mid_entries(list(iter_entries([page], patterns, document_page_delta, page_num)),
+                                     patterns, False)
+                for page_num, page in pages]
+
+
+def find_rows(entries, golden):
+    """[start, end) of entries as a contiguous run of golden rows, or None."""
+    for start in (i for i, entry in enumerate(golden) if entry == entries[0]):
+        if golden[start:start + len(entries)] == entries:
+            return [start, start + len(entries)]
+    return None
+
+
+def build_corpus(pages_per_year, seed, cwd_path):
+    """Sample pages_per_year body pages per year whose page-by-page extraction matches extracted_entries."""
+    corpus = {"pages_per_year": pages_per_year, "seed": seed, "years": {}}
+    for year_string in YEAR_STRINGS:
+        file_path = get_file_path(year_string, cwd_path)
+        header_patterns = tuple(get_header_patterns(year_string))
+        patterns = compile_year_patterns(year_string, header_patterns)
+        golden = read_extracted(year_string)
+        hand_pages = None
+        if year_string in HAND_CORRECTED_YEARS:
+            hand_pages = set(read_hand_corrected(year_string)["page_num"])
+
+        with open_ocr(file_path) as mm:
+            with contextlib.redirect_stdout(io.StringIO()):
+                body_start, body_end, document_page_delta = find_body(year_string, mm, patterns)
+            spans = list(iter_page_spans(mm, body_start, body_end))
+            order = list(range(len(spans)))
+            random.Random(f"{seed}-{year_string}").shuffle(order)
+
+            pages = []
+            for index in order:
+                page_num = index + 1
+                if hand_pages is not None and str(page_num) not in hand_pages:
+                    continue
+                start, end = spans[index]
+                entries = extract_pages([(page_num, decode_span(mm, start, end))], patterns, document_page_delta)[0]
+                rows = find_rows(entries, golden)
+                # pages the line-mid fix resolves differently on their own (repeated text) can't be checked alone
+                if rows is None:
+                    continue
+                pages.append({"page": page_num, "start": start, "end": end,
+                              "digest": digest(mm[start:end]), "rows": rows})
+                if len(pages) == pages_per_year:
+                    break
+
+        corpus["years"][year_string] = {"file": os.path.basename(file_path), "document_page_delta": document_page_delta,
+                                        "pages": sorted(pages, key=lambda page: page["page"])}
+        print(f"19{year_string}: {len(pages)} pages, {sum(p['rows'][1] - p['rows'][0] for p in pages)} entries")
+    return corpus
+
+
+def read_hand_corrected(year_string):
+    # named by position: the 1913 file's header repeats "entry" for the page columns
+    return pd.read_csv(hand_corrected_directory / f"entries_19{year_string}.csv", dtype=str, keep_default_na=False,
+                       header=0, names=["entry", "ecb_issue", "page_num", "doc_page_num", "main_entry"])
+
+
+def read_parsed_pages(corpus):
+    """parsed_dataframes rows for the corpus pages of 1912-1922."""
+    frames = []
+    for year_string in HAND_CORRECTED_YEARS:
+        df = pd.read_csv(parsed_directory / f"entries_19{year_string}.csv", dtype={"page_num": str})
+        pages = {str(page["page"]) for page in corpus["years"][year_string]["pages"]}
+        frames.append(df[df["page_num"].isin(pages)])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_corpus(corpus, cwd_path):
+    """{year: (patterns, document_page_delta, [(page number, text)], golden entries per page)}; fails if the OCR changed."""
+    loaded = {}
+    for year_string, year in corpus["years"].items():
+        patterns = compile_year_patterns(year_string, tuple(get_header_patterns(year_string)))
+        golden = read_extracted(year_string)
+        pages = []
+        with open_ocr(get_file_path(year_string, cwd_path)) as mm:
+            for page in year["pages"]:
+                if digest(mm[page["start"]:page["end"]]) != page["digest"]:
+                    sys.exit(f"19{year_string} page {page['page']} changed in the OCR file; rebuild the corpus")
+                pages.append((page["page"], decode_span(mm, page["start"], page["end"])))
+        loaded[year_string] = (patterns, year["document_page_delta"], pages,
+                               [golden[start:end] for start, end in (page["rows"] for page in year["pages"])])
+    return loaded
+
+
+def boundary_scores(entries_by_page, hand_by_page, threshold=0.9):
+    """(precision, recall, F1) of entry boundaries: an extracted entry counts when it pairs one-to-one
+    with a hand-corrected entry of the same page whose text is at least threshold similar (letters and
+    digits only, so the hand corrections of OCR slips don't count against a correct split)."""
+    matched = extracted = hand = 0
+    for page, entries in entries_by_page.items():
+        entries = [text for text in entries if text]
+        corrected = [text for text in hand_by_page.get(page, []) if text]
+        extracted += len(entries)
+        hand += len(corrected)
+        if not entries or not corrected:
+            continue
+        scores = process.cdist(entries, corrected, scorer=fuzz.ratio, score_cutoff=threshold * 100)
+        rows, columns = np.nonzero(scores)
+        used_rows, used_columns = set(), set()
+        for k in np.argsort(-scores[rows, columns], kind="stable"):
+            if rows[k] in used_rows or columns[k] in used_columns:
+                continue
+            used_rows.add(rows[k])
+            used_columns.add(columns[k])
+        matched += len(used_rows)
+    precision = matched / extracted if extracted else 1.0
+    recall = matched / hand if hand else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 5), "recall": round(recall, 5), "f1": round(f1, 5)}
+
+
+def tagged_by_page(year_string, pages, entries_per_page):
+    """{"YY:page": conserved text of each entry closed on that page} (untagged page trailers are left out)."""
+    by_page = {}
+    for (page_num, _), entries in zip(pages, entries_per_page):
+        key = f"{year_string}:{page_num}"
+        by_page[key] = [conserved_text(PAGE_TAG_RE.sub("", entry)) for entry in entries if PAGE_TAG_RE.search(entry)]
+    return by_page
+
+
+def hand_by_page(corpus):
+    by_page = {}
+    for year_string in HAND_CORRECTED_YEARS:
+        pages = {str(page["page"]) for page in corpus["years"][year_string]["pages"]}
+        df = read_hand_corrected(year_string)
+        for page, group in df[df["page_num"].isin(pages)].groupby("page_num"):
+            by_page[f"{year_string}:{page}"] = [conserved_text(entry) for entry in group["entry"]]
+    return by_page
+
+
+def benchmark(function, *args, rounds=5, min_round=0.2):
+    """pytest-benchmark style timing: (last result, stats in seconds per call).
+
+    The first call is the warmup and calibrates how many calls make up a round
+    of at least min_round seconds, so fast functions aren't timed at clock noise.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    iterations = max(1, int(min_round / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    gc.collect()
+    gc.disable()  # collections land in whichever round allocates past the threshold
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = function(*args)
+            times.append((time.perf_counter() - start) / iterations)
+    finally:
+        gc.enable()
+    stats = {"min": min(times), "max": max(times), "mean": statistics.mean(times),
+             "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+             "median": statistics.median(times), "rounds": rounds, "iterations": iterations}
+    return result, stats
+
+
+def throughput(stats, **amounts):
+    """Each amount per second at the fastest round, the figure least moved by other load on the machine."""
+    return {f"{name}_per_s": amount / stats["min"] for name, amount in amounts.items()}
+
+
+def parse_recorded(recordings, entries):
+    """Serve every entry's recorded answer through RequestEngine and decode it."""
+    engine = RequestEngine(RecordedClient(recordings), model, generation_config, concurrency=8, rate=1e6)
+    outputs = asyncio.run(engine.generate_all([prompt + entry for entry in entries]))
+    return [decode_answer(output, entry) for output, entry in zip(outputs, entries)]
+
+
+def run_suite(corpus, cwd_path, full_years, rounds):
+    """(results, failures) of every check and timing."""
+    results, failures = {"checks": {}, "benchmarks": {}}, []
+    loaded = load_corpus(corpus, cwd_path)
+
+    def record(name, stats, **amounts):
+        results["benchmarks"][name] = {**{key: round(value, 6) for key, value in stats.items()},
+                                       **{key: round(value, 2) for key, value in throughput(stats, **amounts).items()}}
+
+    # extraction on the sampled pages, against the golden rows
+    ocr_bytes = sum(len(text.encode("utf-8")) for _, _, pages, _ in loaded.values() for _, text in pages)
+    extracted, stats = benchmark(
+        lambda: {year: extract_pages(pages, patterns, delta) for year, (patterns, delta, pages, _) in loaded.items()},
+        rounds=rounds)
+    entry_count = sum(len(entries) for per_page in extracted.values() for entries in per_page)
+    record("extract_pages", stats, entries=entry_count, mb=ocr_bytes / 1e6)
+    differing = [f"19{year} page {page_num}"
+                 for year, (_, _, pages, golden) in loaded.items()
+                 for (page_num, _), entries, expected in zip(pages, extracted[year], golden) if entries != expected]
+    results["checks"]["extraction_pages_differing"] = len(differing)
+    if differing:
+        failures.append(f"extraction differs from extracted_entries on {', '.join(differing[:5])}"
+                        + (f" and {len(differing) - 5} more pages" if len(differing) > 5 else ""))
+
+    hand = hand_by_page(corpus)
+    found = {}
+    for year in HAND_CORRECTED_YEARS:
+        found.update(tagged_by_page(year, loaded[year][2], extracted[year]))
+    scores = boundary_scores(found, hand)
+    results["checks"]["boundaries"] = scores
+    if scores["f1"] < corpus["golden"]["boundary_f1"]:
+        failures.append(f"entry-boundary F1 {scores['f1']} is below the corpus's {corpus['golden']['boundary_f1']}")
+
+    pages = [(text, patterns.headers) for patterns, _, year_pages, _ in loaded.values() for _, text in year_pages]
+    _, stats = benchmark(lambda: [remove_patterns(text, headers) for text, headers in pages], rounds=rounds)
+    record("remove_patterns", stats, pages=len(pages), mb=ocr_bytes / 1e6)
+
+    for year_string in full_years:
+        file_path = get_file_path(year_string, cwd_path)
+        header_patterns = get_header_patterns(year_string)
+        with contextlib.redirect_stdout(io.StringIO()):
+            entries, stats = benchmark(get_entries, year_string, file_path, header_patterns, False,
+                                       rounds=max(1, rounds // 2))
+        record(f"get_entries_19{year_string}", stats, entries=len(entries), mb=os.path.getsize(file_path) / 1e6)
+        if entries != read_extracted(year_string):
+            failures.append(f"get_entries output for 19{year_string} differs from extracted_entries")
+
+    # parsing, with Gemini replaced by its recorded answers
+    parsed = read_parsed_pages(corpus)
+    recorded = parsed.fillna("")
+    recordings = {row["original_entry"]: {key: row[key] for key in fieldnames} for row in recorded.to_dict("records")}
+    entries = list(recordings)
+    decoded, stats = benchmark(parse_recorded, recordings, entries, rounds=rounds)
+    record("parse_recorded", stats, entries=len(entries))
+    mismatched = sum(answer.rows != [recordings[entry]] for answer, entry in zip(decoded, entries))
+    results["checks"]["parse_mismatches"] = mismatched
+    results["checks"]["parse_flagged"] = sum(answer.problem is not None for answer in decoded)
+    if mismatched:
+        failures.append(f"{mismatched} recorded answers decode to other fields than parsed_dataframes")
+
+    answers = ["```json\n" + json.dumps(recordings[entry], ensure_ascii=False, indent=0) + "\n```" for entry in entries]
+    _, stats = benchmark(lambda: [clean_parse(answer) for answer in answers], rounds=rounds)
+    record("clean_parse", stats, responses=len(answers))
+
+    scored, stats = benchmark(score_frame, parsed, "none", rounds=rounds)
+    record("accuracy_scoring", stats, rows=len(parsed))
+    flagged = int(scored["flagged"].sum())
+    results["checks"]["accuracy_flagged"] = flagged
+    if flagged != corpus["golden"]["accuracy_flagged"]:
+        failures.append(f"accuracy scoring flags {flagged} rows, the corpus recorded {corpus['golden']['accuracy_flagged']}")
+    return results, failures
+
+
+def compare_throughput(results, baseline, tolerance):
+    """(benchmark, measure, old, new, regressed) for every throughput in both runs."""
+    rows = []
+    for name, new in results["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            continue
+        for measure in (key for key in new if key.endswith("_per_s") and key in old):
+            rows.append((name, measure, old[measure], new[measure], new[measure] < old[measure] * (1 - tolerance)))
+    return rows
+
+
+def print_results(results):
+    print(f"{'benchmark':<22}{'min s':>10}{'median s':>10}{'stddev':>9}  throughput")
+    for name, stats in results["benchmarks"].items():
+        rates = "  ".join(f"{stats[key]:,.1f} {key[:-6]}/s" for key in stats if key.endswith("_per_s"))
+        print(f"{name:<22}{stats['min']:>10.4f}{stats['median']:>10.4f}{stats['stddev']:>9.4f}  {rates}")
+    boundaries = results["checks"]["boundaries"]
+    print(f"\nentry boundaries vs hand corrections: precision {boundaries['precision']:.4f}  "
+          f"recall {boundaries['recall']:.4f}  F1 {boundaries['f1']:.4f}")
+    print(f"pages differing from extracted_entries: {results['checks']['extraction_pages_differing']}; "
+          f"recorded answers decoding differently: {results['checks']['parse_mismatches']} "
+          f"({results['checks']['parse_flagged']} would be re-asked); "
+          f"rows flagged by accuracy scoring: {results['checks']['accuracy_flagged']}")
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+
+    if args.command == "build":
+        corpus = build_corpus(args.pages_per_year, args.seed, cwd_path)
+        # golden accuracy figures come from the current code over the new sample
+        loaded = load_corpus(corpus, cwd_path)
+        found = {}
+        for year in HAND_CORRECTED_YEARS:
+            patterns, delta, pages, _ = loaded[year]
+            found.update(tagged_by_page(year, pages, extract_pages(pages, patterns, delta)))
+        corpus["golden"] = {"boundary_f1": boundary_scores(found, hand_by_page(corpus))["f1"],
+                            "accuracy_flagged": int(score_frame(read_parsed_pages(corpus), "none")["flagged"].sum())}
+        with open(corpus_path, "w", encoding="utf-8") as f:
+            json.dump(corpus, f, indent=1)
+            f.write("\n")
+        print(f"Wrote {corpus_path} (boundary F1 {corpus['golden']['boundary_f1']}, "
+              f"{corpus['golden']['accuracy_flagged']} rows flagged)")
+        sys.exit()
+
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    results, failures = run_suite(corpus, cwd_path, args.full_years, args.rounds)
+    print_results(results)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n{'benchmark':<22}{'measure':<16}{'baseline':>12}{'now':>12}")
+        for name, measure, old, new, regressed in compare_throughput(results, baseline, args.tolerance):
+            print(f"{name:<22}{measure:<16}{old:>12,.1f}{new:>12,.1f}  {'REGRESSED' if regressed else ''}")
+            if regressed:
+                failures.append(f"{name} {measure} fell more than {args.tolerance:.0%} below the baseline")
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+    if failures:
+        sys.exit("\n".join(failures))
@@ -0,0 +1,288 @@
+"""Indexed search over the parsed catalogue (author, title, publisher, year).
+
+The index is built once from the Parquet store (parsed_store.py) and pickled
+next to it; it is rebuilt automatically when the store changes.
+
+* titles: an inverted index of character trigrams (per word, space padded),
+  so "Spcctre gold" still finds "Spectre gold". A title matches when at least
+  min_score of the query's trigrams occur in it.
+* authors: every surname in author(s) ("Maitland (Ella Fuller) and Pollock
+  (Sir F.)" is filed under maitland and pollock), lowercased, in one sorted
+  array searched with binary search; "poll*" is a prefix query.
+* publishers: lowercased with punctuation dropped (".CONSTABLE" and
+  "CONSTABLE." are both "constable"), in a hash table.
+* years: catalogue_year, as 1918, 18 or '18.
+
+    python catalogue_search.py build
+    python catalogue_search.py query --publisher constable --year 18
+    python catalogue_search.py query --author pollock
+    python catalogue_search.py query --title "spectre gold"
+    python catalogue_search.py serve --port 8766
+        GET /search?publisher=constable&year=18&limit=20
+"""
+import re, sys, json, time, bisect, pickle, argparse, threading
+import numpy as np
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from parsed_store import store_directory, load_parsed
+
+default_index_path = store_directory.parent / "catalogue_index.pickle"
+
+document_columns = ["author(s)", "title", "publisher", "date", "catalogue_year", "page_num", "doc_page_num"]
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+CO_AUTHOR_RE = re.compile(r"\s+(?:and|&)\s+")
+
+
+def normalise(text):
+    """Lowercase words separated by single spaces."""
+    return NON_WORD_RE.sub(" ", str(text)).strip().lower()
+
+
+def title_trigrams(title):
+    """The set of space-padded character trigrams of every word in a title."""
+    grams = set()
+    for word in normalise(title).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def author_surnames(authors):
+    """Normalised surname of each author in an author(s) field."""
+    if not isinstance(authors, str):
+        return []
+    surnames = (normalise(name.split("(")[0]) for name in CO_AUTHOR_RE.split(authors))
+    return list(dict.fromkeys(surname for surname in surnames if surname))
+
+
+def parse_year(year):
+    """1918, "1918", 18, "18" or "'18" as 1918."""
+    year = int(str(year).strip().lstrip("'"))
+    return year + 1900 if year < 100 else year
+
+
+def store_signature(store):
+    """(path, size, mtime) of every Parquet file, to tell when the index is stale."""
+    return sorted((str(path.relative_to(store)), path.stat().st_size, path.stat().st_mtime_ns)
+                  for path in Path(store).rglob("*.parquet"))
+
+
+class CatalogueIndex:
+    """Title trigram, surname and publisher indexes over one snapshot of the store."""
+
+    def __init__(self, documents, signature):
+        self.documents = documents  # {column: list}, one row per entry in store order
+        self.signature = signature
+        count = len(documents["title"])
+        self.years = np.asarray(documents["catalogue_year"], dtype=np.int16)
+
+        # title trigrams: postings for gram i are title_postings[title_offsets[i]:title_offsets[i + 1]]
+        gram_ids, gram_docs, gram_counts = {}, [], np.zeros(count, dtype=np.int32)
+        for doc, title in enumerate(documents["title"]):
+            grams = title_trigrams(title) if isinstance(title, str) else ()
+            gram_counts[doc] = len(grams)
+            gram_docs.extend((gram_ids.setdefault(gram, len(gram_ids)), doc) for gram in grams)
+        pairs = np.array(gram_docs, dtype=np.int32).reshape(-1, 2)
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        self.title_grams = gram_ids
+        self.title_offsets = np.searchsorted(pairs[:, 0], np.arange(len(gram_ids) + 1)).astype(np.int64)
+        self.title_postings = pairs[:, 1].copy()
+        self.title_gram_counts = gram_counts
+
+        # surnames: sorted keys with the document each came from
+        surname_pairs = sorted((surname, doc) for doc, authors in enumerate(documents["author(s)"])
+                               for surname in author_surnames(authors))
+        self.surnames = [surname for surname, _ in surname_pairs]
+        self.surname_docs = np.array([doc for _, doc in surname_pairs], dtype=np.int32)
+
+        # publishers: normalised name -> documents
+        publisher_docs = {}
+        for doc, publisher in enumerate(documents["publisher"]):
+            if isinstance(publisher, str) and normalise(publisher):
+                publisher_docs.setdefault(normalise(publisher), []).append(doc)
+        self.publishers = {key: np.array(docs, dtype=np.int32) for key, docs in publisher_docs.items()}
+
+    @classmethod
+    def build(cls, store=store_directory):
+        df = load_parsed(columns=document_columns, store=store)
+        documents = {column: df[column].astype(object).where(df[column].notna(), None).tolist()
+                     for column in document_columns}
+        return cls(documents, store_signature(store))
+
+    def save(self, path=default_index_path):
+        temporary = Path(str(path) + ".tmp")
+        with open(temporary, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        temporary.replace(path)
+
+    @classmethod
+    def open(cls, path=default_index_path, store=store_directory):
+        """Load the pickled index, rebuilding (and re-saving) it if the store has changed since."""
+        path = Path(path)
+        if path.exists():
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+            if index.signature == store_signature(store):
+                return index
+        index = cls.build(store)
+        index.save(path)
+        return index
+
+    def author_docs(self, author):
+        """Documents with this surname, or any surname starting with it if it ends in *."""
+        key = normalise(author.rstrip("*"))
+        low = bisect.bisect_left(self.surnames, key)
+        high = bisect.bisect_right(self.surnames, key + "\U0010ffff" if author.endswith("*") else key)
+        return np.unique(self.surname_docs[low:high])
+
+    def publisher_docs(self, publisher):
+        return self.publishers.get(normalise(publisher), np.empty(0, dtype=np.int32))
+
+    def title_scores(self, title):
+        """(documents, score) for titles sharing any trigram with title; score is the share of its trigrams found."""
+        gram_ids = [self.title_grams[gram] for gram in title_trigrams(title) if gram in self.title_grams]
+        query_size = len(title_trigrams(title))
+        if not gram_ids:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        postings = np.concatenate([self.title_postings[self.title_offsets[i]:self.title_offsets[i + 1]]
+                                   for i in gram_ids])
+        docs, hits = np.unique(postings, return_counts=True)
+        return docs, hits / query_size
+
+    def match(self, title=None, author=None, publisher=None, year=None, min_score=0.6):
+        """(documents, scores or None) matching every given condition, best title match first, else in catalogue order."""
+        selected, scores = None, None
+        for docs in ([self.author_docs(author)] if author else []) + ([self.publisher_docs(publisher)] if publisher else []):
+            selected = docs if selected is None else np.intersect1d(selected, docs, assume_unique=True)
+        if year is not None:
+            year_docs = np.flatnonzero(self.years == parse_year(year))
+            selected = year_docs if selected is None else selected[self.years[selected] == parse_year(year)]
+        if title:
+            docs, doc_scores = self.title_scores(title)
+            keep = doc_scores >= min_score
+            if selected is not None:
+                keep &= np.isin(docs, selected)
+            selected, scores = docs[keep], doc_scores[keep]
+            # best share of the query first, then titles closest in length to it
+            order = np.lexsort((np.abs(self.title_gram_counts[selected] - len(title_trigrams(title))), -scores))
+            selected, scores = selected[order], scores[order]
+        if selected is None:
+            selected = np.arange(len(self.years))
+        return selected, scores
+
+    def search(self, title=None, author=None, publisher=None, year=None, limit=20, min_score=0.6):
+        """match() as row dicts: (total matches, the first limit rows, each with a score)."""
+        selected, scores = self.match(title, author, publisher, year, min_score)
+        results = []
+        for rank, doc in enumerate(selected[:limit]):
+            row = {column: self.documents[column][doc] for column in document_columns}
+            row["score"] = round(float(scores[rank]), 3) if scores is not None else 1.0
+            results.append(row)
+        return len(selected), results
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=int).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self.send_json(404, {"error": "try /search?title=&author=&publisher=&year=&limit="})
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        started = time.perf_counter()
+        try:
+            total, results = self.server.index.search(
+                title=query.get("title"), author=query.get("author"), publisher=query.get("publisher"),
+                year=query.get("year"), limit=int(query.get("limit", 20)),
+                min_score=float(query.get("min_score", 0.6)))
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+            return
+        self.send_json(200, {"total": total, "milliseconds": round((time.perf_counter() - started) * 1000, 2),
+                             "results": results})
+
+
+def start_search_server(index, port=0):
+    """Serve index on a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), SearchHandler)
+    server.daemon_threads = True
+    server.index = index
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def year_argument(year):
+    """--year as parse_year reads it, or a usage error (the HTTP handler answers 400 for the same)."""
+    try:
+        parse_year(year)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{year!r} is not a year (use 1918, 18 or '18)")
+    return year
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Search the parsed catalogue by title, author, publisher and year.')
+    parser.add_argument("command", choices=["build", "query", "serve"])
+    parser.add_argument("--title", type=str, default=None)
+    parser.add_argument("--author", type=str,
+            help="Surname; end with * for a prefix.",
+            default=None)
+    parser.add_argument("--publisher", type=str, default=None)
+    parser.add_argument("--year", type=year_argument,
+            help="Catalogue year: 1918, 18 or '18.",
+            default=None)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--min-score", type=float,
+            help="Share of the title's trigrams a match must contain.",
+            default=0.6)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--index", type=str, default=str(default_index_path))
+    parser.add_argument("--store", type=str, default=str(store_directory))
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    start = time.perf_counter()
+    if args.command == "build":
+        index = CatalogueIndex.build(args.store)
+        index.save(args.index)
+        print(f"Indexed {len(index.years)} entries in {time.perf_counter() - start:.2f}s: {args.index}")
+        sys.exit()
+
+    index = CatalogueIndex.open(args.index, args.store)
+    print(f"Loaded index of {len(index.years)} entries in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    if args.command == "serve":
+        server, base_url = start_search_server(index, args.port)
+        print(f"Searching on {base_url}/search")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        sys.exit()
+
+    start = time.perf_counter()
+    total, results = index.search(args.title, args.author, args.publisher, args.year, args.limit, args.min_score)
+    milliseconds = (time.perf_counter() - start) * 1000
+    for row in results:
+        print(f"{row['catalogue_year']}  {row['score']:.2f}  {row['author(s)'] or ''} | {row['title'] or ''} | "
+              f"{row['publisher'] or ''}, {row['date'] or ''}")
+    print(f"{total} matches in {milliseconds:.1f} ms", file=sys.stderr)
@@ -2,118 +2,384 @@ import os
 import re
 import csv
 import sys
+import mmap
+import bisect
 from tqdm import tqdm
+import time
 import argparse
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from splitter_config import year_splitters
+from instrumentation import RunLog, timed
+
+data_folder_path = '/ecb_ocr_text/'
+entries_directory = "/entries/"
+
+YEAR_STRINGS = ["{:02d}".format(year) for year in range(2, 23)]  # 1902-1922
 
 def argparse_create(args):
     parser = argparse.ArgumentParser(description='Argument parser for creating the genereated dataset CSVs.')
     parser.add_argument("--verbose", type=str,
             help="Prints out clean entry metrics into the CLI.",
             default="False")
+    parser.add_argument("--jobs", type=int,
+            help="Worker processes to extract years (or page shards) in parallel.",
+            default=1)
+    parser.add_argument("--pages-per-shard", type=int,
+            help="With --jobs, cut each year into shards of this many pages (0 keeps whole years).",
+            default=0)
+    parser.add_argument("--incremental", action="store_true",
+            help="Only re-split pages whose OCR text changed since the last run, patching the entries CSVs in place.")
+    parser.add_argument("--profile", type=str, nargs="+",
+            help="Run these stages (read, header_strip, terminator_tagging, line_mid_fix, csv_write, or all) under cProfile.",
+            default=())
     parsed_args = parser.parse_args(args)
     return parsed_args
 
+MONTH_ABBRVS = [
+    "Jan", "Feb", "Mar", "Apr", "May", "June",
+    "July", "Aug", "Sept", "Oct", "Nov", "Dec",
+]
+
+PAGE_TAG_RE = re.compile(r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>")
+LEADING_JUNK_RE = re.compile(r"^\W+(?=[A-Z])")
+
+YearPatterns = namedtuple("YearPatterns", [
+    "front", "appendix", "headers", "terminator", "line_mid", "split_line_mid",
+])
+
 def remove_patterns(page, patterns):
     """Strip header/page-number lines from a single page."""
     for pattern in patterns:
-        page = re.sub(pattern, '', page, flags=re.MULTILINE)
+        if isinstance(pattern, str):
+            page = re.sub(pattern, '', page, flags=re.MULTILINE)
+        else:
+            page = pattern.sub('', page)
     return page
 
 def get_splitters_by_year(year):
-    """Load year-specific front-matter, appendix, and year-variation regexes from splitters.txt."""
-    with open("splitters.txt", "r") as file:
-            exec(file.read(), globals())
-    return (patternFrontDict[year], appendixPatternDict[year], yearPatterns[year])
-
-def get_entries(year_string, file_path, pattern, verbose):
-    """Extract all entries from a single ECB OCR file for a given year."""
-    infile = open(file_path, "r", encoding="utf-8", errors="ignore")
-    contents = infile.read()
-    infile.close()
-
-    if verbose:
-        print("CATALOGUE YEAR:", year_string, "\n")
+    """Year-specific front-matter, appendix, and year-variation regexes from splitters.json."""
+    splitters = year_splitters(year)
+    return (splitters.front, splitters.appendix, splitters.year_variants)
 
+@lru_cache(maxsize=None)
+def compile_year_patterns(year_string, header_patterns):
+    """Compile every regex get_entries needs for one year, once per (year, headers)."""
     front_pattern, appendix_pattern, year_variations = get_splitters_by_year(year_string)
-
-    # chop off front matter (intro pages) and back matter (appendix)
-    text_raw = re.split(front_pattern, contents)
-    if len(text_raw) < 2:
+    months = "|".join(MONTH_ABBRVS)
+    return YearPatterns(
+        front=re.compile(front_pattern),
+        appendix=re.compile(appendix_pattern, flags=re.DOTALL),
+        headers=tuple(re.compile(p, flags=re.MULTILINE) for p in header_patterns),
+        # lines ending with a year variant (e.g. "'17") close an entry
+        terminator=re.compile(r'(\W({})\.?$)'.format('|'.join(year_variations)), flags=re.M),
+        # month+year that isn't at end of line: OCR merged two entries on one line
+        line_mid=re.compile(r"({})\.?\W{}\.?[^\.]+".format(months, year_string)),
+        split_line_mid=re.compile(r"(({})\.?\W{}\.?(?!$))".format(months, year_string)),
+    )
+
+def open_ocr(file_path):
+    """Memory-map an OCR file read-only; pages are decoded from it one at a time."""
+    with open(file_path, "rb") as infile:
+        return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+def iter_page_spans(mm, start=0, end=None):
+    """Yield (start, end) byte offsets of the form-feed separated pages of mm[start:end]."""
+    end = len(mm) if end is None else end
+    while True:
+        form_feed = mm.find(b"\f", start, end)
+        if form_feed == -1:
+            yield start, end
+            return
+        yield start, form_feed
+        start = form_feed + 1
+
+def decode_span(mm, start, end):
+    # a form feed is one byte in UTF-8, so a page decodes the same on its own as inside the whole file
+    return mm[start:end].decode("utf-8", errors="ignore")
+
+def byte_offset(mm, page_start, page, char_offset):
+    """Byte offset in mm of character char_offset of page, the decoded text starting at page_start."""
+    prefix = page[:char_offset].encode("utf-8")
+    if mm[page_start:page_start + len(prefix)] == prefix:
+        return page_start + len(prefix)
+    # undecodable bytes were dropped before char_offset: find the shortest prefix decoding to that many characters
+    low, high = page_start + len(prefix), len(mm)
+    while low < high:
+        middle = (low + high) // 2
+        if len(decode_span(mm, page_start, middle)) < char_offset:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def search_pages(mm, spans, pattern, start=0):
+    """First match of pattern at or after byte offset start, as (start, end) byte offsets, or None.
+
+    Pages are decoded and searched two at a time, so a match may run from
+    one page into the next but the file is never decoded as a whole.
+    """
+    index = bisect.bisect_right([span[0] for span in spans], start) - 1
+    page = decode_span(mm, *spans[index])
+    position = len(decode_span(mm, spans[index][0], start))
+    for index in range(index, len(spans)):
+        following = decode_span(mm, *spans[index + 1]) if index + 1 < len(spans) else None
+        window = page if following is None else page + "\f" + following
+        match = pattern.search(window, position)
+        if match and match.start() <= len(page):
+            return tuple(byte_offset(mm, spans[index][0], page, offset) if offset <= len(page)
+                         else byte_offset(mm, spans[index + 1][0], following, offset - len(page) - 1)
+                         for offset in match.span())
+        page, position = following, 0
+    return None
+
+def split_page(page, page_num, document_page_num, terminator):
+    """Cut one header-stripped page into entries, tagging each with its page numbers."""
+    tag = "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>".format(page_num, document_page_num)
+    last = 0
+    for match in terminator.finditer(page):
+        yield page[last:match.start()] + tag + match.group(1)
+        last = match.end()
+    yield page[last:]
+
+def split_line_mid(entry, patterns):
+    """Split an entry holding two merged entries into its (first, second) halves."""
+    match = PAGE_TAG_RE.search(entry)
+    if match:
+        # carry page tags to both halves
+        replacement = "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>\\1<ENTRY_CUT>".format(match.group(1), match.group(2))
+        return patterns.split_line_mid.sub(replacement, entry).split("<ENTRY_CUT>"), True
+    return patterns.split_line_mid.sub("\\1<ENTRY_CUT>", entry).split("<ENTRY_CUT>"), False
+
+def match_splitters(mm, spans, patterns):
+    """(front, next front, appendix) matches as byte spans, any of them None: the first front match,
+    the next one after it and the first appendix match after it."""
+    front_match = search_pages(mm, spans, patterns.front)
+    if front_match is None:
+        return None, None, None
+    next_front_match = search_pages(mm, spans, patterns.front, front_match[1])
+    appendix_match = search_pages(mm, spans, patterns.appendix, front_match[1])
+    return front_match, next_front_match, appendix_match
+
+def find_body(year_string, mm, patterns):
+    """Locate the entries between front matter (intro pages) and back matter (appendix).
+
+    Returns (start, end, document_page_delta), the body as byte offsets into mm.
+    """
+    spans = list(iter_page_spans(mm))
+    front_match, next_front_match, appendix_match = match_splitters(mm, spans, patterns)
+    if front_match is None:
         print("The year that's not working is: ", year_string)
-        print(front_pattern)
-        raise IndexError(f"No match found for patternFront: {front_pattern} in ecb_content.")
+        print(patterns.front.pattern)
+        raise IndexError(f"No match found for patternFront: {patterns.front.pattern} in ecb_content.")
 
-    front_matter = text_raw[0]
-    document_page_delta = len(front_matter.split("\f")) - 2  # offset to get real doc page numbers
+    # offset to get real doc page numbers: form feeds before the front match, less one
+    document_page_delta = bisect.bisect_right([span[0] for span in spans], front_match[0]) - 2
 
-    ecb_content = text_raw[1]
-
-    appendix_list = re.split(appendix_pattern, ecb_content, flags=re.DOTALL)
-    if len(appendix_list) < 2:
+    # the body runs up to a repeat of the front pattern, if there is one
+    if appendix_match is None or (next_front_match and appendix_match[1] > next_front_match[0]):
         print("The year that's not working is: ", year_string)
-        print(appendix_pattern)
-        raise IndexError(f"No match found for appendix_pattern: {appendix_pattern} in ecb_content.")
-
-    ecb_content = appendix_list[0]
+        print(patterns.appendix.pattern)
+        raise IndexError(f"No match found for appendix_pattern: {patterns.appendix.pattern} in ecb_content.")
+
+    return front_match[1], appendix_match[0], document_page_delta
+
+def iter_body_pages(mm, start, end, run=None):
+    """Decode the pages of mm[start:end] one at a time."""
+    for page_start, page_end in iter_page_spans(mm, start, end):
+        with timed(run, "read"):
+            page = decode_span(mm, page_start, page_end)
+        yield page
+
+def iter_entries(pages, patterns, document_page_delta, first_page=1, run=None):
+    """Strip headers from consecutive pages and cut them into entries, numbering pages from first_page."""
+    for i, page in enumerate(pages, start=first_page):
+        with timed(run, "header_strip"):
+            page = remove_patterns(page, patterns.headers)
+        with timed(run, "terminator_tagging"):
+            entries = [entry.strip().replace("\n", " ")
+                       for entry in split_page(page, i, i + document_page_delta, patterns.terminator)]
+        if run is not None:
+            run.count("pages")
+        yield from entries
+
+def fix_line_mid_entries(entries, patterns, verbose):
+    """Split entries where OCR merged two entries on one line."""
+    line_mid_flags = [patterns.line_mid.search(entry) is not None for entry in entries]
+    line_mid_count = sum(line_mid_flags)
 
-    # split on form feeds into pages, strip headers from each
-    ecb_pages = ecb_content.split("\f")
-    ecb_pe = [remove_patterns(page, pattern) for page in ecb_pages]
+    if verbose:
+        print(f"\nTotal Line Mid Entries: {line_mid_count}")
+        print(f"Percent Line Mid Entries: {line_mid_count / len(entries)}")
+
+    # the original fix looked each line-mid entry up with entries.index(), so
+    # repeated line-mid text resolved to the first copy; keep that path for exact output
+    line_mid_entries = [entry for entry, flag in zip(entries, line_mid_flags) if flag]
+    if len(set(line_mid_entries)) != len(line_mid_entries):
+        return fix_line_mid_by_first_index(entries, line_mid_entries, patterns)
+
+    fixed = []
+    for entry, flag in zip(entries, line_mid_flags):
+        if not flag:
+            fixed.append(entry)
+            continue
+        new_entry, tagged = split_line_mid(entry, patterns)
+        if not tagged:
+            print("main is empty, here's the index", len(fixed))
+        fixed.append(new_entry[0])
+        fixed.append(LEADING_JUNK_RE.sub("", new_entry[1]))  # strip leading junk from second half
+    return fixed
+
+def get_entries(year_string, file_path, pattern, verbose, run=None):
+    """Extract all entries from a single ECB OCR file for a given year."""
+    if verbose:
+        print("CATALOGUE YEAR:", year_string, "\n")
 
-    # mark entry boundaries: lines ending with a year variant (e.g. "'17") get tagged + cut
-    entry_terminator_regex = r'(\W({})\.?$)'.format('|'.join(year_variations))
-    ecb_pe = [re.sub(entry_terminator_regex, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>".format(i, i+document_page_delta), page, flags=re.M) for i, page in enumerate(ecb_pe, start=1)]
-    ecb_pe = [re.split(r"<ENTRY_CUT>", page, flags=re.M) for page in ecb_pe]
+    patterns = compile_year_patterns(year_string, tuple(pattern))
 
-    # flatten pages into one entry list, collapsing newlines
-    entries = [
-        re.sub(r"\n", " ", entry.strip()) for entries in ecb_pe for entry in entries
-    ]
+    with open_ocr(file_path) as mm:
+        with timed(run, "read"):
+            body_start, body_end, document_page_delta = find_body(year_string, mm, patterns)
 
-    total_entries = len(entries)
+        # one page in memory at a time: strip headers, cut on entry terminators, collapse newlines
+        entries = list(iter_entries(iter_body_pages(mm, body_start, body_end, run), patterns, document_page_delta, run=run))
 
     if verbose:
-        print(f"Total Entries: {total_entries}")
+        print(f"Total Entries: {len(entries)}")
 
-    # fix line-mid entries: OCR sometimes merges two entries on one line
-    # detect them by finding month+year patterns that aren't at end of line
-    month_abbrvs = [
-        "Jan", "Feb", "Mar", "Apr", "May", "June",
-        "July", "Aug", "Sept", "Oct", "Nov", "Dec",
-    ]
-
-    line_mid_re = re.compile(r".*({})\.?\W{}\.?[^\.]+".format("|".join(month_abbrvs),year))
-    line_mid_entries = [entry for entry in entries if line_mid_re.search(entry)]
+    raw_count = len(entries)
+    with timed(run, "line_mid_fix"):
+        entries = fix_line_mid_entries(entries, patterns, verbose)
+    if run is not None:
+        run.count("entries", len(entries))
+        run.count("line_mid_splits", len(entries) - raw_count)
 
     if verbose:
-        print(f"\nTotal Line Mid Entries: {len(line_mid_entries)}")
-        print(f"Percent Line Mid Entries: {len(line_mid_entries) / len(entries)}")
+        print(f"\nNew Total Entries After Line Mid Correction: {len(entries)}")
 
-    # split each line-mid entry into two separate entries
-    split_line_mid_re = re.compile(r"(({})\.?\W{}\.?(?!$))".format("|".join(month_abbrvs), year))
-    line_mid_index = [entries.index(entry) for entry in line_mid_entries]
+    return entries
+
+def fix_line_mid_by_first_index(entries, line_mid_entries, patterns):
+    """Split line-mid entries in place, resolving each to its first occurrence in entries."""
+    first_index = {}
+    for index, entry in enumerate(entries):
+        first_index.setdefault(entry, index)
 
     counter = 0  # tracks index shift from insertions
-    for index in line_mid_index:
-        match = re.search(r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>", entries[index + counter])
-        if match:
-            # carry page tags to both halves
-            page_num, document_page_num = match.group(1), match.group(2)
-            entries[index + counter] = re.sub(split_line_mid_re, "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>\\1<ENTRY_CUT>\\1<ENTRY_CUT>".format(page_num, document_page_num), entries[index + counter])
-        else:
+    for index in (first_index[entry] for entry in line_mid_entries):
+        new_entry, tagged = split_line_mid(entries[index + counter], patterns)
+        if not tagged:
             print("main is empty, here's the index", index+counter)
-            entries[index + counter] = re.sub(split_line_mid_re, "\\1<ENTRY_CUT>", entries[index + counter])
-        new_entry = re.split(r"<ENTRY_CUT>", entries[index + counter], flags=re.M)
-        new_entry[1] = re.sub(r"^\W+(?=[A-Z])", "", new_entry[1])  # strip leading junk from second half
+        new_entry[1] = LEADING_JUNK_RE.sub("", new_entry[1])  # strip leading junk from second half
         entries[index + counter] = new_entry[1]
         entries.insert(index + counter, new_entry[0])
         counter += 1
-
-    if verbose:
-        print(f"\nNew Total Entries After Line Mid Correction: {len(entries)}")
-
     return entries
 
+def get_file_path(year_string, cwd_path):
+    """Pick the right OCR file: princeton re-scans for early years, nypl for 1919/1921."""
+    if int(year_string) < 8:
+        file_name = "ecb_19" + year_string + "_princeton_070724.txt"
+    elif year_string in ("19", "21"):
+        file_name = "ecb_19" + year_string + "_nypl_070724.txt"
+    else:
+        file_name = "ecb_19" + year_string + ".txt"
+    return cwd_path + os.path.join(data_folder_path, file_name)
+
+def get_header_patterns(year_string):
+    """Header/page-number line patterns stripped from every page of a year (splitters.json header_patterns)."""
+    return list(year_splitters(year_string).header_patterns)
+
+def write_entries(entries, csv_path):
+    """Write one entry per row, the format of entries/extracted_entries."""
+    with open(csv_path, "w", newline='', encoding="utf-8", errors="ignore") as f:
+        csv_writer = csv.writer(f, quotechar='"')
+        for entry in entries:
+            csv_writer.writerow([entry])
+
+def shard_spans(mm, start, end, pages_per_shard):
+    """Cut a year's body mm[start:end] into runs of whole pages, yielding (first_page, start, end).
+
+    Shards only ever end on a form feed, and iter_entries already closes every
+    entry at the end of its page, so concatenating shard output in order gives
+    exactly the single-pass entry list.
+    """
+    if pages_per_shard <= 0:
+        yield 1, start, end
+        return
+    first_page, shard_start, pages = 1, start, 0
+    for _, page_end in iter_page_spans(mm, start, end):
+        pages += 1
+        if pages == pages_per_shard and page_end < end:
+            yield first_page, shard_start, page_end
+            first_page, shard_start, pages = first_page + pages, page_end + 1, 0
+    yield first_page, shard_start, end
+
+def extract_shard(year_string, header_patterns, file_path, start, end, document_page_delta, first_page, profile=()):
+    """Worker task: split the pages in bytes start:end of an OCR file.
+
+    Returns (entries, worker pid, seconds, stage totals for the parent's run log).
+    """
+    started = time.perf_counter()
+    run = RunLog("shard", profile=profile)
+    patterns = compile_year_patterns(year_string, header_patterns)
+    with open_ocr(file_path) as mm:
+        entries = list(iter_entries(iter_body_pages(mm, start, end, run), patterns, document_page_delta, first_page, run))
+    return entries, os.getpid(), time.perf_counter() - started, run.totals()
+
+def get_entries_parallel(year_strings, cwd_path, jobs, pages_per_shard, verbose, run=None):
+    """Extract several years on a process pool, returning {year_string: entries} and per-worker timings.
+
+    Front/appendix location runs in the parent; page shards go to workers as
+    byte ranges of the OCR file and are gathered back in (year, page) order,
+    so the result does not depend on which worker finishes first. The line-mid fix runs per year after stitching.
+    """
+    futures = {}
+    patterns_by_year = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for year_string in year_strings:
+            header_patterns = tuple(get_header_patterns(year_string))
+            patterns = compile_year_patterns(year_string, header_patterns)
+            patterns_by_year[year_string] = patterns
+
+            file_path = get_file_path(year_string, cwd_path)
+            with open_ocr(file_path) as mm, timed(run, "read"):
+                body_start, body_end, document_page_delta = find_body(year_string, mm, patterns)
+                shards = list(shard_spans(mm, body_start, body_end, pages_per_shard))
+
+            # workers map the file themselves and only receive byte offsets
+            profile = run.profile if run is not None else ()
+            for shard_index, (first_page, start, end) in enumerate(shards):
+                futures[(year_string, shard_index)] = pool.submit(
+                    extract_shard, year_string, header_patterns, file_path, start, end, document_page_delta, first_page,
+                    profile)
+
+        worker_timings = {}
+        entries_by_year = {year_string: [] for year_string in year_strings}
+        for (year_string, shard_index), future in sorted(futures.items()):
+            entries, pid, seconds, totals = future.result()
+            entries_by_year[year_string].extend(entries)
+            if run is not None:
+                run.merge(totals)
+            tasks, busy = worker_timings.get(pid, (0, 0.0))
+            worker_timings[pid] = (tasks + 1, busy + seconds)
+
+    for year_string in year_strings:
+        if verbose:
+            print("CATALOGUE YEAR:", year_string, "\n")
+            print(f"Total Entries: {len(entries_by_year[year_string])}")
+        raw_count = len(entries_by_year[year_string])
+        with timed(run, "line_mid_fix"):
+            entries_by_year[year_string] = fix_line_mid_entries(entries_by_year[year_string], patterns_by_year[year_string], verbose)
+        if run is not None:
+            run.count("entries", len(entries_by_year[year_string]))
+            run.count("line_mid_splits", len(entries_by_year[year_string]) - raw_count)
+        if verbose:
+            print(f"\nNew Total Entries After Line Mid Correction: {len(entries_by_year[year_string])}")
+
+    return entries_by_year, worker_timings
+
 if __name__ == "__main__":
 
     args = argparse_create((sys.argv[1:]))
@@ -126,46 +392,47 @@ if __name__ == "__main__":
     else:
         verbose = False
 
-    data_folder_path = '/ecb_ocr_text/'
-    entries_directory = "/entries/"
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
 
-    # loop through 1902-1922
-    for year in tqdm(range(2,23)):
-        if year < 10:
-            year = "0" + str(year)
+    # Save entries to CSV
+    if not os.path.exists(f"{cwd_path}/{entries_directory}"):
+        os.makedirs(f"{cwd_path}/{entries_directory}")
 
-        year_string = str(year)
+    if args.incremental:
+        from extraction_manifest import extract_years, print_reports
+        print_reports(extract_years(YEAR_STRINGS, cwd_path, verbose))
+        sys.exit()
 
-        cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    # stage timings and counters go to run_logs/create_entries_<time>.jsonl, summarised at the end
+    run = RunLog.create("create_entries", profile=args.profile, jobs=args.jobs, pages_per_shard=args.pages_per_shard)
 
-        # pick the right OCR file: princeton re-scans for early years, nypl for 1919/1921
-        if int(year) < 8:
-            file_name = "ecb_19" + year_string + "_princeton_070724.txt"
-            file_path = cwd_path + os.path.join(data_folder_path, file_name)
+    if args.jobs > 1:
+        start = time.perf_counter()
+        entries_by_year, worker_timings = get_entries_parallel(
+            YEAR_STRINGS, cwd_path, args.jobs, args.pages_per_shard, verbose, run)
 
-        elif year == 19 or year == 21:
-            file_name = "ecb_19" + year_string + "_nypl_070724.txt"
-            file_path = cwd_path + os.path.join(data_folder_path, file_name)
+        for year_string, entries in entries_by_year.items():
+            with timed(run, "csv_write"):
+                write_entries(entries, f"{cwd_path}/{entries_directory}/entries_19{year_string}.csv")
 
-        else:
-            file_name = "ecb_19" + year_string + ".txt"
-            file_path = cwd_path + os.path.join(data_folder_path, file_name)
-
-        header_patterns = [
-            r"(^\b[A-Z ]+\b\s?\n)",  # alphabetical guide words (e.g. "ABBOTT—ADAMS")
-            r"(##(?s:.*?)$)",  # page number markers
-            r"(^.?19{}.?\n)".format(year), # year in header
-            r"(^\d+\n)", # stray page numbers
-        ]
-
-        entries = get_entries(year_string, file_path, header_patterns, verbose)
-
-        # Save entries to CSV
-        if not os.path.exists(f"{cwd_path}/{entries_directory}"):
-            os.makedirs(f"{cwd_path}/{entries_directory}")
-
-        with open(f"{cwd_path}/{entries_directory}/entries_19{year_string}.csv",
-            "w", newline='', encoding="utf-8", errors="ignore") as f:
-            csv_writer = csv.writer(f, quotechar='"')
-            for entry in entries:
-                csv_writer.writerow([entry])
+        print(f"\nExtracted {len(entries_by_year)} years in {time.perf_counter() - start:.2f}s with {args.jobs} workers")
+        for pid, (tasks, busy) in sorted(worker_timings.items()):
+            print(f"  worker {pid}: {tasks} shards, {busy:.2f}s busy")
+            run.event("worker", pid=pid, shards=tasks, busy_seconds=round(busy, 6))
+        run.close()
+        sys.exit()
+
+    # loop through 1902-1922
+    for year_string in tqdm(YEAR_STRINGS):
+
+        file_path = get_file_path(year_string, cwd_path)
+        header_patterns = get_header_patterns(year_string)
+
+        started = time.perf_counter()
+        entries = get_entries(year_string, file_path, header_patterns, verbose, run)
+
+        with timed(run, "csv_write"):
+            write_entries(entries, f"{cwd_path}/{entries_directory}/entries_19{year_string}.csv")
+        run.event("year", year="19" + year_string, entries=len(entries), seconds=round(time.perf_counter() - started, 6))
+
+    run.close()
@@ -0,0 +1,228 @@
+"""Group repeated works across catalogue years with MinHash and LSH.
+
+A work reissued in a later year, or an entry the OCR repeated with small
+differences, has nearly the same author and title. Comparing every pair of
+~100k entries is quadratic, so:
+
+1. each entry's author(s) + title is normalised the way accuracy_check.py
+   compares text for levenshtein (non-word characters removed, lowercased)
+   and cut into 4-byte shingles;
+2. a MinHash signature of bands * rows values is computed for every entry
+   at once with numpy (multiply-shift hashes, min per entry);
+3. entries whose signatures agree on all rows of any band are candidates;
+   within one band bucket only entries at most `window` apart are paired,
+   which bounds the pairs of a huge bucket while keeping it connected;
+4. candidates are verified with accuracy_check's levenshtein and jaccard
+   (edit-distance ratio >= min_ratio and token jaccard >= min_jaccard);
+5. verified pairs are joined into clusters by label propagation.
+
+Steps 3-5 run one band at a time, and within a bucket only one entry of
+each cluster found so far is paired, so a work printed in every year costs
+about one check per copy rather than one per pair of copies.
+
+Every entry gets a cluster_id: the position of the cluster's first entry in
+the input (its own position if it has no duplicates).
+
+    python dedup_entries.py --output duplicate_clusters.csv
+"""
+import sys, time, argparse
+import numpy as np
+import pandas as pd
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+from accuracy_check import as_text, non_word_pattern, levenshtein_strings, jaccard_tokens, jaccard_similarity
+from parsed_store import store_directory, load_parsed
+
+SHINGLE_BYTES = 4
+MERSENNE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def entry_texts(df):
+    """author(s) and title joined, or "" for entries without a title."""
+    authors = as_text(df["author(s)"]).where(df["author(s)"].notna(), "")
+    titles = as_text(df["title"]).where(df["title"].notna(), "")
+    return (authors + " " + titles).where(df["title"].notna(), "")
+
+
+def shingles(keys):
+    """4-byte shingles of every key as uint32, with the index of the key each came from.
+
+    Keys are padded so a key shorter than a shingle still gets one.
+    """
+    encoded = [key.encode("utf-8") + b"\0" * (SHINGLE_BYTES - 1) if key else b"" for key in keys]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    buffer = np.frombuffer(b"".join(encoded) + b"\0" * SHINGLE_BYTES, dtype=np.uint8).astype(np.uint32)
+    values = (buffer[:-3] | buffer[1:-2] << 8 | buffer[2:-1] << 16 | buffer[3:] << 24)[:lengths.sum()]
+
+    owners = np.repeat(np.arange(len(keys)), lengths)
+    ends = np.repeat(np.cumsum(lengths), lengths)
+    valid = np.arange(len(values)) + SHINGLE_BYTES <= ends  # shingles that stay inside their key
+    return values[valid], owners[valid]
+
+
+def minhash_signatures(keys, num_perm, seed=1, block=50000):
+    """(len(keys), num_perm) uint32 MinHash signatures; keys with no shingles get all-max rows."""
+    random = np.random.default_rng(seed)
+    multipliers = random.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    offsets = random.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((len(keys), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(keys), block):
+        values, owners = shingles(keys[start:start + block])
+        if not len(values):
+            continue
+        values = values.astype(np.uint64)
+        firsts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        rows = start + owners[firsts]
+        for perm in range(num_perm):
+            hashed = ((values * multipliers[perm] + offsets[perm]) >> np.uint64(32)).astype(np.uint32)
+            signatures[rows, perm] = np.minimum.reduceat(hashed, firsts)
+    return signatures
+
+
+def band_buckets(signatures, bands, band, entries):
+    """One uint64 bucket key per entry: a hash of its signature rows in this band."""
+    rows = signatures.shape[1] // bands
+    bucket = np.full(len(entries), np.uint64(band), dtype=np.uint64)
+    for column in signatures[entries, band * rows:(band + 1) * rows].astype(np.uint64).T:
+        bucket = (bucket ^ column) * MERSENNE_MIX
+    return bucket
+
+
+def band_candidates(bucket, entries, labels, window):
+    """Unique (i, j) pairs, i < j, from different clusters sharing a bucket and at most window apart in it.
+
+    Only the first entry of each cluster in a bucket is kept, so copies already joined add no pairs.
+    """
+    order = np.lexsort((labels[entries], bucket))
+    sorted_buckets, sorted_entries = bucket[order], entries[order]
+    sorted_labels = labels[sorted_entries]
+    first = np.r_[True, (sorted_buckets[1:] != sorted_buckets[:-1]) | (sorted_labels[1:] != sorted_labels[:-1])]
+    sorted_buckets, sorted_entries = sorted_buckets[first], sorted_entries[first]
+    pairs = []
+    for distance in range(1, window + 1):
+        same = sorted_buckets[distance:] == sorted_buckets[:-distance]
+        if not same.any():
+            break
+        pairs.append(np.stack([sorted_entries[:-distance][same], sorted_entries[distance:][same]], axis=1))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    keys = np.unique(pairs[:, 0] * (entries.max() + 1) + pairs[:, 1])  # one int64 per pair sorts far faster than rows
+    return np.stack(np.divmod(keys, entries.max() + 1), axis=1)
+
+
+def verify_pairs(pairs, lev_strings, tokens, min_ratio, min_jaccard):
+    """Mask of candidate pairs close enough by edit-distance ratio and token jaccard."""
+    if not len(pairs):
+        return np.zeros(0, dtype=bool)
+    left, right = pairs[:, 0], pairs[:, 1]
+    distances = process.cpdist([lev_strings[i] for i in left], [lev_strings[j] for j in right],
+                               scorer=Levenshtein.distance, workers=-1)
+    longest = np.maximum([len(lev_strings[i]) for i in left], [len(lev_strings[j]) for j in right])
+    close = 1 - distances / np.maximum(longest, 1) >= min_ratio
+    for k in np.flatnonzero(close):
+        close[k] = jaccard_similarity(tokens[left[k]], tokens[right[k]]) >= min_jaccard
+    return close
+
+
+def connected_labels(count, pairs):
+    """Smallest entry index in each entry's connected component."""
+    labels = np.arange(count)
+    if not len(pairs):
+        return labels
+    left, right = pairs[:, 0], pairs[:, 1]
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, lowest)
+        np.minimum.at(updated, right, lowest)
+        updated = updated[updated]  # pointer jumping
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def find_duplicates(df, bands=16, rows=4, window=16, min_ratio=0.85, min_jaccard=0.6, seed=1):
+    """cluster_id and cluster_size for every row of a parsed dataframe, plus per-stage stats."""
+    stats, started = {}, time.perf_counter()
+    texts = entry_texts(df.reset_index(drop=True))
+    non_word = non_word_pattern(texts)
+    lev_strings = levenshtein_strings(texts, non_word).tolist()
+    tokens = jaccard_tokens(texts, non_word).tolist()
+    stats["normalise"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    signatures = minhash_signatures(lev_strings, bands * rows, seed)
+    stats["minhash"] = time.perf_counter() - started
+
+    # band by band, verifying only candidates not already joined through earlier bands
+    entries = np.flatnonzero([bool(s) for s in lev_strings])
+    labels = np.arange(len(df))
+    stats.update({"lsh": 0.0, "verify": 0.0, "cluster": 0.0, "candidates": 0, "verified": 0})
+    for band in range(bands):
+        started = time.perf_counter()
+        candidates = band_candidates(band_buckets(signatures, bands, band, entries), entries, labels, window)
+        stats["lsh"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        close = candidates[verify_pairs(candidates, lev_strings, tokens, min_ratio, min_jaccard)]
+        stats["verify"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        if len(close):
+            # join the clusters the new pairs connect, then relabel every entry by its cluster
+            labels = connected_labels(len(df), labels[close])[labels]
+        stats["cluster"] += time.perf_counter() - started
+        stats["candidates"] += len(candidates)
+        stats["verified"] += len(close)
+
+    clusters = pd.DataFrame({"cluster_id": labels}, index=df.index)
+    clusters["cluster_size"] = clusters.groupby("cluster_id")["cluster_id"].transform("size")
+    return clusters, stats
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Cluster repeated works across the parsed catalogue.')
+    parser.add_argument("--years", type=int, nargs="+", default=None)
+    parser.add_argument("--store", type=str, default=str(store_directory))
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--rows", type=int,
+            help="Signature rows per band.",
+            default=4)
+    parser.add_argument("--window", type=int,
+            help="Pair entries at most this far apart within a band bucket.",
+            default=16)
+    parser.add_argument("--min-ratio", type=float,
+            help="Least 1 - levenshtein / longer length for a verified pair.",
+            default=0.85)
+    parser.add_argument("--min-jaccard", type=float, default=0.6)
+    parser.add_argument("--output", type=str,
+            help="Write every entry in a cluster of two or more, with its cluster_id, to this CSV.",
+            default=None)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    df = load_parsed(columns=["author(s)", "title", "publisher", "date", "catalogue_year", "page_num"],
+                     years=args.years, store=args.store)
+    start = time.perf_counter()
+    clusters, stats = find_duplicates(df, args.bands, args.rows, args.window, args.min_ratio, args.min_jaccard)
+    seconds = time.perf_counter() - start
+
+    df = df.join(clusters)
+    repeated = df[df["cluster_size"] > 1]
+    cross_year = repeated.groupby("cluster_id")["catalogue_year"].nunique()
+    print(f"{len(df)} entries in {seconds:.2f}s ("
+          + ", ".join(f"{stage} {stats[stage]:.2f}s" for stage in ("normalise", "minhash", "lsh", "verify", "cluster"))
+          + ")")
+    print(f"{stats['candidates']} candidate pairs, {stats['verified']} verified")
+    print(f"{repeated['cluster_id'].nunique()} clusters covering {len(repeated)} entries; "
+          f"{(cross_year > 1).sum()} span more than one catalogue year")
+
+    if args.output:
+        repeated.sort_values(["cluster_id", "catalogue_year"], kind="stable").to_csv(args.output, index=False)
+        print(f"Exported {len(repeated)} entries to {args.output}")
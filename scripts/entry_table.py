@@ -0,0 +1,411 @@
+"""Entries as byte spans into the memory-mapped OCR files instead of one string each.
+
+build_year() runs the same extraction as create_entries.get_entries (body
+location, header stripping, terminator cuts, the line-mid fix) but keeps,
+for every entry, where its text lies in the OCR file: an EntryTable of
+numpy columns
+
+    year, start, end        the entry's bytes, end exclusive
+    tag                     byte offset get_entries spliced its <PAGE_NUM><DOCUMENT_PAGE_NUM>
+                            tag in before, or -1 if its text carries none
+    page_num, doc_page_num  the page the entry was cut from (known for every entry, tagged or not)
+    flags                   TAGGED, GAPS, LINE_MID_FIRST, LINE_MID_SECOND
+
+plus gaps, the header lines stripped from inside an entry's span, as
+(row, start, end) arrays sorted by row. About 35 bytes an entry, against
+some 200 for the string.
+
+Text is decoded from the mapped file only when it is asked for: text(i) is
+the entry with its page numbers left to the columns, so a date is no longer
+split by the tag ("Mar. 12", not "Mar.<PAGE_NUM:1><DOCUMENT_PAGE_NUM:11> 12");
+legacy_text(i) is exactly the string get_entries returns, and export_csv()
+writes the entries/ CSV create_entries.py writes.
+
+    python entry_table.py build --years 12 13      # entries/entry_tables/entries_19YY.npz
+    python entry_table.py export --years 12 13     # entries/entries_19YY.csv from the tables
+    python entry_table.py show --years 13 --rows 100 110
+    python entry_table.py diff old/entries_1913.npz entries/entry_tables/entries_1913.npz
+"""
+import os
+import sys
+import json
+import mmap
+import argparse
+import numpy as np
+from pathlib import Path
+
+from create_entries import (
+    LEADING_JUNK_RE, YEAR_STRINGS, compile_year_patterns, decode_span, find_body,
+    get_file_path, get_header_patterns, iter_page_spans, open_ocr, split_line_mid, write_entries,
+)
+from extraction_manifest import digest
+from instrumentation import timed
+
+table_directory = Path.cwd().parent / 'entries' / 'entry_tables'
+entries_directory = Path.cwd().parent / 'entries'
+
+TAGGED = 1           # get_entries' text carries the page tag
+GAPS = 2             # header lines were cut from inside the span
+LINE_MID_FIRST = 4   # first half of a line-mid split
+LINE_MID_SECOND = 8  # second half of a line-mid split
+
+COLUMNS = {"year": np.int16, "start": np.int64, "end": np.int64, "tag": np.int64,
+           "page_num": np.int32, "doc_page_num": np.int32, "flags": np.uint8}
+
+def page_tag(page_num, doc_page_num):
+    return "<PAGE_NUM:{}><DOCUMENT_PAGE_NUM:{}>".format(page_num, doc_page_num)
+
+def char_offsets(mm, start, end, text):
+    """Byte offset in mm of each character of text (decoded from mm[start:end]), then of the end of the last one."""
+    if len(text) == end - start and text.isascii():
+        return np.arange(start, end + 1, dtype=np.int64)
+    points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    offsets = np.empty(len(text) + 1, dtype=np.int64)
+    offsets[0] = start
+    np.cumsum(1 + (points >= 0x80) + (points >= 0x800) + (points >= 0x10000), out=offsets[1:])
+    offsets[1:] += start
+    if offsets[-1] == end:
+        return offsets
+    # undecodable bytes were dropped: walk the characters, skipping bytes until each one's encoding
+    position = start
+    for i, character in enumerate(text):
+        encoded = character.encode("utf-8")
+        while mm[position:position + len(encoded)] != encoded:
+            position += 1
+        offsets[i] = position
+        position += len(encoded)
+    offsets[-1] = position
+    return offsets
+
+def strip_headers(page, headers):
+    """remove_patterns, also returning the index in page of every character kept."""
+    kept = np.arange(len(page))
+    for pattern in headers:
+        spans = [match.span() for match in pattern.finditer(page) if match.end() > match.start()]
+        if not spans:
+            continue
+        keep = np.ones(len(page), dtype=bool)
+        for start, end in spans:
+            keep[start:end] = False
+        page = pattern.sub('', page)
+        kept = kept[keep]
+    return page, kept
+
+def span_row(kept, jumps, offsets, a, b, tag, page_num, doc_page_num):
+    """Row for characters a:b of a header-stripped page (tag: character the page tag goes before, or None).
+
+    jumps holds each k where kept[k + 1] isn't kept[k] + 1, i.e. where stripped header text was.
+    """
+    if a == b:
+        position = int(offsets[kept[a]] if a < len(kept) else offsets[-1])
+        return (position, position, -1, page_num, doc_page_num, 0, ())
+    first, last = np.searchsorted(jumps, [a, b - 1])
+    gaps = tuple((int(offsets[kept[k] + 1]), int(offsets[kept[k + 1]])) for k in jumps[first:last])
+    flags = (GAPS if gaps else 0) | (TAGGED if tag is not None else 0)
+    return (int(offsets[kept[a]]), int(offsets[kept[b - 1] + 1]), -1 if tag is None else int(offsets[kept[tag]]),
+            page_num, doc_page_num, flags, gaps)
+
+def page_rows(mm, page_start, page_end, patterns, page_num, doc_page_num):
+    """Rows and get_entries' texts for one body page: split_page, then strip() and newlines to spaces."""
+    page = decode_span(mm, page_start, page_end)
+    offsets = char_offsets(mm, page_start, page_end, page)
+    text, kept = strip_headers(page, patterns.headers)
+    jumps = np.flatnonzero(np.diff(kept) != 1)
+    tag = page_tag(page_num, doc_page_num)
+    rows, texts, last = [], [], 0
+    for match in patterns.terminator.finditer(text):
+        head, tail = text[last:match.start()], text[match.start():match.end()]
+        a = last + len(head) - len(head.lstrip())
+        b = match.start() + len(tail.rstrip())
+        rows.append(span_row(kept, jumps, offsets, a, b, match.start(), page_num, doc_page_num))
+        texts.append((text[a:match.start()] + tag + text[match.start():b]).replace("\n", " "))
+        last = match.end()
+    rest = text[last:]
+    a = last + len(rest) - len(rest.lstrip())
+    b = a + len(rest.strip())
+    rows.append(span_row(kept, jumps, offsets, a, b, None, page_num, doc_page_num))
+    texts.append(text[a:b].replace("\n", " "))
+    return rows, texts
+
+def row_segments(start, end, gaps):
+    """Byte ranges of a row's text: its span less its gaps."""
+    segments, position = [], start
+    for gap_start, gap_end in gaps:
+        segments.append((position, gap_start))
+        position = gap_end
+    segments.append((position, end))
+    return segments
+
+def legacy_chars(mm, row):
+    """(start, end) bytes of each character of a row's get_entries text, (-1, -1) for the page tag's."""
+    start, end, tag, page_num, doc_page_num, flags, gaps = row
+    chars = []
+    for segment_start, segment_end in row_segments(start, end, gaps):
+        offsets = char_offsets(mm, segment_start, segment_end, decode_span(mm, segment_start, segment_end))
+        for i in range(len(offsets) - 1):
+            if offsets[i] == tag:
+                chars.extend([(-1, -1)] * len(page_tag(page_num, doc_page_num)))
+            chars.append((int(offsets[i]), int(offsets[i + 1])))
+    return chars
+
+def piece_row(row, chars, a, b, new_tag, flags):
+    """Row for characters a:b of another row's get_entries text, with the page tag before character new_tag if given."""
+    selected = chars[a:b]
+    tag_chars = sum(1 for char in selected if char[0] < 0)
+    tag = -1
+    if tag_chars:
+        # the whole tag came along: it goes before the next character of text
+        following = [i for i in range(len(selected)) if selected[i][0] < 0][-1] + 1
+        if tag_chars != len(page_tag(row[3], row[4])) or following == len(selected):
+            raise ValueError("a line-mid split cut through an entry's page tag")
+        tag = selected[following][0]
+    if new_tag is not None:
+        tag = chars[new_tag][0]
+    text_chars = [char for char in selected if char[0] >= 0]
+    if not text_chars:
+        return (row[0], row[0], -1, row[3], row[4], flags, ())
+    gaps = tuple((previous[1], char[0]) for previous, char in zip(text_chars, text_chars[1:]) if previous[1] != char[0])
+    flags |= (GAPS if gaps else 0) | (TAGGED if tag >= 0 else 0)
+    return (text_chars[0][0], text_chars[-1][1], tag, row[3], row[4], flags, gaps)
+
+def split_row(mm, row, text, patterns):
+    """The two halves fix_line_mid_entries keeps of a line-mid entry, as (rows, texts)."""
+    halves, tagged = split_line_mid(text, patterns)
+    halves = [halves[0], LEADING_JUNK_RE.sub("", halves[1])]
+    first, *rest = patterns.split_line_mid.finditer(text)
+    if tagged:
+        # split_line_mid puts the tag before the date and repeats the date as the second half
+        pieces = [(0, first.end(), first.start()), (first.start(), first.end(), None)]
+    else:
+        pieces = [(0, first.end(), None), (first.end(), rest[0].end() if rest else len(text), None)]
+    junk = LEADING_JUNK_RE.match(text[pieces[1][0]:pieces[1][1]])
+    if junk:
+        pieces[1] = (pieces[1][0] + junk.end(), pieces[1][1], None)
+    chars = legacy_chars(mm, row)
+    rows = [piece_row(row, chars, a, b, new_tag, flags)
+            for (a, b, new_tag), flags in zip(pieces, (LINE_MID_FIRST, LINE_MID_SECOND))]
+    return rows, halves
+
+def fix_line_mid_rows(mm, rows, texts, patterns):
+    """fix_line_mid_entries on rows, with their texts alongside."""
+    flags = [patterns.line_mid.search(text) is not None for text in texts]
+    line_mid_texts = [text for text, flag in zip(texts, flags) if flag]
+    if len(set(line_mid_texts)) != len(line_mid_texts):
+        # fix_line_mid_by_first_index: each split lands on the first copy of its text
+        first_index = {}
+        for index, text in enumerate(texts):
+            first_index.setdefault(text, index)
+        for counter, index in enumerate(first_index[text] for text in line_mid_texts):
+            halves, half_texts = split_row(mm, rows[index + counter], texts[index + counter], patterns)
+            rows[index + counter:index + counter + 1] = halves
+            texts[index + counter:index + counter + 1] = half_texts
+        return rows, texts
+    fixed_rows, fixed_texts = [], []
+    for row, text, flag in zip(rows, texts, flags):
+        if flag:
+            halves, half_texts = split_row(mm, row, text, patterns)
+            fixed_rows.extend(halves)
+            fixed_texts.extend(half_texts)
+        else:
+            fixed_rows.append(row)
+            fixed_texts.append(text)
+    return fixed_rows, fixed_texts
+
+def build_year(year_string, file_path, header_patterns, run=None):
+    """The entries get_entries returns for a year, as an EntryTable."""
+    patterns = compile_year_patterns(year_string, tuple(header_patterns))
+    rows, texts = [], []
+    with open_ocr(file_path) as mm:
+        with timed(run, "read"):
+            body_start, body_end, document_page_delta = find_body(year_string, mm, patterns)
+        with timed(run, "terminator_tagging"):
+            for page_num, (page_start, page_end) in enumerate(iter_page_spans(mm, body_start, body_end), start=1):
+                page_row_list, page_texts = page_rows(mm, page_start, page_end, patterns, page_num,
+                                                      page_num + document_page_delta)
+                rows.extend(page_row_list)
+                texts.extend(page_texts)
+        with timed(run, "line_mid_fix"):
+            rows, texts = fix_line_mid_rows(mm, rows, texts, patterns)
+        source = {"path": os.path.abspath(file_path), "size": len(mm), "digest": digest(mm)}
+    return EntryTable.from_rows(int("19" + year_string), rows, source)
+
+class EntryTable:
+    """Entries as byte spans of memory-mapped OCR files: numpy columns, text decoded only when asked for."""
+
+    def __init__(self, columns, gaps, sources):
+        self.year, self.start, self.end, self.tag = (columns[name] for name in ("year", "start", "end", "tag"))
+        self.page_num, self.doc_page_num, self.flags = (columns[name] for name in ("page_num", "doc_page_num", "flags"))
+        self.gap_row, self.gap_start, self.gap_end = gaps
+        self.sources = sources  # {"1913": {"path": ..., "size": ..., "digest": blake2b of the OCR file}}
+        self.maps = {}
+
+    @classmethod
+    def from_rows(cls, year, rows, source):
+        """A one-year table from (start, end, tag, page_num, doc_page_num, flags, gaps) tuples."""
+        columns = {name: np.fromiter((row[i] for row in rows), dtype=dtype, count=len(rows))
+                   for i, (name, dtype) in enumerate(list(COLUMNS.items())[1:])}
+        columns["year"] = np.full(len(rows), year, dtype=COLUMNS["year"])
+        gaps = [(i, gap_start, gap_end) for i, row in enumerate(rows) for gap_start, gap_end in row[6]]
+        gap_arrays = tuple(np.array([gap[k] for gap in gaps], dtype=np.int64) for k in range(3))
+        return cls(columns, gap_arrays, {str(year): source})
+
+    @classmethod
+    def concat(cls, tables):
+        lengths = np.cumsum([0] + [len(table) for table in tables])
+        columns = {name: np.concatenate([getattr(table, name) for table in tables]) for name in COLUMNS}
+        gaps = (np.concatenate([table.gap_row + offset for table, offset in zip(tables, lengths)]),
+                np.concatenate([table.gap_start for table in tables]),
+                np.concatenate([table.gap_end for table in tables]))
+        return cls(columns, gaps, {year: source for table in tables for year, source in table.sources.items()})
+
+    def __len__(self):
+        return len(self.start)
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in COLUMNS) + self.gap_row.nbytes * 3
+
+    def source(self, year):
+        """The year's OCR file, mapped once; refuses a file whose contents changed since the table was built."""
+        year = str(year)
+        if year not in self.maps:
+            source = self.sources[year]
+            if os.path.getsize(source["path"]) != source["size"]:
+                raise ValueError(f"{source['path']} changed since its entry table was built; rebuild it")
+            with open(source["path"], "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # an OCR fix of the same length moves no offsets but changes the text under them
+            if digest(mm) != source.get("digest"):
+                mm.close()
+                raise ValueError(f"{source['path']} changed since its entry table was built; rebuild it")
+            self.maps[year] = mm
+        return self.maps[year]
+
+    def close(self):
+        for mm in self.maps.values():
+            mm.close()
+        self.maps = {}
+
+    def segments(self, i):
+        """Byte ranges of row i's text in its OCR file."""
+        if not self.flags[i] & GAPS:
+            return [(int(self.start[i]), int(self.end[i]))]
+        first, last = np.searchsorted(self.gap_row, [i, i + 1])
+        return row_segments(int(self.start[i]), int(self.end[i]),
+                            zip(self.gap_start[first:last].tolist(), self.gap_end[first:last].tolist()))
+
+    def text(self, i):
+        """Row i's entry text, its page numbers left out."""
+        mm = self.source(self.year[i])
+        return "".join(decode_span(mm, start, end) for start, end in self.segments(i)).replace("\n", " ")
+
+    def legacy_text(self, i):
+        """Row i exactly as create_entries.get_entries returns it, page tag and all."""
+        if not self.flags[i] & TAGGED:
+            return self.text(i)
+        mm, tag = self.source(self.year[i]), int(self.tag[i])
+        parts = []
+        for start, end in self.segments(i):
+            if start <= tag < end:
+                parts += [decode_span(mm, start, tag), page_tag(self.page_num[i], self.doc_page_num[i]),
+                          decode_span(mm, tag, end)]
+            else:
+                parts.append(decode_span(mm, start, end))
+        return "".join(parts).replace("\n", " ")
+
+    def texts(self, legacy=False):
+        text = self.legacy_text if legacy else self.text
+        for i in range(len(self)):
+            yield text(i)
+
+    def export_csv(self, csv_path):
+        """The entries CSV create_entries.py writes for these rows."""
+        write_entries(self.texts(legacy=True), csv_path)
+
+    def to_frame(self, rows=None):
+        """entry, ecb_issue, page_num, doc_page_num (main_entry_classifier.read_extracted's layout) plus the spans."""
+        import pandas as pd
+        rows = range(len(self)) if rows is None else rows
+        index = np.asarray(rows, dtype=np.int64)
+        return pd.DataFrame({"entry": [self.text(i) for i in index], "ecb_issue": self.year[index].astype(str),
+                             "page_num": self.page_num[index], "doc_page_num": self.doc_page_num[index],
+                             "start": self.start[index], "end": self.end[index]}, index=index)
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in COLUMNS}, gap_row=self.gap_row,
+                            gap_start=self.gap_start, gap_end=self.gap_end, sources=np.array(json.dumps(self.sources)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in COLUMNS}, (data["gap_row"], data["gap_start"], data["gap_end"]),
+                       json.loads(str(data["sources"])))
+
+def diff(old, new):
+    """Row indices only in old and only in new, matching rows on year, span, tag and flags."""
+    import pandas as pd
+    def keys(table):
+        return pd.MultiIndex.from_arrays([table.year, table.start, table.end, table.tag, table.flags])
+    old_keys, new_keys = keys(old), keys(new)
+    return np.flatnonzero(~old_keys.isin(new_keys)), np.flatnonzero(~new_keys.isin(old_keys))
+
+def table_path(year_string):
+    return table_directory / f"entries_19{year_string}.npz"
+
+def print_rows(table, rows):
+    for i in rows:
+        print(f"{i:>7} {table.year[i]} p{table.page_num[i]}/{table.doc_page_num[i]} "
+              f"bytes {table.start[i]}-{table.end[i]}  {table.text(i)}")
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Build, export, inspect or compare entry tables (entries as OCR byte spans).')
+    parser.add_argument("command", choices=["build", "export", "show", "diff"])
+    parser.add_argument("tables", type=str, nargs="*",
+            help="diff: the old and the new table (.npz).")
+    parser.add_argument("--years", type=str, nargs="+",
+            help="Two-digit catalogue years.",
+            default=YEAR_STRINGS)
+    parser.add_argument("--rows", type=int, nargs=2,
+            help="show: first and last (exclusive) row.",
+            default=[0, 20])
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    cwd_path = str(Path.cwd().parent)
+
+    if args.command == "build":
+        table_directory.mkdir(parents=True, exist_ok=True)
+        for year_string in args.years:
+            table = build_year(year_string, get_file_path(year_string, cwd_path), get_header_patterns(year_string))
+            table.save(table_path(year_string))
+            print(f"19{year_string}: {len(table)} entries, {table.nbytes() / len(table):.1f} bytes each, "
+                  f"{int((table.flags & GAPS > 0).sum())} with header lines cut out")
+
+    elif args.command == "export":
+        for year_string in args.years:
+            table = EntryTable.load(table_path(year_string))
+            table.export_csv(entries_directory / f"entries_19{year_string}.csv")
+            table.close()
+            print(f"19{year_string}: wrote {len(table)} entries")
+
+    elif args.command == "show":
+        table = EntryTable.concat([EntryTable.load(table_path(year_string)) for year_string in args.years])
+        print_rows(table, range(args.rows[0], min(args.rows[1], len(table))))
+
+    else:
+        if len(args.tables) != 2:
+            sys.exit("diff takes the old and the new table")
+        old, new = (EntryTable.load(path) for path in args.tables)
+        removed, added = diff(old, new)
+        print(f"{len(removed)} rows only in {args.tables[0]}, {len(added)} only in {args.tables[1]}")
+        changed = [year for year, source in old.sources.items()
+                   if source.get("digest") != new.sources.get(year, {}).get("digest")]
+        if changed:
+            # offsets past an OCR fix don't line up, and the old spans can't be decoded from the new file
+            print(f"The OCR files of {', '.join(changed)} changed between the two builds; old rows are shown as spans only")
+        for name, table, rows in (("-", old, removed), ("+", new, added)):
+            for i in rows:
+                text = "" if table is old and str(table.year[i]) in changed else table.text(i)
+                print(f"{name} {i:>7} p{table.page_num[i]}/{table.doc_page_num[i]} bytes {table.start[i]}-{table.end[i]}  "
+                      f"{text}")
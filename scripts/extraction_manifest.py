@@ -0,0 +1,227 @@
+"""Incremental re-extraction for create_entries.py --incremental.
+
+A JSON manifest next to the entries CSVs records, per year, a hash of every
+form-feed page of the OCR file, a hash of the year's splitter config, where
+the body starts and ends, and how many CSV rows each body page produced.
+
+On a re-run only the body pages whose hash changed, plus the pages either side
+of them (front/appendix matches are searched two pages at a time), are split
+again. Their rows are swapped into the existing CSV; every other row is left
+exactly as it was, so hand corrections elsewhere in the file still line up.
+The `<PAGE_NUM:n>` tags in the old rows are checked against the manifest's
+row counts before anything is replaced.
+
+A year is extracted from scratch instead when there is no manifest entry or
+CSV for it, its splitter config or the extraction code changed, the body
+boundaries moved to another page or the page count changed, the old rows'
+page tags don't agree with the manifest, or line-mid text repeats (the
+line-mid fix then depends on the whole year).
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import bisect
+from pathlib import Path
+
+from create_entries import (
+    PAGE_TAG_RE, entries_directory, compile_year_patterns, find_body, fix_line_mid_entries,
+    get_file_path, get_header_patterns, get_splitters_by_year, iter_entries, iter_page_spans,
+    decode_span, open_ocr, write_entries,
+)
+
+MANIFEST_NAME = "extraction_manifest.json"
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def extractor_digest():
+    """Hash of the code that decides how pages become entries."""
+    scripts = Path(__file__).parent
+    return digest(b"".join((scripts / name).read_bytes() for name in ("create_entries.py", "extraction_manifest.py")))
+
+def splitter_digest(year_string, header_patterns):
+    """Hash of one year's front, appendix and year-variation splitters plus its header patterns."""
+    front_pattern, appendix_pattern, year_variations = get_splitters_by_year(year_string)
+    config = [front_pattern, appendix_pattern, list(year_variations), list(header_patterns)]
+    return digest(json.dumps(config).encode("utf-8"))
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"extractor": None, "years": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, path):
+    temporary = str(path) + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(temporary, path)
+
+def read_entries(csv_path):
+    """Rows of an entries CSV written by write_entries."""
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        return [row[0] if row else "" for row in csv.reader(f, quotechar='"')]
+
+def split_body_page(page, page_num, patterns, document_page_delta):
+    """Raw (pre line-mid fix) entries of one body page."""
+    return list(iter_entries([page], patterns, document_page_delta, first_page=page_num))
+
+def line_mid_digests(raw_entries, patterns):
+    return [digest(entry.encode("utf-8")) for entry in raw_entries if patterns.line_mid.search(entry)]
+
+def scan_year(year_string, mm, patterns):
+    """Page hashes and body location of one mapped OCR file."""
+    spans = list(iter_page_spans(mm))
+    page_digests = [digest(mm[start:end]) for start, end in spans]
+    body_start, body_end, document_page_delta = find_body(year_string, mm, patterns)
+    starts = [start for start, _ in spans]
+    start_page = bisect.bisect_right(starts, body_start) - 1
+    end_page = bisect.bisect_right(starts, body_end) - 1
+    body = {
+        "start_page": start_page, "start_offset": body_start - starts[start_page],
+        "end_page": end_page, "end_offset": body_end - starts[end_page],
+        "delta": document_page_delta, "file_pages": len(spans),
+    }
+    return page_digests, body, (body_start, body_end, document_page_delta)
+
+def extract_full(year_string, mm, patterns, body_range, verbose):
+    """Every body page from scratch: (entries, per-page row counts or None, per-page line-mid digests)."""
+    body_start, body_end, document_page_delta = body_range
+    raw_pages = [split_body_page(decode_span(mm, start, end), page_num, patterns, document_page_delta)
+                 for page_num, (start, end) in enumerate(iter_page_spans(mm, body_start, body_end), start=1)]
+    line_mids = [line_mid_digests(raw, patterns) for raw in raw_pages]
+
+    all_line_mids = [d for page in line_mids for d in page]
+    if len(set(all_line_mids)) != len(all_line_mids):
+        # repeated line-mid text: the fix resolves copies across pages, so rows can't be tied to a page
+        entries = fix_line_mid_entries([entry for raw in raw_pages for entry in raw], patterns, verbose)
+        return entries, None, line_mids
+
+    fixed_pages = [fix_line_mid_entries(raw, patterns, False) for raw in raw_pages]
+    return [entry for page in fixed_pages for entry in page], [len(page) for page in fixed_pages], line_mids
+
+def tags_agree(rows, row_counts):
+    """True if every <PAGE_NUM:n> tag sits in the rows the manifest gives to page n."""
+    position = 0
+    for page_num, count in enumerate(row_counts, start=1):
+        for row in rows[position:position + count]:
+            for match in PAGE_TAG_RE.finditer(row):
+                if match.group(1) != str(page_num):
+                    return False
+        position += count
+    return position == len(rows)
+
+def extract_year(year_string, cwd_path, manifest, verbose=False):
+    """Bring one year's entries CSV up to date, rewriting as little as possible.
+
+    Updates manifest["years"][year_string] and returns a report dict.
+    """
+    started = time.perf_counter()
+    header_patterns = tuple(get_header_patterns(year_string))
+    patterns = compile_year_patterns(year_string, header_patterns)
+    csv_path = f"{cwd_path}/{entries_directory}/entries_19{year_string}.csv"
+    splitters = splitter_digest(year_string, header_patterns)
+    previous = manifest["years"].get(year_string)
+
+    with open_ocr(get_file_path(year_string, cwd_path)) as mm:
+        page_digests, body, body_range = scan_year(year_string, mm, patterns)
+        page_count = body["end_page"] - body["start_page"] + 1
+
+        reason = None
+        if previous is None or not os.path.exists(csv_path):
+            reason = "no previous extraction"
+        elif manifest["extractor"] != extractor_digest():
+            reason = "extraction code changed"
+        elif previous["splitters"] != splitters:
+            reason = "splitter config changed"
+        elif previous["row_counts"] is None:
+            reason = "line-mid text repeats"
+        elif any(previous["body"][key] != body[key] for key in ("start_page", "end_page", "delta", "file_pages")):
+            reason = "body boundaries or page count changed"
+
+        if reason is None:
+            rows = read_entries(csv_path)
+            if not tags_agree(rows, previous["row_counts"]):
+                reason = "page tags in the CSV don't match the manifest"
+
+        if reason is not None:
+            entries, row_counts, line_mids = extract_full(year_string, mm, patterns, body_range, verbose)
+            write_entries(entries, csv_path)
+            seconds = time.perf_counter() - started
+            manifest["years"][year_string] = {
+                "splitters": splitters, "body": body, "pages": page_digests, "row_counts": row_counts,
+                "line_mids": line_mids, "full_seconds": seconds,
+            }
+            return {"year": year_string, "mode": "full", "reason": reason, "pages": page_count,
+                    "pages_recomputed": page_count, "rows_replaced": None, "rows_written": len(entries),
+                    "seconds": seconds, "saved": 0.0}
+
+        # body page k is file page start_page + k - 1; re-split changed pages and their neighbours
+        start_page = body["start_page"]
+        changed = {k for k in range(1, page_count + 1)
+                   if page_digests[start_page + k - 1] != previous["pages"][start_page + k - 1]}
+        if body["start_offset"] != previous["body"]["start_offset"]:
+            changed.add(1)
+        if body["end_offset"] != previous["body"]["end_offset"]:
+            changed.add(page_count)
+        dirty = sorted({n for k in changed for n in (k - 1, k, k + 1) if 1 <= n <= page_count})
+
+        body_start, body_end, document_page_delta = body_range
+        body_spans = list(iter_page_spans(mm, body_start, body_end))
+        raw_pages = {k: split_body_page(decode_span(mm, *body_spans[k - 1]), k, patterns, document_page_delta)
+                     for k in dirty}
+
+    line_mids = list(previous["line_mids"])
+    for k, raw in raw_pages.items():
+        line_mids[k - 1] = line_mid_digests(raw, patterns)
+    all_line_mids = [d for page in line_mids for d in page]
+    if len(set(all_line_mids)) != len(all_line_mids):
+        previous["row_counts"] = None  # force the whole-year path above
+        return extract_year(year_string, cwd_path, manifest, verbose)
+
+    row_counts = list(previous["row_counts"])
+    offsets = [0]
+    for count in row_counts:
+        offsets.append(offsets[-1] + count)
+
+    patched, replaced, written, position = [], 0, 0, 0
+    for k in dirty:
+        new_rows = fix_line_mid_entries(raw_pages[k], patterns, False)
+        patched.extend(rows[position:offsets[k - 1]])
+        patched.extend(new_rows)
+        position = offsets[k]
+        replaced += row_counts[k - 1]
+        written += len(new_rows)
+        row_counts[k - 1] = len(new_rows)
+    patched.extend(rows[position:])
+
+    if patched != rows:
+        write_entries(patched, csv_path)
+    seconds = time.perf_counter() - started
+    previous.update({"body": body, "pages": page_digests, "row_counts": row_counts, "line_mids": line_mids})
+    return {"year": year_string, "mode": "incremental" if dirty else "unchanged", "reason": None,
+            "pages": page_count, "pages_recomputed": len(dirty), "rows_replaced": replaced, "rows_written": written,
+            "seconds": seconds, "saved": max(previous.get("full_seconds", 0.0) - seconds, 0.0)}
+
+def extract_years(year_strings, cwd_path, verbose=False, manifest_path=None):
+    """extract_year over several years, saving the manifest at the end. Returns the reports."""
+    manifest_path = manifest_path or f"{cwd_path}/{entries_directory}/{MANIFEST_NAME}"
+    manifest = load_manifest(manifest_path)
+    reports = [extract_year(year_string, cwd_path, manifest, verbose) for year_string in year_strings]
+    manifest["extractor"] = extractor_digest()
+    save_manifest(manifest, manifest_path)
+    return reports
+
+def print_reports(reports):
+    print(f"{'year':<6}{'mode':<13}{'pages':>13}{'replaced':>10}{'written':>9}{'seconds':>9}{'saved':>8}  reason")
+    for report in reports:
+        pages = f"{report['pages_recomputed']}/{report['pages']}"
+        replaced = "all" if report["rows_replaced"] is None else report["rows_replaced"]
+        print(f"19{report['year']:<4}{report['mode']:<13}{pages:>13}{replaced:>10}{report['rows_written']:>9}"
+              f"{report['seconds']:>9.2f}{report['saved']:>8.2f}  {report['reason'] or ''}")
+    recomputed = sum(report["pages_recomputed"] for report in reports)
+    total = sum(report["pages"] for report in reports)
+    print(f"Recomputed {recomputed} of {total} pages and {sum(r['rows_written'] for r in reports)} entries "
+          f"in {sum(r['seconds'] for r in reports):.2f}s, about {sum(r['saved'] for r in reports):.2f}s less than a full run")
@@ -0,0 +1,232 @@
+"""Stage timers, counters and a JSONL run log shared by create_entries.py and llm_parser.py.
+
+    run = RunLog.create("create_entries", profile=["header_strip"])  # RunLog(name) alone logs nothing to disk
+    with run.stage("header_strip"):
+        ...
+    with run.stage("year", log=True, year="1913"):
+        ...
+    run.event("worker", pid=pid)
+    run.count("entries", len(entries))
+    run.observe("api_latency", seconds)
+    run.close()  # writes the summary line and prints the report
+
+The log is run_logs/<name>_<time>.jsonl: a start line, one line per
+event() and per stage(..., log=True) exit, and last the summary (seconds
+and calls for every stage, logged or not, counters, and p50/p95/p99 of
+observed values). Stages named in `profile` (or "all") run
+under cProfile, and their stats are saved next to the log.
+
+    python instrumentation.py report ../run_logs/create_entries_20260101-120000.jsonl
+    python instrumentation.py compare OLD.jsonl NEW.jsonl --tolerance 0.2
+"""
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import contextlib
+from pathlib import Path
+
+run_log_directory = Path.cwd().parent / 'run_logs'
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProfileData:
+    """Stats gathered elsewhere (a worker process) in the shape pstats.Stats loads."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RunLog:
+    """Accumulates stage times, counters and samples for one run; path=None keeps them in memory only."""
+
+    def __init__(self, name, path=None, profile=(), **fields):
+        self.name = name
+        self.path = Path(path) if path else None
+        self.profile = set(profile or ())
+        self.started = time.perf_counter()
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        self.samples = {}
+        self.profilers = {}
+        self.merged_profiles = {}  # stage -> pstats dicts from workers
+        self.profiling = False  # cProfile can't nest, so only the outermost profiled stage is profiled
+        self.file = None
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, "w", encoding="utf-8")
+        self.event("start", **fields)
+
+    @classmethod
+    def create(cls, name, directory=run_log_directory, profile=(), **fields):
+        """A run logging to directory/<name>_<local time>.jsonl."""
+        return cls(name, Path(directory) / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}.jsonl", profile, **fields)
+
+    def event(self, kind, **fields):
+        if self.file:
+            record = {"event": kind, "run": self.name, "t": round(time.perf_counter() - self.started, 6), **fields}
+            self.file.write(json.dumps(record, default=str) + "\n")
+
+    @contextlib.contextmanager
+    def stage(self, name, log=False, **fields):
+        """Time a block under name; log=True also writes it as its own event (for coarse stages)."""
+        profiler = None
+        if not self.profiling and (name in self.profile or "all" in self.profile):
+            profiler = self.profilers.setdefault(name, cProfile.Profile())
+            self.profiling = True
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                self.profiling = False
+            self.add_time(name, seconds)
+            if log:
+                self.event("stage", stage=name, seconds=round(seconds, 6), **fields)
+
+    def add_time(self, name, seconds, calls=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        self.samples.setdefault(name, []).append(value)
+
+    def totals(self):
+        """Stage times, calls, counters, samples and profiles as plain data, e.g. to return from a worker process."""
+        return {"seconds": self.seconds, "calls": self.calls, "counters": self.counters, "samples": self.samples,
+                "profiles": {name: pstats.Stats(profiler).stats for name, profiler in self.profilers.items()}}
+
+    def merge(self, totals):
+        """Add another run's totals() (a worker's) into this one."""
+        for name, seconds in totals["seconds"].items():
+            self.add_time(name, seconds, totals["calls"][name])
+        for name, amount in totals["counters"].items():
+            self.count(name, amount)
+        for name, values in totals["samples"].items():
+            self.samples.setdefault(name, []).extend(values)
+        for name, stats in totals.get("profiles", {}).items():
+            self.merged_profiles.setdefault(name, []).append(stats)
+
+    def summary(self):
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": {name: {"seconds": round(self.seconds[name], 6), "calls": self.calls[name]}
+                       for name in self.seconds},
+            "counters": dict(self.counters),
+            "distributions": {name: {"count": len(values), "p50": round(percentile(values, 0.50), 6),
+                                     "p95": round(percentile(values, 0.95), 6),
+                                     "p99": round(percentile(values, 0.99), 6)}
+                              for name, values in self.samples.items()},
+        }
+
+    def close(self, report=True):
+        """Write the summary (and any profiles), close the log, and print the report. Returns the summary."""
+        summary = self.summary()
+        self.event("summary", **summary)
+        if self.file:
+            self.file.close()
+            self.file = None
+        for name in sorted(set(self.profilers) | set(self.merged_profiles)):
+            sources = ([self.profilers[name]] if name in self.profilers else []) + \
+                      [ProfileData(stats) for stats in self.merged_profiles.get(name, [])]
+            stats = pstats.Stats(sources[0])
+            for source in sources[1:]:
+                stats.add(source)
+            profile_path = self.path.with_name(f"{self.path.stem}_{name}.prof") if self.path else None
+            if profile_path:
+                stats.dump_stats(profile_path)
+            if report:
+                print(f"\nProfile of stage {name}" + (f" (saved to {profile_path})" if profile_path else ""))
+                stats.sort_stats("cumulative").print_stats(12)
+        if report:
+            print_summary(summary, self.path)
+        return summary
+
+
+def timed(run, name, **fields):
+    """run.stage(name), or a no-op when there is no run."""
+    return run.stage(name, **fields) if run is not None else contextlib.nullcontext()
+
+
+def print_summary(summary, path=None):
+    stages = summary["stages"]
+    staged = sum(stage["seconds"] for stage in stages.values()) or 1.0
+    print(f"\n{'stage':<22}{'seconds':>10}{'calls':>9}{'share':>8}")
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name:<22}{stage['seconds']:>10.3f}{stage['calls']:>9}{stage['seconds'] / staged:>8.1%}")
+    print(f"{'wall':<22}{summary['wall_seconds']:>10.3f}")
+    for name, value in summary["counters"].items():
+        print(f"  {name}: {value}")
+    for name, distribution in summary["distributions"].items():
+        print(f"  {name}: p50 {distribution['p50']:.4f}  p95 {distribution['p95']:.4f}  "
+              f"p99 {distribution['p99']:.4f}  (n={distribution['count']})")
+    if path:
+        print(f"Run log: {path}")
+
+
+def read_summary(path):
+    """The summary record of a run log."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["event"] == "summary":
+                return record
+    raise ValueError(f"{path} has no summary; the run may not have finished")
+
+
+def compare_summaries(old, new, tolerance, min_seconds=0.05):
+    """(stage, old seconds, new seconds, regressed) for every stage in either run."""
+    rows = []
+    for name in sorted(set(old["stages"]) | set(new["stages"])):
+        before = old["stages"].get(name, {}).get("seconds", 0.0)
+        after = new["stages"].get(name, {}).get("seconds", 0.0)
+        rows.append((name, before, after, after > before * (1 + tolerance) and after - before > min_seconds))
+    return rows
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Report on run logs, or compare two runs stage by stage.')
+    parser.add_argument("command", choices=["report", "compare"])
+    parser.add_argument("logs", type=str, nargs="+")
+    parser.add_argument("--tolerance", type=float,
+            help="compare: fail when a stage is slower than this fraction over the old run.",
+            default=0.2)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    if args.command == "report":
+        for log in args.logs:
+            print_summary(read_summary(log), log)
+        sys.exit()
+
+    if len(args.logs) != 2:
+        sys.exit("compare takes an old and a new run log")
+    rows = compare_summaries(read_summary(args.logs[0]), read_summary(args.logs[1]), args.tolerance)
+    print(f"{'stage':<22}{'old s':>10}{'new s':>10}{'change':>9}")
+    for name, before, after, regressed in rows:
+        change = f"{after / before - 1:+.0%}" if before else "new"
+        print(f"{name:<22}{before:>10.3f}{after:>10.3f}{change:>9}  {'REGRESSED' if regressed else ''}")
+    if any(regressed for *_, regressed in rows):
+        sys.exit(f"Stages slower by more than {args.tolerance:.0%}.")
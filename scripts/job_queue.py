@@ -0,0 +1,259 @@
+"""Durable per-entry job queue for llm_parser.py --queue.
+
+One row per main entry, keyed by a stable ID built from the entry itself
+(year, doc_page_num and a hash of the text, plus an occurrence number for a
+repeat of the same text on the same page), so re-running after hand
+corrections keeps every finished answer no matter where the entry moved.
+Each job is pending, in_flight (claimed by a worker until its lease runs
+out), done or failed, and every change is one SQLite transaction with
+synchronous=FULL, so a commit is on disk before the next call is made.
+
+Workers in any number of processes claim jobs with BEGIN IMMEDIATE, which
+holds SQLite's write lock across the select and the update, so no two
+workers get the same job; a worker that dies leaves its claims to expire and
+be picked up again. materialise() rebuilds a year's CSV and batch files from
+the queue at any point.
+
+    python job_queue.py status
+    python job_queue.py materialise --years 1912 1913
+    python job_queue.py requeue --failed
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+
+default_queue_path = Path(__file__).parent / "job_queue.sqlite"
+
+STATES = ("pending", "in_flight", "done", "failed")
+
+
+def entry_id(year, doc_page_num, entry, occurrence=0):
+    """Stable ID of an entry: year, document page and a hash of its text (occurrence counts repeats on a page)."""
+    digest = hashlib.sha256(entry.encode("utf-8")).hexdigest()[:16]
+    return f"{year}:{doc_page_num}:{digest}" + (f":{occurrence}" if occurrence else "")
+
+
+class JobQueue:
+    """SQLite-backed queue of per-entry parse jobs shared by every worker process."""
+
+    def __init__(self, path=default_queue_path, timeout=60.0, worker=None):
+        self.path = str(path)
+        # claims belong to this name; a batch job passes its own so a later process can finish them
+        self.worker = worker or f"{os.uname().nodename}:{os.getpid()}"
+        # isolation_level=None: transactions are opened explicitly, so claims can take the write lock up front
+        self.db = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")  # fsync every commit, WAL included
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                year TEXT NOT NULL,
+                position INTEGER,
+                page_num TEXT,
+                doc_page_num TEXT,
+                entry TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending'
+                    CHECK (state IN ('pending', 'in_flight', 'done', 'failed')),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                rows TEXT,
+                output TEXT,
+                error TEXT,
+                source TEXT,
+                updated REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, year, position)")
+
+    def close(self):
+        self.db.close()
+
+    def transaction(self, immediate=False):
+        return Transaction(self.db, immediate)
+
+    def enqueue(self, year, entries_df):
+        """Add a year's main entries (entry, page_num, doc_page_num rows, in order); returns the count newly added.
+
+        Finished jobs are kept; every job's position is reset to the new order,
+        and jobs for entries no longer in the year get no position, so the
+        materialiser leaves them out.
+        """
+        now = time.time()
+        records, occurrences = [], {}
+        for position, row in enumerate(entries_df.itertuples(index=False)):
+            entry, doc_page_num = str(row.entry), str(row.doc_page_num)
+            occurrence = occurrences.get((doc_page_num, entry), 0)
+            occurrences[(doc_page_num, entry)] = occurrence + 1
+            records.append((entry_id(year, doc_page_num, entry, occurrence), year, position, str(row.page_num),
+                            doc_page_num, entry, now))
+        with self.transaction(immediate=True):
+            before = self.db.execute("SELECT COUNT(*) FROM jobs WHERE year = ?", (year,)).fetchone()[0]
+            self.db.execute("UPDATE jobs SET position = NULL WHERE year = ?", (year,))
+            self.db.executemany("""
+                INSERT INTO jobs (id, year, position, page_num, doc_page_num, entry, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET position = excluded.position, page_num = excluded.page_num""", records)
+            after = self.db.execute("SELECT COUNT(*) FROM jobs WHERE year = ?", (year,)).fetchone()[0]
+        return after - before
+
+    def claim(self, limit, lease_seconds=600.0, years=None):
+        """Claim up to limit pending jobs (or in_flight ones whose lease ran out) as [(id, entry)], in year order."""
+        now = time.time()
+        year_filter = f"AND year IN ({','.join('?' * len(years))})" if years else ""
+        with self.transaction(immediate=True):
+            claimed = self.db.execute(f"""
+                SELECT id, entry FROM jobs
+                WHERE position IS NOT NULL
+                  AND (state = 'pending' OR (state = 'in_flight' AND lease_until < ?)) {year_filter}
+                ORDER BY year, position LIMIT ?""", (now, *(years or ()), limit)).fetchall()
+            self.db.executemany("""
+                UPDATE jobs SET state = 'in_flight', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ?
+                WHERE id = ?""", [(self.worker, now + lease_seconds, now, job_id) for job_id, _ in claimed])
+        return claimed
+
+    def complete(self, results, source="model"):
+        """Mark claimed jobs done with their rows ([(id, rows, output)]); returns how many this worker still held."""
+        now = time.time()
+        with self.transaction(immediate=True):
+            cursor = self.db.executemany("""
+                UPDATE jobs SET state = 'done', rows = ?, output = ?, error = NULL, source = ?,
+                                worker = NULL, lease_until = NULL, updated = ?
+                WHERE id = ? AND state = 'in_flight' AND worker = ?""",
+                [(json.dumps(rows, ensure_ascii=False), output, source, now, job_id, self.worker)
+                 for job_id, rows, output in results])
+        return cursor.rowcount
+
+    def fail(self, failures, max_attempts=3):
+        """Record failed jobs ([(id, error, rows or None, output or None)]).
+
+        A job goes back to pending until it has been tried max_attempts times,
+        then stays failed; rows that could still be decoded are kept for the CSVs.
+        """
+        now = time.time()
+        with self.transaction(immediate=True):
+            self.db.executemany("""
+                UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                error = ?, rows = COALESCE(?, rows), output = COALESCE(?, output),
+                                worker = NULL, lease_until = NULL, updated = ?
+                WHERE id = ? AND state = 'in_flight' AND worker = ?""",
+                [(max_attempts, error, json.dumps(rows, ensure_ascii=False) if rows is not None else None, output,
+                  now, job_id, self.worker) for job_id, error, rows, output in failures])
+
+    def release(self):
+        """Hand this worker's unfinished claims back (on a clean shutdown)."""
+        with self.transaction(immediate=True):
+            self.db.execute("""
+                UPDATE jobs SET state = 'pending', attempts = attempts - 1, worker = NULL, lease_until = NULL, updated = ?
+                WHERE state = 'in_flight' AND worker = ?""", (time.time(), self.worker))
+
+    def requeue(self, states=("failed",), years=None):
+        """Put jobs in the given states back to pending with their attempts reset. Returns the count."""
+        year_filter = f"AND year IN ({','.join('?' * len(years))})" if years else ""
+        with self.transaction(immediate=True):
+            cursor = self.db.execute(f"""
+                UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, lease_until = NULL, updated = ?
+                WHERE state IN ({','.join('?' * len(states))}) {year_filter}""", (time.time(), *states, *(years or ())))
+        return cursor.rowcount
+
+    def counts(self):
+        """{year: {state: jobs}} over the jobs each year currently holds."""
+        counts = {}
+        for year, state, count in self.db.execute(
+                "SELECT year, state, COUNT(*) FROM jobs WHERE position IS NOT NULL GROUP BY year, state ORDER BY year"):
+            counts.setdefault(year, dict.fromkeys(STATES, 0))[state] = count
+        return counts
+
+    def unfinished(self, years=None):
+        """Jobs still pending or in flight."""
+        year_filter = f"AND year IN ({','.join('?' * len(years))})" if years else ""
+        return self.db.execute(f"""
+            SELECT COUNT(*) FROM jobs
+            WHERE position IS NOT NULL AND state IN ('pending', 'in_flight') {year_filter}""", tuple(years or ())).fetchone()[0]
+
+    def year_rows(self, year):
+        """(entry, page_num, doc_page_num, rows) per job of a year in entry order; rows is [{}] when nothing decoded yet."""
+        result = []
+        for entry, page_num, doc_page_num, rows in self.db.execute(
+                "SELECT entry, page_num, doc_page_num, rows FROM jobs WHERE year = ? AND position IS NOT NULL "
+                "ORDER BY position", (year,)):
+            result.append((entry, page_num, doc_page_num, json.loads(rows) if rows else [{}]))
+        return result
+
+
+class Transaction:
+    """BEGIN (IMMEDIATE takes the write lock at once) ... COMMIT, or ROLLBACK on an exception."""
+
+    def __init__(self, db, immediate):
+        self.db = db
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.db
+
+    def __exit__(self, kind, error, traceback):
+        self.db.execute("COMMIT" if kind is None else "ROLLBACK")
+        return False
+
+
+def materialise(queue, year, directory, batch_size=64):
+    """Rebuild parsed_dataframes/<year>.csv and its batch files from the queue. Returns rows written."""
+    import pandas as pd
+    from llm_parser import write_batch
+
+    jobs = queue.year_rows(year)
+    info = pd.DataFrame([(entry, page_num, doc_page_num) for entry, page_num, doc_page_num, _ in jobs],
+                        columns=["entry", "page_num", "doc_page_num"])
+    parsed = [rows for *_, rows in jobs]
+    batch_directory = Path(directory) / year
+    batch_directory.mkdir(exist_ok=True, parents=True)
+    for i in range(0, len(jobs), batch_size):
+        write_batch(batch_directory / f"{year}_batch_{i // batch_size + 1}.csv",
+                    parsed[i:i + batch_size], info.iloc[i:i + batch_size])
+    write_batch(Path(directory) / f"{year}.csv", parsed, info)
+    return sum(len(rows) for rows in parsed)
+
+
+def print_counts(counts):
+    print(f"{'year':<14}" + "".join(f"{state:>11}" for state in STATES))
+    for year, states in counts.items():
+        print(f"{year:<14}" + "".join(f"{states[state]:>11}" for state in STATES))
+    totals = {state: sum(states[state] for states in counts.values()) for state in STATES}
+    print(f"{'total':<14}" + "".join(f"{totals[state]:>11}" for state in STATES))
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Inspect the llm_parser.py job queue, requeue jobs, or rebuild the CSVs from it.')
+    parser.add_argument("command", choices=["status", "materialise", "requeue"])
+    parser.add_argument("--queue", type=str, default=str(default_queue_path))
+    parser.add_argument("--years", type=str, nargs="+",
+            help="Limit to these years (e.g. 1912 or entries_1912).",
+            default=None)
+    parser.add_argument("--failed", action="store_true",
+            help="requeue: failed jobs (the default).")
+    parser.add_argument("--in-flight", action="store_true",
+            help="requeue: jobs claimed by workers that are known to be gone, without waiting for the lease.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    queue = JobQueue(args.queue)
+    years = [year if year.startswith("entries_") else f"entries_{year}" for year in args.years] if args.years else None
+
+    if args.command == "requeue":
+        states = [state for state, chosen in (("failed", args.failed), ("in_flight", args.in_flight)) if chosen]
+        print(f"Requeued {queue.requeue(states or ['failed'], years)} jobs")
+    elif args.command == "materialise":
+        from llm_parser import parsed_dataframe_directory
+        for year in years or list(queue.counts()):
+            print(f"{year}: wrote {materialise(queue, year, parsed_dataframe_directory)} rows")
+
+    print_counts(queue.counts())
+    queue.close()
@@ -0,0 +1,233 @@
+"""Lenient JSON decoding for model output.
+
+parse_json(text) returns (value, repairs). Well-formed JSON goes through
+json's C decoder (raw_decode, so prose or a closing fence after the value
+costs nothing). Anything else is read by a single left-to-right pass
+that never backtracks and fixes, as it goes:
+
+* unescaped quotes inside strings: a quote only closes a string when what
+  follows it is structural (`,` then a key or the end, `:`, `}`, `]`) or,
+  after whitespace, another quoted string that is the next key (or, in an
+  array, the next element): the comma between them was dropped;
+* single-quoted strings and Python literals (the shape ast.literal_eval
+  used to accept);
+* raw newlines/control characters and invalid escapes inside strings;
+* missing commas (after strings too), doubled and trailing commas,
+  missing colons;
+* output cut off by the token limit: open strings, objects and arrays are
+  closed (reported as "truncated", since fields may be incomplete).
+
+repairs lists what was fixed, so callers can count and judge them.
+"""
+import re
+import json
+
+ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+BARE_RE = re.compile(r"[^\s,:{}\[\]\"']+")
+NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$")
+WHITESPACE_RE = re.compile(r"\s*")
+FENCE_RE = re.compile(r"^\s*```(?:json|JSON)?\s*")
+QUOTED_RE = re.compile(r"""(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')\s*""")
+
+decoder = json.JSONDecoder()
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def value_start(text):
+    """Index of the first { or [ in text, or -1."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return min(starts) if starts else -1
+
+
+def parse_json(text):
+    """(value, repairs) for the first JSON object or array in text; raises JSONRepairError if there is none."""
+    start = value_start(text)
+    if start == -1:
+        raise JSONRepairError("no JSON object or array in the response")
+    repairs = []
+    if text[:start].strip() and not FENCE_RE.fullmatch(text[:start]):
+        repairs.append("leading_text")
+    try:
+        value, end = decoder.raw_decode(text, start)
+    except json.JSONDecodeError:
+        # a closing fence ends the answer even if the JSON inside it was cut short
+        fence = text.rfind("```")
+        parser = RepairingParser(text[:fence] if fence > start else text, start)
+        value = parser.value()
+        repairs.extend(parser.repairs)
+        end = parser.pos
+    trailing = text[end:].strip()
+    if trailing and trailing != "```":
+        repairs.append("trailing_text")
+    return value, repairs
+
+
+class RepairingParser:
+    """One pass over text from pos, building the value and noting every repair."""
+
+    def __init__(self, text, pos=0):
+        self.text = text
+        self.pos = pos
+        self.repairs = []
+        self.containers = []  # "{" or "[" for each object or array being read
+
+    def repair(self, kind):
+        if kind not in self.repairs:
+            self.repairs.append(kind)
+
+    def skip_whitespace(self):
+        self.pos = WHITESPACE_RE.match(self.text, self.pos).end()
+
+    def peek(self):
+        self.skip_whitespace()
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def value(self):
+        char = self.peek()
+        if char in "{[":
+            self.containers.append(char)
+            try:
+                return self.object() if char == "{" else self.array()
+            finally:
+                self.containers.pop()
+        if char in "\"'":
+            return self.string(char)
+        if not char:
+            self.repair("truncated")
+            return None
+        return self.bare()
+
+    def object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            char = self.peek()
+            if not char:
+                self.repair("truncated")
+                return result
+            if char == "}":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra_comma")
+                self.pos += 1
+                continue
+            key = self.string(char) if char in "\"'" else self.bare()
+            if self.peek() == ":":
+                self.pos += 1
+            else:
+                self.repair("missing_colon")
+            if not self.peek():
+                self.repair("truncated")
+                result[str(key)] = ""
+                return result
+            result[str(key)] = self.value()
+            char = self.peek()
+            if char == ",":
+                self.pos += 1
+                if self.peek() == "}":
+                    self.repair("trailing_comma")
+            elif char and char != "}":
+                self.repair("missing_comma")
+
+    def array(self):
+        self.pos += 1
+        result = []
+        while True:
+            char = self.peek()
+            if not char:
+                self.repair("truncated")
+                return result
+            if char == "]":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra_comma")
+                self.pos += 1
+                continue
+            result.append(self.value())
+            char = self.peek()
+            if char == ",":
+                self.pos += 1
+                if self.peek() == "]":
+                    self.repair("trailing_comma")
+            elif char and char != "]":
+                self.repair("missing_comma")
+
+    def closes_string(self, after):
+        """True if a quote followed by text[after:] ends the string rather than sitting inside it."""
+        rest = WHITESPACE_RE.match(self.text, after).end()
+        if rest >= len(self.text) or self.text[rest] in ":}]":
+            return True
+        if self.text[rest] in "\"'" and rest > after:
+            # a dropped comma: the next key ("a": "b" "c": ...) or array element ("a" "b"]) follows
+            quoted = QUOTED_RE.match(self.text, rest)
+            following = self.text[quoted.end():quoted.end() + 1] if quoted else ""
+            return following == ":" or (following in (",", "]") and self.containers[-1:] == ["["])
+        if self.text[rest] != ",":
+            return False
+        following = WHITESPACE_RE.match(self.text, rest + 1).end()
+        return following >= len(self.text) or self.text[following] in "\"'{[}]"
+
+    def string(self, quote):
+        if quote == "'":
+            self.repair("single_quotes")
+        self.pos += 1
+        special = re.compile(r"[{}\\\x00-\x1f]".format(re.escape(quote)))
+        parts = []
+        while True:
+            match = special.search(self.text, self.pos)
+            if match is None:
+                parts.append(self.text[self.pos:])
+                self.pos = len(self.text)
+                self.repair("truncated")
+                return "".join(parts)
+            parts.append(self.text[self.pos:match.start()])
+            char = match.group()
+            self.pos = match.end()
+            if char == quote:
+                if self.closes_string(self.pos):
+                    return "".join(parts)
+                self.repair("unescaped_quote")
+                parts.append(char)
+            elif char == "\\":
+                parts.append(self.escape())
+            else:
+                self.repair("control_character")
+                parts.append(char)
+
+    def escape(self):
+        char = self.text[self.pos:self.pos + 1]
+        if char in ESCAPES:
+            self.pos += 1
+            return ESCAPES[char]
+        if char == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", self.text[self.pos + 1:self.pos + 5]):
+            code = int(self.text[self.pos + 1:self.pos + 5], 16)
+            self.pos += 5
+            # a surrogate pair is two escapes in a row
+            if 0xD800 <= code < 0xDC00 and re.fullmatch(r"\\u[dD][c-fC-F][0-9a-fA-F]{2}", self.text[self.pos:self.pos + 6]):
+                low = int(self.text[self.pos + 2:self.pos + 6], 16)
+                self.pos += 6
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00))
+            return chr(code)
+        self.repair("invalid_escape")
+        return "\\"
+
+    def bare(self):
+        match = BARE_RE.match(self.text, self.pos)
+        if match is None:
+            raise JSONRepairError(f"unexpected {self.text[self.pos]!r} at {self.pos}")
+        self.pos = match.end()
+        word = match.group()
+        if word in LITERALS:
+            if word not in ("true", "false", "null"):
+                self.repair("python_literal")
+            return LITERALS[word]
+        if NUMBER_RE.match(word):
+            return json.loads(word)
+        self.repair("unquoted_text")
+        return word
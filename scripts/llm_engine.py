@@ -0,0 +1,204 @@
+import time, random, asyncio
+from google import genai
+from google.genai import types, errors
+
+
+def make_client(api_key, base_url=None):
+    """Build one shared genai client; its async HTTP session is reused for every call.
+
+    base_url points the client at a stand-in server (see stub_model_server.py)
+    for offline load testing.
+    """
+    if base_url:
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=base_url))
+    return genai.Client(api_key=api_key)
+
+
+def retry_delay_from_error(error):
+    """Seconds the API asked us to wait (google.rpc.RetryInfo), or None."""
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details", [])
+    for detail in details or []:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            try:
+                return float(str(detail["retryDelay"]).rstrip("s"))
+            except ValueError:
+                return None
+    return None
+
+
+def is_throttle(error):
+    """True for 429 / RESOURCE_EXHAUSTED quota responses."""
+    return isinstance(error, errors.ClientError) and error.code == 429
+
+
+def is_retryable(error):
+    """Throttles, server errors and dropped connections are worth another try; bad requests are not."""
+    if is_throttle(error) or isinstance(error, errors.ServerError):
+        return True
+    if isinstance(error, errors.APIError):
+        return False
+    return isinstance(error, (OSError, asyncio.TimeoutError)) or type(error).__module__.startswith(("httpx", "aiohttp"))
+
+
+class TokenBucket:
+    """Request-rate limiter whose rate adapts to the quota the API actually enforces.
+
+    Each success nudges the rate up by `increase` requests/sec; each throttle
+    halves it (AIMD), and a server-supplied retry delay pauses the whole bucket.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.1, max_rate=None, increase=0.1):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate += self.increase
+        if self.max_rate:
+            self.rate = min(self.rate, self.max_rate)
+
+    def on_throttle(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class EngineStats:
+    """Counters and latencies collected while an engine runs."""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.latencies = []
+
+    def record_usage(self, usage):
+        """Add a response's usage_metadata token counts."""
+        if usage is None:
+            return
+        self.tokens_in += usage.prompt_token_count or 0
+        self.tokens_out += usage.candidates_token_count or 0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "latency_p50": round(self.percentile(0.50), 4),
+            "latency_p95": round(self.percentile(0.95), 4),
+            "latency_p99": round(self.percentile(0.99), 4),
+        }
+
+
+class RequestEngine:
+    """Bounded-concurrency generate_content runner with adaptive rate limiting and retries.
+
+    `concurrency` workers share one client (and so one pooled HTTP session)
+    and one TokenBucket. Failed calls are retried with full-jitter exponential
+    backoff; when retries run out the exception is returned in place of the text.
+    """
+
+    def __init__(self, client, model, config, concurrency=8, rate=2.0, max_rate=None,
+                 max_retries=6, base_delay=1.0, max_delay=60.0, on_connection_error=None):
+        self.client = client
+        self.model = model
+        self.config = config
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst=concurrency, max_rate=max_rate)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_connection_error = on_connection_error  # e.g. wait_for_internet, run in a thread
+        self.stats = EngineStats()
+
+    async def generate(self, contents, config=None):
+        """Send one request, retrying until it succeeds or retries run out."""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            start = time.monotonic()
+            self.stats.calls += 1
+            try:
+                response = await self.client.aio.models.generate_content(
+                    model=self.model, contents=contents, config=config or self.config)
+                self.stats.latencies.append(time.monotonic() - start)
+                self.stats.record_usage(response.usage_metadata)
+                self.bucket.on_success()
+                return response.text.strip()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                retry_after = retry_delay_from_error(e)
+                if is_throttle(e):
+                    self.stats.throttled += 1
+                    self.bucket.on_throttle(retry_after)
+                elif self.on_connection_error and not isinstance(e, errors.APIError):
+                    await asyncio.to_thread(self.on_connection_error)
+                self.stats.retries += 1
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                await asyncio.sleep(max(backoff, retry_after or 0))
+
+    async def generate_all(self, contents_list, progress=None, config=None):
+        """Run every request through the worker pool; results keep input order.
+
+        Each result is the response text, or the exception that ended its retries.
+        """
+        results = [None] * len(contents_list)
+        queue = asyncio.Queue()
+        for index, contents in enumerate(contents_list):
+            queue.put_nowait((index, contents))
+
+        async def worker():
+            while True:
+                try:
+                    index, contents = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    results[index] = await self.generate(contents, config)
+                except Exception as e:
+                    self.stats.failures += 1
+                    results[index] = e
+                if progress is not None:
+                    progress.update(1)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(contents_list)) or 1)))
+        return results
@@ -1,17 +1,19 @@
-import pandas as pd, time, json, csv, ast, regex as re, socket
+import pandas as pd, time, json, csv, regex as re, socket, sys, asyncio, argparse
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from google import genai
-from google.genai import types
 from pathlib import Path
-
-# load API key from local file
+from llm_engine import make_client, RequestEngine
+from llm_prompt import model, generation_config, fieldnames, prompt, prompt_version
+from prompt_packing import generate_packed, packed_prompt_version
+from response_cache import ResponseCache, cache_key, default_cache_path
+from rule_parser import parse_entries
+from instrumentation import RunLog, timed
+from response_decoder import DecodeStats, decode_answer, cached_rows, better
+from job_queue import JobQueue, materialise
+from main_entry_classifier import score_entries, classified_directory
+
+# API key lives in a local file next to this script
 API_KEY_FILE = Path(__file__).parent / ".api_key"
-if not API_KEY_FILE.exists():
-    raise FileNotFoundError(
-        f"API key file not found at {API_KEY_FILE}. "
-        "Create it with your Google API key as the sole contents."
-    )
-client = genai.Client(api_key=API_KEY_FILE.read_text().strip())
 
 # paths
 current_dir = Path.cwd()
@@ -21,168 +23,6 @@ parsed_dataframe_directory = current_dir.parent / 'dataframes' / 'parsed_datafra
 
 file_batch_size = 64  # entries per API batch
 
-# output fields gemini returns
-fieldnames = ["opening_bits", "author(s)", "title", "format", "little_bits", "publisher", "date"]
-
-
-prompt = """
-Task:
-
-You are given raw publishing data. Each entry includes a title, author name, publisher, and publishing month and year. Your job is to extract the following:Output format: 
-
-{{
-"opening_bits": "",
-"author(s)":  "",
-"title": "",
-"format": "",
-"little_bits": "",
-"publisher": "",
-"date": ""
-}}
-
-Special instructions:
-* The publishing year is written in shorthand (e.g., '17), and all dates are from the 1900s. Do not convert '17 to 1917, just save it as '17.
-* Do not make any copy edits or corrections. Do not correct spelling, punctuation, or special characters.
-* If there are abbreviations, do not change those abbreviations. So Jan 17 should remain Jan 17.
-* Entries that start with a word followed by a dash instead of parentheses, with the author's first name included within, are entries without an author. Entries starting with words like “Admiralty”, “Army”, and “Acts” are words that appear at the beginning of the entries, but are not last names. Thus, entries such as “Acts-Grey seals (protection)” should have no author. Their title should be: “Acts-Grey seals (protection)”
-* The title field should contain the main descriptive name of the publication. Any information that directly modifies or describes the core title (e.g., editors, volumes, editions, or subtitles) and appears before the format (if a format is present) should be included in the title.
-* The little_bits field should capture any remaining descriptive information about the publication that is not part of the core title, author, publisher, or date. This includes, but is not limited to, page counts, dimensions, prices, series information, or specific publication notes. If a format is present, little_bits will contain information appearing after the format. If no format is present in the entry, any information that follows the main descriptive title and is not the publisher or date should be placed in little_bits.
-* The format is usually a number and a format type (fol, vo, to, mo). E.g., 12mo, 8vo. If there is 'Cr. ' before that, please include 'Cr. ' in the format too. E.g., Cr. 8vo.
-* In extremely rare instances, there are multiples month and years listed. For those cases, all the months in the date as a single string. Similarly, there is sometimes extra information between month and year like in “Jan., &c., '19.” Include all the extra in-between information in the date as well.
-* Maintain the order of the original entry. If what seems like an author name appears within the title, keep it as part of the title. Do not interpret that as author name.
-* When generating JSON, properly escape any quotation marks within text fields using backslashes (e.g., "title": "The book \"special\" chapter").
-
-Here are some example inputs and outputs:
-
-Example input:
-
-Abbott (E. W.)- The Colliery official's, work. man's and bill clerk's friend. 16mo. pp. 45 (South Shields : 49, Northcote St.) E. W. ABBOTT, Dec. '17
-
-Example output:
-
-{{
-"opening_bits": "",
-"author(s)":  "Abbott (E. W.)",
-"title": "The Colliery official's, work. man's and bill clerk's friend.",
-"format": "16mo.",
-"little_bits": "pp. 45 (South Shields : 49, Northcote St.)",
-"publisher": "E. W. ABBOTT",
-"date": "Dec. '17"
-}}
-
-
-—
-
-Example input: 
-
-Pollock (John)--War and revolution in Russia : sketches and studies. Cr. 8vo. 71 x 5, pp. 298, 6s. net . CONSTABLE, Mar '18
-
-Example output:
-
-{{
-"opening_bits": "",
-"author(s)":  "Pollock (John)",
-"title": "War and revolution in Russia : sketches and studies.",
-"format": "Cr. 8vo.",
-"little_bits": "71 x 5, pp. 298, 6s. net . ",
-"publisher": "CONSTABLE",
-"date": "Mar '18"
-}}
-
-—
-
-Example input:
-
-38. 6d. M. (D. R.)-A Silver lining. IS. net. Dec. 16
-
-Example output:
-
-{{
-"opening_bits": "38. 6d. ",
-"author(s)":  "M. (D. R.)",
-"title": "A Silver lining.",
-"format": "",
-"little_bits": "IS. net.",
-"publisher": "",
-"date": "Dec. 16"
-}}
-
-—
-
-Example input:
-. Qru mbino (J. C. F.)-Clairvoyance : the system of philosophy concerning the divinity of clair. voyance, also a treatise on divination and crystal reading. Cr. 8vo. 7} x 41, pp. 140, 25. 6d. net FOWLER, Mar. 15
-
-Example output:
-
-{{
-"opening_bits": ". ",
-"author(s)": "Qru mbino (J. C. F.)",
-"title": "Clairvoyance : the system of philosophy concerning the divinity of clair. voyance, also a treatise on divination and crystal reading.",
-"format": "Cr. 8vo.",
-"little_bits": "7} x 41, pp. 140, 25. 6d. net",
-"publisher": "FOWLER",
-"date": "Mar. 15"
-}}
-
-—
-
-Example input:
-Admiralty-Hydrographic. China Sea pilot. Vol. I, 1916 : Rev. Supp., 1918. Vol. 2, 1915 : Rev. supp., 1918. Vol. 3, 1912 : Rev. supp. (11), 1918. Vol. 4, 1912 : Rev. supp. (2), 1917. Vol. 5, 1912 : Rev. slipp. (11), 1918 POTTER, Oct., Feb., June, Apr. '18
-
-Example output:
-
-{{
-"opening_bits": "",
-"author(s)": "",
-"title": "Admiralty-Hydrographic. China Sea pilot. Vol. I, 1916 : Rev. Supp., 1918. Vol. 2, 1915 : Rev. supp., 1918. Vol. 3, 1912 : Rev. supp. (11), 1918. Vol. 4, 1912 : Rev. supp. (2), 1917. Vol. 5, 1912 : Rev. slipp. (11), 1918",
-"format": "",
-"little_bits": "",
-"publisher": "POTTER",
-"date": "Oct., Feb., June, Apr. '18"
-}}
-
-—
-
-Example input:
-Some facts relating to internal respiration, from personal observation covering a period of over torty years, 1866-1910. By “ H. B." 71 x 5, pp. 62, 2s.6d. net (Portobello, N.B.: 11, Rosefield Pl.) J. THOMSON, Feb. '18
-
-
-Example output:
-
-{{
-"opening_bits": "",
-"author(s)": "",
-"title": "Some facts relating to internal respiration, from personal observation covering a period of over torty years, 1866-1910. By \" H. B.\"",
-"format": "",
-"little_bits": "71 x 5, pp. 62, 2s.6d. net (Portobello, N.B.: 11, Rosefield Pl.)",
-"publisher": "J. THOMSON",
-"date": "Feb. '18"
-}}
-
-—
-
-Now here is the real input:
-
-"""
-
-
-def clean_parse(entry_str):
-    """Parse gemini's JSON output, stripping markdown fences if present."""
-    s = entry_str.strip()
-    if s.startswith("```json"):
-        s = s[len("```json"):].strip()
-    if s.endswith("```"):
-        s = s[:-3].strip()
-
-    try:
-        return json.loads(s)
-    except json.JSONDecodeError:
-        try:
-            return ast.literal_eval(s)  # fallback for weird quotes
-        except Exception as e:
-            raise ValueError(f"Clean parse failed: {e}")
-
-
 def check_internet_connection(host="8.8.8.8", port=53, timeout=3):
     """Check internet by attempting a connection to Google DNS."""
     try:
@@ -202,24 +42,74 @@ def wait_for_internet(pause_minutes=1, max_wait_minutes=None):
         if max_wait_minutes and waited >= max_wait_minutes:
             raise TimeoutError("Internet not restored within max wait time. Aborting.")
 
-mega_error_list = {}
-
-# loop through each hand-corrected entries CSV
-for file in sorted(corrected_entries_directory.iterdir()):
-
-    if file.name.startswith('.'):
-        continue
-
-    # extract year identifier like 'entries_1912'
-    file_name_regex = r"entries_[0-9]{4}"
-    file_name_match = re.findall(file_name_regex, str(file))
-    if not file_name_match:
-        print(f"⚠️ Skipping file with unexpected name format: {file.name}")
-        continue
-    file_name = file_name_match[0]
-
-    error_list = []
-
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Parse hand-corrected entries into structured fields with Gemini.')
+    parser.add_argument("--concurrency", type=int,
+            help="Requests in flight at once.",
+            default=8)
+    parser.add_argument("--rate", type=float,
+            help="Starting requests/sec; adapts down on 429s and back up on successes.",
+            default=2.0)
+    parser.add_argument("--max-rate", type=float,
+            help="Ceiling for the adaptive request rate (e.g. the account's RPM / 60).",
+            default=None)
+    parser.add_argument("--base-url", type=str,
+            help="Send requests to another endpoint, e.g. a stub_model_server.py instance.",
+            default=None)
+    parser.add_argument("--pack", type=int,
+            help="Entries packed into each request (1 sends one entry per call).",
+            default=1)
+    parser.add_argument("--pack-token-budget", type=int,
+            help="Upper bound on estimated prompt tokens for a packed request.",
+            default=4000)
+    parser.add_argument("--cache", type=str,
+            help="Response cache file; only entries missing from it are sent.",
+            default=str(default_cache_path))
+    parser.add_argument("--cache-max-mb", type=float,
+            help="Evict least recently used responses past this size.",
+            default=None)
+    parser.add_argument("--rule-threshold", type=float,
+            help="Take rule_parser.py's answer when its confidence is at least this; only the rest go to Gemini.",
+            default=None)
+    parser.add_argument("--reasks", type=int,
+            help="Times to ask again, one entry per call, for answers that fail decoding, schema or conservation checks.",
+            default=1)
+    parser.add_argument("--classified", action="store_true",
+            help="Also parse years that only have main_entry_classifier.py output in entries/classified_entries.")
+    parser.add_argument("--main-threshold", type=float,
+            help="Classifier confidence for a main entry, in files without hand flags (default: the file's own flags, or 0.5).",
+            default=None)
+    parser.add_argument("--queue", type=str,
+            help="Work through a durable per-entry job queue in this SQLite file (job_queue.py) instead of whole years.",
+            default=None)
+    parser.add_argument("--workers", type=int,
+            help="With --queue: worker processes claiming jobs from it.",
+            default=1)
+    parser.add_argument("--claim", type=int,
+            help="With --queue: jobs a worker claims (and checkpoints) at a time.",
+            default=16)
+    parser.add_argument("--max-attempts", type=int,
+            help="With --queue: tries before a job that keeps failing is left failed.",
+            default=3)
+    parser.add_argument("--profile", type=str, nargs="+",
+            help="Run these stages (load_entries, rules, cache_lookup, api, json_parse, cache_write, csv_write, or all) under cProfile.",
+            default=())
+    parsed_args = parser.parse_args(args)
+    return parsed_args
+
+def load_client(base_url=None):
+    """Gemini client from .api_key, or a keyless client for a local stub server."""
+    if base_url:
+        return make_client("stub", base_url)
+    if not API_KEY_FILE.exists():
+        raise FileNotFoundError(
+            f"API key file not found at {API_KEY_FILE}. "
+            "Create it with your Google API key as the sole contents."
+        )
+    return make_client(API_KEY_FILE.read_text().strip())
+
+def load_main_entries(file, main_threshold=None):
+    """Read a hand-corrected (or classified) CSV and keep the main entries with their page info."""
     entries_df = pd.read_csv(file)
 
     # some CSVs have mangled column names from R export
@@ -232,110 +122,400 @@ for file in sorted(corrected_entries_directory.iterdir()):
 
     print(entries_df.columns)
 
-    # only parse entries flagged as main (have publisher + date)
-    main_entries_df = entries_df[entries_df["main_entry"] == True][["entry", "page_num", "doc_page_num"]].reset_index(drop=True)
-    main_entries = main_entries_df["entry"]
-
-    with tqdm(total=len(main_entries)) as progress_bar:
-        progress_bar.set_description(f"Processing {file_name}")
+    # years without hand flags are scored by main_entry_classifier.py
+    if "main_entry_confidence" in entries_df.columns and main_threshold is not None:
+        entries_df["main_entry"] = entries_df["main_entry_confidence"] >= main_threshold
+    elif "main_entry" not in entries_df.columns:
+        entries_df["main_entry"] = score_entries(entries_df["entry"]) >= (main_threshold if main_threshold is not None else 0.5)
 
-        batch_num = 1
-
-        for i in range((batch_num-1)*file_batch_size, len(main_entries), file_batch_size):
-
-            # set up batch output file
+    # only parse entries flagged as main (have publisher + date)
+    return entries_df[entries_df["main_entry"] == True][["entry", "page_num", "doc_page_num"]].reset_index(drop=True)
+
+def write_batch(batch_file, parsed, page_info_batch):
+    """Write batch CSV with original entry + page info + parsed fields.
+
+    parsed holds a list of field dicts per entry: usually one, more when the
+    model split an entry OCR had merged (see response_decoder.py).
+    """
+    with open(batch_file, "w", newline="", encoding="utf-8") as f:
+        combined_rows = []
+
+        for idx, rows in enumerate(parsed):
+            original_entry = page_info_batch.iloc[idx]["entry"]
+            page_num = page_info_batch.iloc[idx]["page_num"]
+            doc_page_num = page_info_batch.iloc[idx]["doc_page_num"]
+            for item in rows:
+                combined_rows.append({**item, "original_entry": original_entry, "page_num": page_num, "doc_page_num": doc_page_num})
+
+        final_fieldnames = ["original_entry", "page_num", "doc_page_num"] + fieldnames
+
+        writer = csv.DictWriter(f, fieldnames=final_fieldnames)
+        writer.writeheader()
+        for row in combined_rows:
+            writer.writerow({k: row.get(k, "") for k in final_fieldnames})
+
+async def send_entries(engine, entries, pack, pack_token_budget, progress_bar):
+    """Raw model output (or the exception that ended its retries) for each entry."""
+    if pack > 1:
+        outputs, _ = await generate_packed(engine, entries, pack, pack_token_budget, progress=progress_bar)
+        return outputs
+    return await engine.generate_all([prompt + entry for entry in entries], progress=progress_bar)
+
+async def decode_outputs(engine, chunk, entries, outputs, reasks, decode_stats, run=None):
+    """{index: (output, Decoded)} for a chunk's answers, asking again (one entry per call) for any that fail the checks.
+
+    Entries whose call itself failed are left out. When a re-ask also fails,
+    whichever answer kept more of the entry is returned.
+    """
+    decoded = {}
+    for i, output in zip(chunk, outputs):
+        if not isinstance(output, Exception):
+            with timed(run, "json_parse"):
+                decoded[i] = (output, decode_answer(output, entries[i]))
+            decode_stats.record(decoded[i][1])
+
+    for _ in range(reasks):
+        retry = [i for i, (_, answer) in decoded.items() if answer.problem is not None]
+        if not retry:
+            break
+        decode_stats.reasked += len(retry)
+        with timed(run, "api"):
+            outputs = await engine.generate_all([prompt + entries[i] for i in retry])
+        for i, output in zip(retry, outputs):
+            if isinstance(output, Exception):
+                continue
+            with timed(run, "json_parse"):
+                again = decode_answer(output, entries[i])
+            decode_stats.record(again)
+            if again.problem is None:
+                decode_stats.recovered += 1
+            if better(decoded[i][1], again, entries[i]) is again:
+                decoded[i] = (output, again)
+    return decoded
+
+async def parse_year(file, file_name, engine, cache, error_list, pack=1, pack_token_budget=4000, rule_threshold=None,
+                     run=None, reasks=1, decode_stats=None, main_threshold=None):
+    """Parse one year's main entries, calling the model only for entries the rules and cache can't answer.
+
+    Every answer is decoded and checked (response_decoder.py); ones that fail
+    are asked again, and only answers that pass are cached. New answers are
+    cached a chunk at a time, so a crash loses at most one chunk of calls.
+    Every batch CSV and the year CSV are then rebuilt from the cache, which
+    keeps them right even when hand corrections shift entries between
+    batches. An answer that still fails is written (and listed in
+    error_list) but not cached, so the next run asks again.
+    """
+    decode_stats = decode_stats if decode_stats is not None else DecodeStats()
+    with timed(run, "load_entries"):
+        main_entries_df = load_main_entries(file, main_threshold)
+        entries = [str(entry) for entry in main_entries_df["entry"]]
+
+    with timed(run, "cache_lookup"):
+        version = packed_prompt_version if pack > 1 else prompt_version
+        keys = [cache_key(model, version, generation_config, entry) for entry in entries]
+        # answers cached before they were checked may be malformed; those are asked again
+        answers = {key: cached_rows(parsed) for key, (_, parsed) in cache.get_many(keys).items()}
+        answers = {key: rows for key, rows in answers.items() if rows is not None}
+
+    # confident rule parses skip the model entirely
+    ruled = {}
+    if rule_threshold is not None:
+        with timed(run, "rules"):
+            rule_fields, confidences = parse_entries(entries)
+            ruled = {i: fields for i, (fields, confidence) in enumerate(zip(rule_fields, confidences))
+                     if confidence >= rule_threshold}
+
+    # one call per distinct uncached entry text
+    pending, seen = [], set()
+    for i, key in enumerate(keys):
+        if i not in ruled and key not in answers and key not in seen:
+            seen.add(key)
+            pending.append(i)
+
+    if run is not None:
+        run.count("entries", len(entries))
+        run.count("by_rules", len(ruled))
+        run.count("cached", len(entries) - len(ruled) - len(pending))
+        run.count("sent", len(pending))
+
+    unresolved = {}
+    with tqdm(total=len(pending)) as progress_bar:
+        progress_bar.set_description(f"Processing {file_name} ({len(ruled)} by rules, {len(entries) - len(ruled) - len(pending)} cached)")
+
+        for start in range(0, len(pending), file_batch_size):
+            chunk = pending[start:start+file_batch_size]
+            with timed(run, "api"):
+                outputs = await send_entries(engine, [entries[i] for i in chunk], pack, pack_token_budget, progress_bar)
+
+            for i, output in zip(chunk, outputs):
+                if isinstance(output, Exception):
+                    error_list.append({"entry": entries[i], "error": str(output)})
+                    print(f"Error on entry {i}: {output}")
+                    if run is not None:
+                        run.count("api_errors")
+                        run.event("api_error", year=file_name, entry=i, error=str(output))
+
+            # decode and check gemini's answers; only ones that pass are cached
+            decoded = await decode_outputs(engine, chunk, entries, outputs, reasks, decode_stats, run)
+            new_rows = []
+            for i, (output, answer) in decoded.items():
+                if answer.problem is None:
+                    new_rows.append((keys[i], entries[i], output, answer.rows[0] if len(answer.rows) == 1 else answer.rows))
+                    answers[keys[i]] = answer.rows
+                    continue
+                decode_stats.unresolved += 1
+                error_list.append({"entry": entries[i], "output": output, "error": answer.problem,
+                                   "repairs": list(answer.repairs)})
+                print(f"Error parsing entry {i}: {answer.problem}")
+                if run is not None:
+                    run.count("parse_failures")
+                    run.event("parse_failure", year=file_name, entry=i, error=answer.problem, repairs=list(answer.repairs))
+                if answer.rows is not None:
+                    unresolved[keys[i]] = answer.rows
+            with timed(run, "cache_write"):
+                cache.put_many(new_rows)
+
+    # rebuild every batch file and the year roll-up from the cache (a cached model answer beats a rule parse);
+    # answers that failed their checks are still written, with empty fields only when nothing could be decoded
+    parsed = [answers.get(key) or unresolved.get(key) or [ruled.get(i, {})] for i, key in enumerate(keys)]
+    batch_directory = parsed_dataframe_directory / file_name
+    batch_directory.mkdir(exist_ok=True, parents=True)
+    with timed(run, "csv_write"):
+        for i in range(0, len(entries), file_batch_size):
             batch_file_number = (i // file_batch_size) + 1
-            batch_filename = f"{file_name}_batch_{batch_file_number}.csv"
-            batch_directory = parsed_dataframe_directory / file_name
-            batch_directory.mkdir(exist_ok=True, parents=True)
-            batch_file = batch_directory / batch_filename
-
-            # skip already-completed batches (resume support)
-            if batch_file.exists():
-                try:
-                    existing_df = pd.read_csv(batch_file)
-                    actual_batch_size = len(main_entries[i:i+file_batch_size])
-                    if len(existing_df) >= actual_batch_size:
-                        print(f"Batch file {batch_filename} already exists with {len(existing_df)} rows, skipping batch...")
-                        progress_bar.update(len(main_entries[i:i+file_batch_size]))
-                        continue
-                    else:
-                        print(f"Batch file {batch_filename} exists but has only {len(existing_df)} rows, reprocessing batch...")
-                except Exception as e:
-                    print(f"Error reading existing batch file {batch_filename}: {e}. Reprocessing batch...")
-
-            # send each entry to gemini one at a time
-            results = []
+            batch_file = batch_directory / f"{file_name}_batch_{batch_file_number}.csv"
+            write_batch(batch_file, parsed[i:i+file_batch_size], main_entries_df.iloc[i:i+file_batch_size])
+        write_batch(parsed_dataframe_directory / f"{file_name}.csv", parsed, main_entries_df)
+
+async def work_queue(queue, engine, cache, error_list, pack=1, pack_token_budget=4000, rule_threshold=None,
+                     run=None, reasks=1, decode_stats=None, claim_size=16, max_attempts=3):
+    """Claim and parse jobs from a JobQueue until none are left.
+
+    Each claim is checked against the cache and the rules first; the rest go
+    to the model once per distinct text, are decoded like parse_year's, and
+    are marked done (and cached) or failed in one transaction per claim, so a
+    crash loses at most claim_size calls. Failed jobs go back to pending
+    until they have been tried max_attempts times.
+    """
+    decode_stats = decode_stats if decode_stats is not None else DecodeStats()
+    version = packed_prompt_version if pack > 1 else prompt_version
+    with tqdm(total=queue.unfinished()) as progress_bar:
+        progress_bar.set_description(f"Worker {queue.worker}")
+        while True:
+            claimed = queue.claim(claim_size)
+            if not claimed:
+                break
+            ids = [job_id for job_id, _ in claimed]
+            entries = [entry for _, entry in claimed]
+            keys = [cache_key(model, version, generation_config, entry) for entry in entries]
+
+            with timed(run, "cache_lookup"):
+                cached = {key: cached_rows(parsed) for key, (_, parsed) in cache.get_many(keys).items()}
+            done = [(ids[i], cached[key], None) for i, key in enumerate(keys) if cached.get(key)]
+            queue.complete(done, source="cache")
+            rest = [i for i, key in enumerate(keys) if not cached.get(key)]
+
+            if rule_threshold is not None and rest:
+                with timed(run, "rules"):
+                    rule_fields, confidences = parse_entries([entries[i] for i in rest])
+                ruled = [(ids[i], [fields], None)
+                         for i, fields, confidence in zip(rest, rule_fields, confidences) if confidence >= rule_threshold]
+                queue.complete(ruled, source="rules")
+                ruled_ids = {job_id for job_id, _, _ in ruled}
+                rest = [i for i in rest if ids[i] not in ruled_ids]
+
+            # one call per distinct text in the claim
+            first = {}
+            for i in rest:
+                first.setdefault(keys[i], i)
+            sending = list(first.values())
+            with timed(run, "api"):
+                outputs = await send_entries(engine, [entries[i] for i in sending], pack, pack_token_budget, None)
+            decoded = await decode_outputs(engine, sending, entries, outputs, reasks, decode_stats, run)
+
+            failed_calls = {i: output for i, output in zip(sending, outputs) if isinstance(output, Exception)}
+            passed, failures, new_rows = [], [], []
+            for i in rest:
+                source = first[keys[i]]
+                if source in failed_calls:
+                    error_list.append({"entry": entries[i], "error": str(failed_calls[source])})
+                    failures.append((ids[i], str(failed_calls[source]), None, None))
+                    if run is not None:
+                        run.count("api_errors")
+                    continue
+                output, answer = decoded[source]
+                if answer.problem is None:
+                    passed.append((ids[i], answer.rows, output))
+                    if source == i:
+                        new_rows.append((keys[i], entries[i], output, answer.rows[0] if len(answer.rows) == 1 else answer.rows))
+                    continue
+                decode_stats.unresolved += 1
+                error_list.append({"entry": entries[i], "output": output, "error": answer.problem,
+                                   "repairs": list(answer.repairs)})
+                failures.append((ids[i], answer.problem, answer.rows, output))
+                if run is not None:
+                    run.count("parse_failures")
+                    run.event("parse_failure", job=ids[i], error=answer.problem, repairs=list(answer.repairs))
+
+            with timed(run, "cache_write"):
+                cache.put_many(new_rows)
+            queue.complete(passed)
+            queue.fail(failures, max_attempts)
+            if run is not None:
+                run.count("entries", len(claimed))
+                run.count("cached", len(done))
+                run.count("sent", len(sending))
+            progress_bar.update(len(claimed))
+
+def make_engine(args):
+    return RequestEngine(
+        load_client(args.base_url), model, generation_config,
+        concurrency=args.concurrency, rate=args.rate, max_rate=args.max_rate,
+        on_connection_error=lambda: wait_for_internet(pause_minutes=1),
+    )
 
-            for entry in main_entries[i:i+file_batch_size]:
-                wait_for_internet(pause_minutes=1)
-
-                try:
-                    response = client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt + str(entry),
-                        config=types.GenerateContentConfig(
-                            temperature=0,
-                            max_output_tokens=500,
-                            thinking_config=types.ThinkingConfig(thinking_budget=0)  # no chain-of-thought
-                        )
-                    )
-                    output = response.text.strip()
-                    results.append(output)
-                    time.sleep(1.2)  # rate limit
-
-                except Exception as e:
-                    error_list.append({"entry": entry, "error": str(e)})
-                    print(f"Error in batch {batch_num} on entry {i}: {e}")
-                    results.append({"input": entry, "output": "ERROR"})
-
-            # parse gemini's JSON responses
-            parsed = []
-            for j, entry in enumerate(results):
-                try:
-                    parsed.append(clean_parse(entry))
-                except Exception as err:
-                    error_list.append({"entry": entry, "error": str(err)})
-                    print(f"Error parsing entry {j}: {err}")
-                    parsed.append({})
-
-            # write batch CSV with original entry + page info + parsed fields
-            with open(batch_file, "w", newline="", encoding="utf-8") as f:
-                combined_rows = []
-                page_info_batch = main_entries_df.iloc[i:i+file_batch_size]
-
-                for idx, item in enumerate(parsed):
-                    original_entry = page_info_batch.iloc[idx]["entry"]
-                    page_num = page_info_batch.iloc[idx]["page_num"]
-                    doc_page_num = page_info_batch.iloc[idx]["doc_page_num"]
-
-                    if isinstance(item, dict):
-                        row = {**item, "original_entry": original_entry, "page_num": page_num, "doc_page_num": doc_page_num}
-                        combined_rows.append(row)
-                    elif isinstance(item, list):  # gemini sometimes returns a list of dicts
-                        for subitem in item:
-                            if isinstance(subitem, dict):
-                                row = {**subitem, "original_entry": original_entry, "page_num": page_num, "doc_page_num": doc_page_num}
-                                combined_rows.append(row)
-                            else:
-                                print("⚠️ Skipping unexpected subitem type:", type(subitem), subitem)
-                    else:
-                        print("⚠️ Skipping unexpected item type:", type(item), item)
-
-                final_fieldnames = ["original_entry", "page_num", "doc_page_num"] + fieldnames
-
-                writer = csv.DictWriter(f, fieldnames=final_fieldnames)
-                writer.writeheader()
-                for row in combined_rows:
-                    writer.writerow({k: row.get(k, "") for k in final_fieldnames})
-
-            progress_bar.update(len(main_entries[i:i+file_batch_size]))
-
-    mega_error_list.update({file_name: error_list})
-
-    # save errors after each year (so we don't lose them on crash)
-    error_list_filename = f"mega_error_list_{file_name}.json"
-    with open(error_list_filename, "w", encoding="utf-8") as f:
+def open_cache(args):
+    return ResponseCache(args.cache, max_bytes=int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None)
+
+def record_stats(run, engine_stats, cache, decode_stats):
+    """Copy engine, cache and decoding counters into the run log."""
+    decoding = decode_stats.summary()
+    for name in ("answers", "clean", "repaired", "failed", "reasked", "recovered_by_reask", "unresolved"):
+        run.count(f"decode_{name}", decoding[name])
+    for kind, count in decoding["repairs"].items():
+        run.count(f"repair_{kind}", count)
+    for name in ("calls", "retries", "throttled", "failures", "tokens_in", "tokens_out"):
+        run.count(f"api_{name}", getattr(engine_stats, name))
+    for latency in engine_stats.latencies:
+        run.observe("api_latency", latency)
+    run.count("cache_hits", cache.hits)
+    run.count("cache_misses", cache.misses)
+
+def print_stats(engine_summary, hits, misses, decoding):
+    print("Request stats:", engine_summary)
+    print(f"Cache: {hits} hits, {misses} misses")
+    print(f"Decoding: {decoding['answers']} answers, {decoding['clean']} clean, {decoding['repaired']} repaired "
+          f"({decoding['repair_rate']:.1%}), {decoding['failed']} failed checks; {decoding['reasked']} re-asked, "
+          f"{decoding['recovered_by_reask']} recovered, {decoding['unresolved']} unresolved")
+    if decoding["repairs"]:
+        print("  repairs:", decoding["repairs"])
+    if decoding["problems"]:
+        print("  problems:", decoding["problems"])
+
+def year_files(classified=False):
+    """(path, 'entries_YYYY') for each hand-corrected entries CSV, then (with classified) each classified
+    year that has no hand-corrected file."""
+    files = sorted(corrected_entries_directory.iterdir())
+    if classified and classified_directory.exists():
+        corrected = {file.name for file in files}
+        files += [file for file in sorted(classified_directory.iterdir()) if file.name not in corrected]
+    for file in files:
+
+        if file.name.startswith('.'):
+            continue
+
+        # extract year identifier like 'entries_1912'
+        file_name_regex = r"entries_[0-9]{4}"
+        file_name_match = re.findall(file_name_regex, str(file))
+        if not file_name_match:
+            print(f"⚠️ Skipping file with unexpected name format: {file.name}")
+            continue
+        yield file, file_name_match[0]
+
+async def queue_worker(args, run=None):
+    """One worker's share of the queue; returns what the parent reports."""
+    engine = make_engine(args)
+    cache = open_cache(args)
+    queue = JobQueue(args.queue)
+    error_list, decode_stats = [], DecodeStats()
+    try:
+        await work_queue(queue, engine, cache, error_list, args.pack, args.pack_token_budget, args.rule_threshold,
+                         run, args.reasks, decode_stats, args.claim, args.max_attempts)
+    finally:
+        queue.release()
+        queue.close()
+    if run is not None:
+        record_stats(run, engine.stats, cache, decode_stats)
+    cache.close()
+    return queue.worker, engine.stats.summary(), (cache.hits, cache.misses), decode_stats.summary(), error_list
+
+def queue_worker_process(args):
+    """Worker process entry point: the worker's results plus its run totals for the parent's log."""
+    run = RunLog("queue_worker", profile=args.profile)
+    result = asyncio.run(queue_worker(args, run))
+    return result, run.totals()
+
+async def main_queue(args, run):
+    """Enqueue every year's main entries, work the queue with args.workers processes, then rebuild the CSVs from it."""
+    queue = JobQueue(args.queue)
+    with timed(run, "load_entries"):
+        for file, file_name in year_files(args.classified):
+            added = queue.enqueue(file_name, load_main_entries(file, args.main_threshold))
+            print(f"{file_name}: {added} new jobs")
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = []
+            for result, totals in pool.map(queue_worker_process, [args] * args.workers):
+                results.append(result)
+                run.merge(totals)
+    else:
+        results = [await queue_worker(args, run)]
+
+    mega_error_list = {}
+    for worker, engine_summary, (hits, misses), decoding, error_list in results:
+        print(f"\nWorker {worker}")
+        print_stats(engine_summary, hits, misses, decoding)
+        mega_error_list[worker] = error_list
+    with open("mega_error_list_queue.json", "w", encoding="utf-8") as f:
         json.dump(mega_error_list, f, indent=2, ensure_ascii=False)
 
-print("Processing complete.")
+    # the CSVs are a view of the queue: rebuilt whole, whatever order the jobs finished in
+    with timed(run, "csv_write"):
+        for year in queue.counts():
+            materialise(queue, year, parsed_dataframe_directory, file_batch_size)
+    unfinished = queue.unfinished()
+    if unfinished:
+        print(f"{unfinished} jobs are still claimed by other workers; rerun or `job_queue.py materialise` once they finish")
+    queue.close()
+
+async def main(args):
+    # stage timings, API latency/retry/token counts and failures go to run_logs/llm_parser_<time>.jsonl
+    run = RunLog.create("llm_parser", profile=args.profile, pack=args.pack, concurrency=args.concurrency,
+                        rule_threshold=args.rule_threshold, queue=args.queue, workers=args.workers)
+    if args.queue:
+        await main_queue(args, run)
+        run.close()
+        print("Processing complete.")
+        return
+
+    engine = make_engine(args)
+    cache = open_cache(args)
+
+    mega_error_list = {}
+    decode_stats = DecodeStats()
+
+    # loop through each hand-corrected entries CSV
+    for file, file_name in year_files(args.classified):
+
+        error_list = []
+        started = time.perf_counter()
+        await parse_year(file, file_name, engine, cache, error_list, args.pack, args.pack_token_budget, args.rule_threshold,
+                         run, args.reasks, decode_stats, args.main_threshold)
+        run.event("year", year=file_name, seconds=round(time.perf_counter() - started, 6), errors=len(error_list))
+
+        mega_error_list.update({file_name: error_list})
+
+        # save errors after each year (so we don't lose them on crash)
+        error_list_filename = f"mega_error_list_{file_name}.json"
+        with open(error_list_filename, "w", encoding="utf-8") as f:
+            json.dump(mega_error_list, f, indent=2, ensure_ascii=False)
+
+    print_stats(engine.stats.summary(), cache.hits, cache.misses, decode_stats.summary())
+    record_stats(run, engine.stats, cache, decode_stats)
+    run.close()
+    cache.close()
+    print("Processing complete.")
+
+if __name__ == "__main__":
+    asyncio.run(main(argparse_create(sys.argv[1:])))
@@ -0,0 +1,166 @@
+"""Prompt, output fields and response parsing shared by the Gemini scripts."""
+import hashlib
+from google.genai import types
+from json_repair import parse_json, JSONRepairError
+
+model = "gemini-2.5-flash"
+generation_config = types.GenerateContentConfig(
+    temperature=0,
+    max_output_tokens=500,
+    thinking_config=types.ThinkingConfig(thinking_budget=0)  # no chain-of-thought
+)
+
+# output fields gemini returns
+fieldnames = ["opening_bits", "author(s)", "title", "format", "little_bits", "publisher", "date"]
+
+
+prompt = """
+Task:
+
+You are given raw publishing data. Each entry includes a title, author name, publisher, and publishing month and year. Your job is to extract the following:Output format: 
+
+{{
+"opening_bits": "",
+"author(s)":  "",
+"title": "",
+"format": "",
+"little_bits": "",
+"publisher": "",
+"date": ""
+}}
+
+Special instructions:
+* The publishing year is written in shorthand (e.g., '17), and all dates are from the 1900s. Do not convert '17 to 1917, just save it as '17.
+* Do not make any copy edits or corrections. Do not correct spelling, punctuation, or special characters.
+* If there are abbreviations, do not change those abbreviations. So Jan 17 should remain Jan 17.
+* Entries that start with a word followed by a dash instead of parentheses, with the author's first name included within, are entries without an author. Entries starting with words like “Admiralty”, “Army”, and “Acts” are words that appear at the beginning of the entries, but are not last names. Thus, entries such as “Acts-Grey seals (protection)” should have no author. Their title should be: “Acts-Grey seals (protection)”
+* The title field should contain the main descriptive name of the publication. Any information that directly modifies or describes the core title (e.g., editors, volumes, editions, or subtitles) and appears before the format (if a format is present) should be included in the title.
+* The little_bits field should capture any remaining descriptive information about the publication that is not part of the core title, author, publisher, or date. This includes, but is not limited to, page counts, dimensions, prices, series information, or specific publication notes. If a format is present, little_bits will contain information appearing after the format. If no format is present in the entry, any information that follows the main descriptive title and is not the publisher or date should be placed in little_bits.
+* The format is usually a number and a format type (fol, vo, to, mo). E.g., 12mo, 8vo. If there is 'Cr. ' before that, please include 'Cr. ' in the format too. E.g., Cr. 8vo.
+* In extremely rare instances, there are multiples month and years listed. For those cases, all the months in the date as a single string. Similarly, there is sometimes extra information between month and year like in “Jan., &c., '19.” Include all the extra in-between information in the date as well.
+* Maintain the order of the original entry. If what seems like an author name appears within the title, keep it as part of the title. Do not interpret that as author name.
+* When generating JSON, properly escape any quotation marks within text fields using backslashes (e.g., "title": "The book \"special\" chapter").
+
+Here are some example inputs and outputs:
+
+Example input:
+
+Abbott (E. W.)- The Colliery official's, work. man's and bill clerk's friend. 16mo. pp. 45 (South Shields : 49, Northcote St.) E. W. ABBOTT, Dec. '17
+
+Example output:
+
+{{
+"opening_bits": "",
+"author(s)":  "Abbott (E. W.)",
+"title": "The Colliery official's, work. man's and bill clerk's friend.",
+"format": "16mo.",
+"little_bits": "pp. 45 (South Shields : 49, Northcote St.)",
+"publisher": "E. W. ABBOTT",
+"date": "Dec. '17"
+}}
+
+
+—
+
+Example input: 
+
+Pollock (John)--War and revolution in Russia : sketches and studies. Cr. 8vo. 71 x 5, pp. 298, 6s. net . CONSTABLE, Mar '18
+
+Example output:
+
+{{
+"opening_bits": "",
+"author(s)":  "Pollock (John)",
+"title": "War and revolution in Russia : sketches and studies.",
+"format": "Cr. 8vo.",
+"little_bits": "71 x 5, pp. 298, 6s. net . ",
+"publisher": "CONSTABLE",
+"date": "Mar '18"
+}}
+
+—
+
+Example input:
+
+38. 6d. M. (D. R.)-A Silver lining. IS. net. Dec. 16
+
+Example output:
+
+{{
+"opening_bits": "38. 6d. ",
+"author(s)":  "M. (D. R.)",
+"title": "A Silver lining.",
+"format": "",
+"little_bits": "IS. net.",
+"publisher": "",
+"date": "Dec. 16"
+}}
+
+—
+
+Example input:
+. Qru mbino (J. C. F.)-Clairvoyance : the system of philosophy concerning the divinity of clair. voyance, also a treatise on divination and crystal reading. Cr. 8vo. 7} x 41, pp. 140, 25. 6d. net FOWLER, Mar. 15
+
+Example output:
+
+{{
+"opening_bits": ". ",
+"author(s)": "Qru mbino (J. C. F.)",
+"title": "Clairvoyance : the system of philosophy concerning the divinity of clair. voyance, also a treatise on divination and crystal reading.",
+"format": "Cr. 8vo.",
+"little_bits": "7} x 41, pp. 140, 25. 6d. net",
+"publisher": "FOWLER",
+"date": "Mar. 15"
+}}
+
+—
+
+Example input:
+Admiralty-Hydrographic. China Sea pilot. Vol. I, 1916 : Rev. Supp., 1918. Vol. 2, 1915 : Rev. supp., 1918. Vol. 3, 1912 : Rev. supp. (11), 1918. Vol. 4, 1912 : Rev. supp. (2), 1917. Vol. 5, 1912 : Rev. slipp. (11), 1918 POTTER, Oct., Feb., June, Apr. '18
+
+Example output:
+
+{{
+"opening_bits": "",
+"author(s)": "",
+"title": "Admiralty-Hydrographic. China Sea pilot. Vol. I, 1916 : Rev. Supp., 1918. Vol. 2, 1915 : Rev. supp., 1918. Vol. 3, 1912 : Rev. supp. (11), 1918. Vol. 4, 1912 : Rev. supp. (2), 1917. Vol. 5, 1912 : Rev. slipp. (11), 1918",
+"format": "",
+"little_bits": "",
+"publisher": "POTTER",
+"date": "Oct., Feb., June, Apr. '18"
+}}
+
+—
+
+Example input:
+Some facts relating to internal respiration, from personal observation covering a period of over torty years, 1866-1910. By “ H. B." 71 x 5, pp. 62, 2s.6d. net (Portobello, N.B.: 11, Rosefield Pl.) J. THOMSON, Feb. '18
+
+
+Example output:
+
+{{
+"opening_bits": "",
+"author(s)": "",
+"title": "Some facts relating to internal respiration, from personal observation covering a period of over torty years, 1866-1910. By \" H. B.\"",
+"format": "",
+"little_bits": "71 x 5, pp. 62, 2s.6d. net (Portobello, N.B.: 11, Rosefield Pl.)",
+"publisher": "J. THOMSON",
+"date": "Feb. '18"
+}}
+
+—
+
+Now here is the real input:
+
+"""
+
+# changes whenever the prompt text does, so answers to an old prompt are never reused
+prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def clean_parse(entry_str):
+    """Parse gemini's JSON output; fences, surrounding prose and common JSON slips are tolerated (json_repair.py)."""
+    try:
+        return parse_json(entry_str)[0]
+    except JSONRepairError as e:
+        raise ValueError(f"Clean parse failed: {e}")
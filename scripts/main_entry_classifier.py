@@ -0,0 +1,236 @@
+"""Score entries as main entries (the full record llm_parser.py sends to Gemini) or not.
+
+Main entries carry the whole record: "Surname (Initials)-Title. Cr. 8vo.
+7½ x 5, pp. N, price PUBLISHER, Mon. YY". Everything else in the catalogue
+is a short title or subject cross-reference ("Title, Author (X.) price
+Mon. YY", "... See ...") that repeats a main entry. The classifier is a
+logistic regression over a handful of regex features, each computed for a
+whole column at once with pandas' vectorised string methods, trained on the
+main_entry flags of entries/hand_corrected_entries (1912-1922). Its output
+is a confidence in [0, 1].
+
+    python main_entry_classifier.py train                 # fit on every flagged year, save main_entry_model.json
+    python main_entry_classifier.py evaluate --test-years 1920 1921 1922
+    python main_entry_classifier.py flag --years 02 03    # entries/classified_entries/entries_19YY.csv
+
+`flag` turns extracted_entries CSVs (which have no flag) into the
+hand-corrected layout plus a main_entry_confidence column, for
+llm_parser.py --classified.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from functools import lru_cache
+
+model_path = Path(__file__).parent / "main_entry_model.json"
+hand_corrected_directory = Path.cwd().parent / 'entries' / 'hand_corrected_entries'
+extracted_directory = Path.cwd().parent / 'entries' / 'extracted_entries'
+classified_directory = Path.cwd().parent / 'entries' / 'classified_entries'
+
+FLAGGED_YEARS = [str(year) for year in range(1912, 1923)]
+
+MONTHS = r"(?:Jan|Feb|Mar|Apr|May|June?|July?|Aug|Sept?|Oct|Nov|Dec)"
+DATE_END = r"{m}[.,]?(?:\s*(?:[-–,]|&c\.,?)\s*(?:{m}[.,]?)?)*\s*['‘’]?\s*[0-9Il]{{2}}\.?\s*$".format(m=MONTHS)
+PUBLISHER = r"[A-Z][A-Z.&'’\-]+(?:\s+(?:&|[A-Z][A-Z.&'’\-]*|Co\.?|Ltd\.?|Sons?|Bros\.?|PR\.?))*"
+PAGE_TAG = r"<PAGE_NUM:([0-9]{0,3})><DOCUMENT_PAGE_NUM:([0-9]{0,3})>"
+
+# name -> regex searched in each entry; all groups are non-capturing so str.contains takes them as they are
+PATTERNS = {
+    "publisher_date": r"(?:^|[\s.,])" + PUBLISHER + r"\s*,?\s*\.*\s*" + DATE_END,
+    "date_end": DATE_END,
+    "see": r"\bSee\b",
+    "format": r"(?:^|\s)(?:\d{1,3}(?:mo|vo|to)|[Ff]ol(?:io)?)[.,]?(?=\s|$)",
+    "author_dash": r"^[^\s(]+(?:\s[^\s(]+){0,3}\s?\([^()]{1,60}\)\s*(?:ed\.)?\s*(?:-|—|–|‒)",
+    "pages": r"\bpp\.?\s*\d",
+    "dimensions": r"\d\s*[xX×]\s*\d",
+    "cross_author": r",\s+[A-Z][\w'’\-]+(?:\s[A-Z][\w'’\-]+)?\s\([^()]{1,40}\)",
+    "quoted_heading": r"^\W*[\"“]",
+}
+
+
+def features(entries):
+    """Feature matrix (rows x features) for a Series of entry strings, plus the feature names."""
+    text = entries.fillna("").astype(str).str.replace(PAGE_TAG, "", regex=True).str.strip()
+    columns = {name: text.str.contains(pattern, regex=True).to_numpy(dtype=np.float64)
+               for name, pattern in PATTERNS.items()}
+    length = text.str.len().to_numpy(dtype=np.float64)
+    columns["log_length"] = np.log1p(length)
+    columns["commas"] = text.str.count(",").to_numpy(dtype=np.float64) / np.maximum(length, 1) * 100
+    columns["capitals"] = text.str.count(r"[A-Z]").to_numpy(dtype=np.float64) / np.maximum(length, 1)
+    names = list(columns)
+    return np.column_stack([columns[name] for name in names]), names
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def fit(x, y, l2=1e-3, iterations=25):
+    """Logistic regression by Newton's method on standardised features; returns the model as plain data."""
+    mean, scale = x.mean(axis=0), x.std(axis=0)
+    scale[scale == 0] = 1.0
+    z = np.column_stack([np.ones(len(x)), (x - mean) / scale])
+    weights = np.zeros(z.shape[1])
+    penalty = l2 * np.eye(z.shape[1])
+    penalty[0, 0] = 0.0  # the intercept isn't shrunk
+    for _ in range(iterations):
+        p = sigmoid(z @ weights)
+        gradient = z.T @ (p - y) / len(y) + penalty @ weights
+        hessian = (z * (p * (1 - p))[:, None]).T @ z / len(y) + penalty
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return {"mean": mean.tolist(), "scale": scale.tolist(), "weights": weights.tolist()}
+
+
+def predict(model, x):
+    """Main-entry confidence for each row of a feature matrix."""
+    z = (x - np.asarray(model["mean"])) / np.asarray(model["scale"])
+    weights = np.asarray(model["weights"])
+    return sigmoid(weights[0] + z @ weights[1:])
+
+
+def read_flagged(years):
+    """Entries and their hand-corrected main_entry flags (rows without a flag dropped)."""
+    frames = []
+    for year in years:
+        # named by position: the 1913 file's header repeats "entry" for the page columns
+        df = pd.read_csv(hand_corrected_directory / f"entries_{year}.csv", dtype=str, keep_default_na=False,
+                         header=0, names=["entry", "ecb_issue", "page_num", "doc_page_num", "main_entry"])
+        frames.append(df[df["main_entry"].isin(["TRUE", "FALSE"])].assign(year=year))
+    df = pd.concat(frames, ignore_index=True)
+    return df["entry"], (df["main_entry"] == "TRUE").to_numpy(dtype=np.float64), df["year"]
+
+
+def train(years=FLAGGED_YEARS):
+    entries, labels, _ = read_flagged(years)
+    x, names = features(entries)
+    return {"features": names, "trained_on": list(years), **fit(x, labels)}
+
+
+@lru_cache(maxsize=None)
+def load_model(path=model_path):
+    """The saved model, trained (and saved) on every flagged year the first time it's needed."""
+    if Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    model = train()
+    save_model(model, path)
+    return model
+
+
+def save_model(model, path=model_path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=1)
+
+
+def score_entries(entries, model=None):
+    """Main-entry confidence for a Series (or list) of entries."""
+    model = model or load_model()
+    x, names = features(pd.Series(entries, dtype=object))
+    if names != model["features"]:
+        raise ValueError(f"{model_path} was trained on other features; run `python main_entry_classifier.py train`")
+    return predict(model, x)
+
+
+def evaluate(model, entries, labels, threshold=0.5):
+    """Accuracy, precision, recall, F1 and ROC AUC of the model's scores against the flags."""
+    scores = score_entries(entries, model)
+    predicted = scores >= threshold
+    truth = labels.astype(bool)
+    tp, fp, fn = (predicted & truth).sum(), (predicted & ~truth).sum(), (~predicted & truth).sum()
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    # AUC as the chance a random main entry outscores a random other entry (rank-sum)
+    ranks = pd.Series(scores).rank().to_numpy()
+    positives, negatives = truth.sum(), (~truth).sum()
+    auc = (ranks[truth].sum() - positives * (positives + 1) / 2) / (positives * negatives)
+    return {"entries": len(truth), "accuracy": float((predicted == truth).mean()), "precision": float(precision),
+            "recall": float(recall), "f1": float(2 * precision * recall / (precision + recall)), "auc": float(auc),
+            "false_positives": int(fp), "false_negatives": int(fn)}
+
+
+def read_extracted(year_string):
+    """An extracted_entries CSV in the hand-corrected layout, page numbers taken from each entry's tag."""
+    entries = pd.read_csv(extracted_directory / f"entries_19{year_string}.csv", header=None, names=["entry"],
+                          dtype=str, keep_default_na=False, skip_blank_lines=False)["entry"]
+    pages = entries.str.extract(PAGE_TAG)
+    df = pd.DataFrame({"entry": entries.str.replace(PAGE_TAG, "", regex=True).str.strip(),
+                       "ecb_issue": f"19{year_string}", "page_num": pages[0].fillna(""),
+                       "doc_page_num": pages[1].fillna("")})
+    return df[df["entry"] != ""].reset_index(drop=True)
+
+
+def flag_year(year_string, threshold=0.5, model=None):
+    """read_extracted plus main_entry (confidence >= threshold) and main_entry_confidence."""
+    df = read_extracted(year_string)
+    confidence = score_entries(df["entry"], model)
+    df["main_entry"] = confidence >= threshold
+    df["main_entry_confidence"] = confidence.round(4)
+    return df
+
+
+def print_scores(name, scores):
+    print(f"{name:<18}{scores['entries']:>9}{scores['accuracy']:>10.4f}{scores['precision']:>11.4f}"
+          f"{scores['recall']:>8.4f}{scores['f1']:>8.4f}{scores['auc']:>8.4f}"
+          f"{scores['false_positives']:>8}{scores['false_negatives']:>8}")
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Train, evaluate or apply the main-entry classifier.')
+    parser.add_argument("command", choices=["train", "evaluate", "flag"])
+    parser.add_argument("--test-years", type=str, nargs="+",
+            help="evaluate: flagged years held out of training.",
+            default=["1920", "1921", "1922"])
+    parser.add_argument("--years", type=str, nargs="+",
+            help="flag: two-digit years of extracted_entries to classify.",
+            default=["{:02d}".format(year) for year in range(2, 12)])
+    parser.add_argument("--threshold", type=float,
+            help="Confidence at or above which an entry counts as a main entry.",
+            default=0.5)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    header = f"{'':<18}{'entries':>9}{'accuracy':>10}{'precision':>11}{'recall':>8}{'F1':>8}{'AUC':>8}{'FP':>8}{'FN':>8}"
+
+    if args.command == "train":
+        model = train()
+        save_model(model)
+        entries, labels, _ = read_flagged(FLAGGED_YEARS)
+        print(header)
+        print_scores("training years", evaluate(model, entries, labels, args.threshold))
+        print(f"Saved {model_path}")
+
+    elif args.command == "evaluate":
+        train_years = [year for year in FLAGGED_YEARS if year not in args.test_years]
+        model = train(train_years)
+        entries, labels, years = read_flagged(FLAGGED_YEARS)
+        print(f"Trained on {', '.join(train_years)}\n{header}")
+        held_out = years.isin(args.test_years).to_numpy()
+        print_scores("training years", evaluate(model, entries[~held_out], labels[~held_out], args.threshold))
+        for year in args.test_years:
+            mask = (years == year).to_numpy()
+            print_scores(year, evaluate(model, entries[mask], labels[mask], args.threshold))
+        print_scores("held out", evaluate(model, entries[held_out], labels[held_out], args.threshold))
+
+        start = time.perf_counter()
+        score_entries(entries, model)
+        seconds = time.perf_counter() - start
+        print(f"\nScored {len(entries)} entries in {seconds:.2f}s ({len(entries) / seconds:,.0f} entries/s)")
+
+    else:
+        classified_directory.mkdir(parents=True, exist_ok=True)
+        model = load_model()
+        for year_string in args.years:
+            df = flag_year(year_string, args.threshold, model)
+            df.to_csv(classified_directory / f"entries_19{year_string}.csv", index=False)
+            print(f"19{year_string}: {int(df['main_entry'].sum())} of {len(df)} entries flagged as main entries")
@@ -0,0 +1,126 @@
+"""Columnar copy of the parsed catalogue data, one Parquet file per year.
+
+`compact` merges each year's batch CSVs from llm_parser.py into
+parsed_dataframes/parquet/catalogue_year=YYYY/part-0.parquet. Empty fields
+become nulls, the "nan" the batch writer leaves for a missing entry or page
+number is read as missing too, and page numbers are integers. Entries added
+by hand during correction have "ADDED" instead of page numbers; they get null
+pages and hand_added set. publisher, format and date are dictionary encoded
+(pandas categoricals on load).
+
+`load_parsed` reads the store back through a memory-mapped Arrow dataset,
+reading only the requested columns and year partitions:
+
+    from parsed_store import load_parsed
+    df = load_parsed()
+    df = load_parsed(columns=["title", "publisher"], years=range(1915, 1919))
+
+    python parsed_store.py compact
+    python parsed_store.py info
+    python parsed_store.py export all_entries.csv
+"""
+import os, sys, time, argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from pathlib import Path
+from llm_prompt import fieldnames
+
+parsed_directory = Path.cwd().parent / 'parsed_dataframes'
+store_directory = parsed_directory / 'parquet'
+
+categorical_fields = ["format", "publisher", "date"]
+page_fields = ["page_num", "doc_page_num"]
+columns = ["original_entry"] + page_fields + ["hand_added"] + fieldnames
+
+schema = pa.schema(
+    [("original_entry", pa.string())]
+    + [(field, pa.int32()) for field in page_fields]
+    + [("hand_added", pa.bool_())]
+    + [(field, pa.dictionary(pa.int32(), pa.string()) if field in categorical_fields else pa.string())
+       for field in fieldnames])
+partitioning = ds.partitioning(pa.schema([("catalogue_year", pa.int16())]), flavor="hive")
+
+
+def batch_files(year_directory):
+    """A year's batch CSVs in batch order (batch_2 before batch_10)."""
+    return sorted(Path(year_directory).glob("*_batch_*.csv"), key=lambda path: int(path.stem.rsplit("_", 1)[1]))
+
+
+def read_batches(year_directory):
+    """One year's batch CSVs as a single dataframe with the store's dtypes."""
+    na_values = {column: [""] for column in columns}
+    for column in ["original_entry"] + page_fields:
+        na_values[column] = ["", "nan"]  # write_batch's str() of a missing value
+    df = pd.concat([pd.read_csv(batch_file, dtype=str, keep_default_na=False, na_values=na_values)
+                    for batch_file in batch_files(year_directory)], ignore_index=True)
+    df["hand_added"] = df["page_num"].str.upper().eq("ADDED").fillna(False).astype(bool)
+    for field in page_fields:
+        df[field] = pd.to_numeric(df[field].mask(df["hand_added"])).astype("Int32")
+    for field in categorical_fields:
+        df[field] = df[field].astype("category")
+    return df[columns]
+
+
+def compact_year(year, directory=parsed_directory, store=store_directory):
+    """Rewrite one year's partition from its batch CSVs. Returns the row count."""
+    df = read_batches(Path(directory) / f"entries_{year}")
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    partition = Path(store) / f"catalogue_year={year}"
+    partition.mkdir(parents=True, exist_ok=True)
+    temporary = partition / "part-0.parquet.tmp"
+    pq.write_table(table, temporary, use_dictionary=True, compression="zstd")
+    os.replace(temporary, partition / "part-0.parquet")
+    return len(df)
+
+
+def stored_years(store=store_directory):
+    return sorted(int(path.name.split("=")[1]) for path in Path(store).glob("catalogue_year=*"))
+
+
+def load_parsed(columns=None, years=None, store=store_directory):
+    """The store as a pandas dataframe.
+
+    columns: the columns to read (catalogue_year can be one of them), or all.
+    years: an iterable of catalogue years to read, or all; other partitions
+    are never opened.
+    """
+    dataset = ds.dataset(str(store), format="parquet", partitioning=partitioning,
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    year_filter = None if years is None else ds.field("catalogue_year").isin([int(year) for year in years])
+    return dataset.to_table(columns=columns, filter=year_filter).to_pandas()
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Build and inspect the Parquet copy of parsed_dataframes.')
+    parser.add_argument("command", choices=["compact", "info", "export"])
+    parser.add_argument("path", nargs="?",
+            help="CSV file to write for export.")
+    parser.add_argument("--years", type=str, nargs="+",
+            default=[str(year) for year in range(1912, 1923)])
+    parser.add_argument("--directory", type=str, default=str(parsed_directory))
+    parser.add_argument("--store", type=str, default=str(store_directory))
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    if args.command == "compact":
+        for year in args.years:
+            start = time.perf_counter()
+            rows = compact_year(year, args.directory, args.store)
+            print(f"{year}: {rows} entries in {time.perf_counter() - start:.2f}s")
+
+    elif args.command == "export":
+        df = load_parsed(years=args.years, store=args.store)
+        df.to_csv(args.path, index=False)
+        print(f"Exported {len(df)} entries to {args.path}")
+
+    years = stored_years(args.store)
+    size = sum(path.stat().st_size for path in Path(args.store).rglob("*.parquet"))
+    print(f"{len(years)} years ({', '.join(map(str, years))}), {size / 1024 / 1024:.1f} MB in {args.store}")
@@ -0,0 +1,128 @@
+"""Pack several catalogue entries into one Gemini request.
+
+The few-shot prompt is ~1.5k tokens and an entry is ~50, so one-entry calls
+spend almost all their input on repeated instructions. A packed request sends
+the instructions once, lists K entries as "[i] entry" lines, and asks for a
+JSON array of objects carrying each entry's index. Any index that is missing,
+duplicated or malformed in the answer is re-sent on its own with the normal
+single-entry prompt, so packing never loses an entry.
+"""
+import json, hashlib
+from llm_prompt import prompt, fieldnames, generation_config, clean_parse
+
+INPUT_MARKER = "Now here is the real input:"
+PACKED_MARKER = "Now here are the real inputs, one per line, each starting with its index in square brackets:"
+
+packed_instructions = """
+* You will be given several entries at once. Parse each entry on its own, exactly as if it were the only input.
+* Return a JSON array with one object per entry, in the same order as the input. Each object has an "index" key holding the entry's number in square brackets, plus the seven keys of the output format.
+* Return every index exactly once, even if an entry looks empty or malformed.
+
+"""
+
+# instructions + examples, shared by every packed request
+packed_prompt_head = prompt[:prompt.rindex(INPUT_MARKER)] + packed_instructions + PACKED_MARKER + "\n\n"
+packed_prompt_version = hashlib.sha256(packed_prompt_head.encode("utf-8")).hexdigest()[:12]
+
+# per-entry output allowance: single-entry calls get 500 tokens
+output_tokens_per_entry = generation_config.max_output_tokens
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) for sizing packs offline."""
+    return len(text) // 4 + 1
+
+
+def pack_entries(entries, max_entries, token_budget):
+    """Group (index, entry) pairs into packs of at most max_entries whose prompt fits token_budget.
+
+    An entry too large for the budget on its own still gets a pack of one.
+    """
+    packs, pack, pack_tokens = [], [], estimate_tokens(packed_prompt_head)
+    for index, entry in entries:
+        line_tokens = estimate_tokens(f"[{index}] {entry}\n")
+        if pack and (len(pack) >= max_entries or pack_tokens + line_tokens > token_budget):
+            packs.append(pack)
+            pack, pack_tokens = [], estimate_tokens(packed_prompt_head)
+        pack.append((index, entry))
+        pack_tokens += line_tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def build_packed_prompt(pack):
+    """The full request text for one pack of (index, entry) pairs."""
+    return packed_prompt_head + "".join(f"[{index}] {entry}\n" for index, entry in pack)
+
+
+def packed_config(max_entries):
+    """generation_config with room for max_entries answers."""
+    return generation_config.model_copy(update={"max_output_tokens": output_tokens_per_entry * max_entries})
+
+
+def split_packed_response(response_text, pack):
+    """Match a packed answer back to its entries.
+
+    Returns ({index: single-entry JSON string}, [indices to retry alone]). An
+    index is retried if the whole answer fails to parse, or its object is
+    missing, repeated, or not a dict.
+    """
+    expected = [index for index, _ in pack]
+    try:
+        items = clean_parse(response_text)
+    except ValueError:
+        return {}, expected
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return {}, expected
+
+    answers, seen = {}, set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(str(item.get("index", "")).strip("[] "))
+        except ValueError:
+            continue
+        if index in seen:
+            answers.pop(index, None)  # ambiguous: retry it alone
+            continue
+        seen.add(index)
+        answers[index] = json.dumps({k: item.get(k, "") for k in fieldnames}, ensure_ascii=False)
+
+    answers = {index: answer for index, answer in answers.items() if index in expected}
+    return answers, [index for index in expected if index not in answers]
+
+
+async def generate_packed(engine, entries, max_entries, token_budget, progress=None):
+    """Parse entries K at a time, falling back to one call per entry for anything a pack misses.
+
+    Returns (outputs, retried) where outputs lines up with entries: a JSON
+    string per entry, or the exception that ended its single-entry retries.
+    """
+    indexed = list(enumerate(str(entry) for entry in entries))
+    packs = pack_entries(indexed, max_entries, token_budget)
+
+    responses = await engine.generate_all([build_packed_prompt(pack) for pack in packs],
+                                          config=packed_config(max_entries))
+
+    outputs = [None] * len(indexed)
+    retry = []
+    for pack, response in zip(packs, responses):
+        if isinstance(response, Exception):
+            answers, missing = {}, [index for index, _ in pack]
+        else:
+            answers, missing = split_packed_response(response, pack)
+        for index, answer in answers.items():
+            outputs[index] = answer
+        retry.extend(missing)
+        if progress is not None:
+            progress.update(len(answers))
+
+    singles = await engine.generate_all([prompt + indexed[index][1] for index in retry], progress=progress)
+    for index, output in zip(retry, singles):
+        outputs[index] = output
+
+    return outputs, len(retry)
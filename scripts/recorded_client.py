@@ -0,0 +1,65 @@
+"""Offline stand-in for genai.Client that replays recorded Gemini answers.
+
+The parsed_dataframes batch CSVs are Gemini's answers to the single-entry
+prompt, so they double as a recorded-response fixture: RecordedClient looks
+each entry up there and answers single and packed prompts in the same JSON
+shapes the real model uses. Latency is simulated from the output size, and
+`drop_rate` leaves entries out of packed answers to exercise the retry path.
+"""
+import re, json, random, asyncio
+import pandas as pd
+from pathlib import Path
+from google.genai import types
+from llm_prompt import fieldnames
+from prompt_packing import INPUT_MARKER, PACKED_MARKER, estimate_tokens
+
+PACKED_LINE_RE = re.compile(r"^\[(\d+)\] (.*)$", flags=re.M)
+
+
+def load_recordings(parsed_directory):
+    """Map original_entry -> parsed fields for every batch CSV under parsed_directory."""
+    recordings = {}
+    for batch_file in sorted(Path(parsed_directory).glob("entries_*/entries_*_batch_*.csv")):
+        batch_df = pd.read_csv(batch_file, dtype=str, keep_default_na=False)
+        for row in batch_df.to_dict("records"):
+            recordings.setdefault(row["original_entry"], {k: row.get(k, "") for k in fieldnames})
+    return recordings
+
+
+class RecordedClient:
+    """Answers client.aio.models.generate_content from recordings; no network involved."""
+
+    def __init__(self, recordings, latency=0.0, per_token_latency=0.0, drop_rate=0.0, seed=0):
+        self.recordings = recordings
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.aio = self  # so client.aio.models.generate_content resolves here
+        self.models = self
+
+    def answer(self, entry):
+        return self.recordings.get(entry) or {**{k: "" for k in fieldnames}, "title": entry}
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        if PACKED_MARKER in contents:
+            items = []
+            for index, entry in PACKED_LINE_RE.findall(contents.split(PACKED_MARKER)[-1]):
+                if self.random.random() >= self.drop_rate:
+                    items.append({"index": int(index), **self.answer(entry)})
+            text = "```json\n" + json.dumps(items, ensure_ascii=False, indent=1) + "\n```"
+        else:
+            entry = contents.split(INPUT_MARKER)[-1].strip()
+            text = "```json\n" + json.dumps(self.answer(entry), ensure_ascii=False, indent=0) + "\n```"
+
+        tokens_out = estimate_tokens(text)
+        if self.latency or self.per_token_latency:
+            await asyncio.sleep(self.latency + self.per_token_latency * tokens_out)
+
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=estimate_tokens(contents), candidates_token_count=tokens_out),
+        )
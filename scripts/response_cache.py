@@ -0,0 +1,199 @@
+"""Content-addressed on-disk cache of Gemini responses.
+
+Each response is stored under a hash of (model, prompt version, generation
+config, entry text), so an entry only costs a call the first time that exact
+text is parsed with that exact prompt and config, no matter which batch or
+year file it lands in. Entries live in a SQLite file with their raw response
+and parsed JSON; the least recently used ones are evicted once the cache grows
+past `max_bytes`. `export`/`import` move entries as JSON lines.
+
+    python response_cache.py stats
+    python response_cache.py export cache.jsonl
+    python response_cache.py import cache.jsonl
+    python response_cache.py evict --max-mb 200
+    python response_cache.py seed ../parsed_dataframes
+"""
+import sys, json, time, sqlite3, hashlib, argparse, itertools
+import pandas as pd
+from pathlib import Path
+from llm_prompt import model, generation_config, prompt_version, fieldnames
+
+default_cache_path = Path(__file__).parent / "response_cache.sqlite"
+
+
+def cache_key(model, prompt_version, config, entry):
+    """sha256 over everything that can change the model's answer for one entry."""
+    config_json = config.model_dump(mode="json", exclude_none=True) if hasattr(config, "model_dump") else config
+    payload = json.dumps([model, prompt_version, config_json, entry], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with LRU eviction by total size."""
+
+    def __init__(self, path=default_cache_path, max_bytes=None):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                entry TEXT NOT NULL,
+                raw TEXT NOT NULL,
+                parsed TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def get_many(self, keys):
+        """{key: (raw, parsed)} for every cached key; marks them as recently used."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT key, raw, parsed FROM responses WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, raw, parsed in rows:
+                found[key] = (raw, json.loads(parsed))
+        if found:
+            now = time.time()
+            self.db.executemany("UPDATE responses SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.db.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, rows):
+        """Store (key, entry, raw, parsed) rows, then evict down to max_bytes."""
+        now = time.time()
+        records = []
+        for key, entry, raw, parsed in rows:
+            parsed_json = json.dumps(parsed, ensure_ascii=False)
+            size = len(entry.encode("utf-8")) + len(raw.encode("utf-8")) + len(parsed_json.encode("utf-8"))
+            records.append((key, entry, raw, parsed_json, size, now, now))
+        self.db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+        self.db.commit()
+        if self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def size(self):
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return count, total
+
+    def evict(self, max_bytes):
+        """Drop least recently used responses until the cache holds at most max_bytes. Returns rows dropped."""
+        _, total = self.size()
+        if total <= max_bytes:
+            return 0
+        dropped, excess = [], total - max_bytes
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if excess <= 0:
+                break
+            dropped.append((key,))
+            excess -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", dropped)
+        self.db.commit()
+        return len(dropped)
+
+    def export(self, jsonl_path):
+        """Write every cached response as one JSON object per line. Returns the count."""
+        count = 0
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for key, entry, raw, parsed, created in self.db.execute(
+                    "SELECT key, entry, raw, parsed, created FROM responses ORDER BY created"):
+                f.write(json.dumps({"key": key, "entry": entry, "raw": raw, "parsed": json.loads(parsed),
+                                    "created": created}, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_(self, jsonl_path):
+        """Load responses written by export(); existing keys are overwritten. Returns the count."""
+        rows = []
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    rows.append((record["key"], record["entry"], record["raw"], record["parsed"]))
+        self.put_many(rows)
+        return len(rows)
+
+    def seed_from_batches(self, parsed_directory, model=model, prompt_version=prompt_version, config=generation_config):
+        """Treat existing parsed batch CSVs as cached answers, every row of a split entry included. Returns the count."""
+        rows = []
+        for entry, parsed in batch_answers(parsed_directory).items():
+            answer = parsed[0] if len(parsed) == 1 else parsed
+            rows.append((cache_key(model, prompt_version, config, entry), entry, json.dumps(answer, ensure_ascii=False),
+                         answer))
+        self.put_many(rows)
+        return len(rows)
+
+    def check_seeded(self, parsed_directory, model=model, prompt_version=prompt_version, config=generation_config):
+        """Entries the batch CSVs split into several rows whose cached answer doesn't hold all of them."""
+        from response_decoder import cached_rows
+        split = {entry: parsed for entry, parsed in batch_answers(parsed_directory).items() if len(parsed) > 1}
+        keys = {cache_key(model, prompt_version, config, entry): entry for entry in split}
+        found = self.get_many(keys)
+        return [entry for key, entry in keys.items()
+                if key not in found or cached_rows(found[key][1]) != split[entry]]
+
+
+def batch_answers(parsed_directory):
+    """{original_entry: [parsed rows]} from parsed batch CSVs, the first time each entry appears.
+
+    An entry's rows are consecutive in its batch file; identical consecutive
+    rows are the same entry text repeated, not a split, and count once.
+    """
+    answers = {}
+    for batch_file in sorted(Path(parsed_directory).glob("entries_*/entries_*_batch_*.csv")):
+        batch_df = pd.read_csv(batch_file, dtype=str, keep_default_na=False)
+        for entry, group in itertools.groupby(batch_df.to_dict("records"), key=lambda row: row["original_entry"]):
+            if entry in answers:
+                continue
+            parsed = [{k: row.get(k, "") for k in fieldnames} for row in group]
+            answers[entry] = [row for i, row in enumerate(parsed) if row not in parsed[:i]]
+    return answers
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Inspect and move the Gemini response cache.')
+    parser.add_argument("command", choices=["stats", "export", "import", "evict", "seed"])
+    parser.add_argument("path", nargs="?",
+            help="JSONL file for export/import, parsed_dataframes directory for seed.")
+    parser.add_argument("--cache", type=str, default=str(default_cache_path))
+    parser.add_argument("--max-mb", type=float,
+            help="Size to evict down to.",
+            default=None)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    cache = ResponseCache(args.cache)
+
+    if args.command == "export":
+        print(f"Exported {cache.export(args.path)} responses to {args.path}")
+    elif args.command == "import":
+        print(f"Imported {cache.import_(args.path)} responses from {args.path}")
+    elif args.command == "seed":
+        print(f"Seeded {cache.seed_from_batches(args.path)} responses from {args.path}")
+        # entries the model split into several books must come back whole, not as their first row
+        incomplete = cache.check_seeded(args.path)
+        if incomplete:
+            cache.close()
+            sys.exit(f"{len(incomplete)} split entries lost rows in the cache, e.g. {incomplete[0][:80]!r}")
+    elif args.command == "evict":
+        print(f"Evicted {cache.evict(int(args.max_mb * 1024 * 1024))} responses")
+
+    count, total = cache.size()
+    print(f"{count} responses, {total / 1024 / 1024:.1f} MB in {args.cache}")
+    cache.close()
@@ -0,0 +1,157 @@
+"""Decode and check Gemini's answer for one entry before it is cached or written.
+
+decode_answer(output, entry) returns a Decoded(rows, repairs, problem):
+
+1. JSON: json_repair.parse_json, which fixes unescaped quotes, trailing
+   junk, single quotes and the like; an answer cut off by the token limit
+   is a problem, since its last field may be incomplete.
+2. Schema: an object, or a list of objects when the model split a merged
+   entry, each holding the seven llm_prompt.fieldnames as strings. Missing
+   fields become "", None becomes "", numbers become strings and known
+   aliases ("author", "authors") are renamed; other keys are dropped, which
+   step 3 catches if they held text.
+3. Conservation: the letters and digits of every field, concatenated in
+   order, must equal the entry's. The same characters in another order pass
+   (noted "reordered"), as do up to max_changed characters gained or lost
+   (noted "altered"). Anything more means text was lost or invented.
+
+problem is None when the answer passes; otherwise it is "<check>: <detail>"
+for the first failed check (undecodable, schema, truncated, conservation),
+and llm_parser.py asks again for that entry. rows is what can still
+be written either way (None only when nothing could be decoded).
+"""
+import re
+from collections import Counter, namedtuple
+from json_repair import parse_json, JSONRepairError
+from llm_prompt import fieldnames
+
+Decoded = namedtuple("Decoded", ["rows", "repairs", "problem"])
+
+FIELD_ALIASES = {"author": "author(s)", "authors": "author(s)"}
+CONSERVED_RE = re.compile(r"[\W_]+")
+
+
+def conserved_text(text):
+    """Lowercase letters and digits only: what a parse must keep from the entry."""
+    return CONSERVED_RE.sub("", text).lower()
+
+
+def check_row(item, repairs):
+    """item as a dict of the seven string fields, or None if it is not an object."""
+    if not isinstance(item, dict):
+        return None
+    row = {}
+    for key, value in item.items():
+        key = FIELD_ALIASES.get(key, key)
+        if key not in fieldnames:
+            if key != "index":  # packed answers carry their entry's index
+                repairs.append("extra_field")
+            continue
+        if value is None:
+            value = ""
+        elif not isinstance(value, str):
+            repairs.append("non_string_field")
+            value = str(value)
+        row[key] = value
+    if len(row) < len(fieldnames):
+        repairs.append("missing_field")
+    return {key: row.get(key, "") for key in fieldnames}
+
+
+def check_rows(value, repairs):
+    """(rows, problem) for a decoded value."""
+    items = value if isinstance(value, list) else [value]
+    if isinstance(value, list):
+        repairs.append("list_wrapped" if len(items) == 1 else "split_entry")
+    rows = [check_row(item, repairs) for item in items]
+    if not rows or any(row is None for row in rows):
+        return None, "schema: not a JSON object per entry"
+    return rows, None
+
+
+def conservation_problem(entry, rows, repairs, max_changed=2):
+    """None if rows keep the entry's text, else what went wrong."""
+    expected = conserved_text(str(entry))
+    found = conserved_text("".join(row[key] for row in rows for key in fieldnames))
+    if found == expected:
+        return None
+    lost, added = Counter(expected) - Counter(found), Counter(found) - Counter(expected)
+    lost, added = sum(lost.values()), sum(added.values())
+    if not lost and not added:
+        repairs.append("reordered")
+        return None
+    if max(lost, added) <= max_changed:
+        repairs.append("altered")
+        return None
+    return f"conservation: lost {lost} and added {added} characters of the entry"
+
+
+def decode_answer(output, entry, max_changed=2):
+    """Decoded rows, repairs and problem (None if it passes) for one entry's answer text."""
+    repairs = []
+    try:
+        value, json_repairs = parse_json(output)
+    except JSONRepairError as error:
+        return Decoded(None, (), f"undecodable: {error}")
+    repairs.extend(json_repairs)
+
+    rows, problem = check_rows(value, repairs)
+    if problem is None and "truncated" in repairs:
+        problem = "truncated: the answer was cut off"
+    if problem is None:
+        problem = conservation_problem(entry, rows, repairs, max_changed)
+    return Decoded(rows, tuple(dict.fromkeys(repairs)), problem)
+
+
+def cached_rows(parsed):
+    """Rows from a cached parse (a dict, or a list from before answers were checked), or None if malformed."""
+    rows, problem = check_rows(parsed, [])
+    return rows if problem is None else None
+
+
+def better(first, second, entry):
+    """The more usable of two Decoded answers for entry: a pass, else whichever lost less text."""
+    for decoded in (first, second):
+        if decoded.problem is None:
+            return decoded
+    if first.rows is None or second.rows is None:
+        return first if second.rows is None else second
+
+    def kept(decoded):
+        found = Counter(conserved_text("".join(row[key] for row in decoded.rows for key in fieldnames)))
+        return sum((Counter(conserved_text(str(entry))) & found).values())
+    return second if kept(second) > kept(first) else first
+
+
+class DecodeStats:
+    """How many answers passed as sent, passed after repair, were re-asked, and stayed unresolved."""
+
+    def __init__(self):
+        self.answers = 0
+        self.clean = 0
+        self.repaired = 0
+        self.failed = 0
+        self.repairs = Counter()
+        self.problems = Counter()
+        self.reasked = 0
+        self.recovered = 0
+        self.unresolved = 0
+
+    def record(self, decoded):
+        self.answers += 1
+        self.repairs.update(decoded.repairs)
+        if decoded.problem is not None:
+            self.failed += 1
+            self.problems[decoded.problem.split(":")[0]] += 1
+        elif decoded.repairs:
+            self.repaired += 1
+        else:
+            self.clean += 1
+
+    def summary(self):
+        return {
+            "answers": self.answers, "clean": self.clean, "repaired": self.repaired, "failed": self.failed,
+            "repair_rate": round(self.repaired / self.answers, 4) if self.answers else 0.0,
+            "reasked": self.reasked, "recovered_by_reask": self.recovered, "unresolved": self.unresolved,
+            "repairs": dict(self.repairs.most_common()), "problems": dict(self.problems.most_common()),
+        }
@@ -0,0 +1,117 @@
+"""Deterministic regex parser for the common catalogue entry shape.
+
+Most main entries look like
+
+    Surname (Initials)-Title. Cr. 8vo. 7½ x 5, pp. N, price net PUBLISHER, Mon. 'YY
+
+and can be cut into the seven llm_prompt.fieldnames without a model call:
+the date is anchored at the end, the publisher is the run of capitals before
+it, the author is a leading "Name (...)" followed by a dash, and the first
+format token (8vo, Cr. 8vo., 4to, fol. ...) divides title from little_bits.
+
+parse_entry also returns a confidence in [0, 1]. Every piece that had to be
+guessed, or looks like an entry the prompt treats specially (cross references,
+leading junk, no format), lowers it; llm_parser.py sends only entries below
+its threshold to Gemini.
+"""
+import re
+from llm_prompt import fieldnames
+
+MONTHS = r"(?:Jan|Feb|Mar|Apr|May|June?|July?|Aug|Sept?|Oct|Nov|Dec)"
+
+# "Mar. 12", "Mar '18", "Jan.-Dec. 12", "Oct., Feb., June, Apr. '18", "Jan., &c.,'18"
+DATE_RE = re.compile(
+    r"(?P<date>{m}[.,]?(?:\s*(?:[-–,]|&c\.,?)\s*(?:{m}[.,]?)?)*\s*'?[0-9Il]{{2}}\.?)\s*$".format(m=MONTHS))
+
+# capitals (with &, Co., Ltd., initials) up to the comma before the date;
+# comma-joined names ("SCOTT, GREENWOOD", "HODGES, FIGGIS") are one publisher
+PUBLISHER_WORD = r"(?:[A-Z][A-Z.&'’\-]*|Co\.?|Ltd\.?|Sons?|Bros\.?)"
+PUBLISHER_NAME = r"[A-Z][A-Z.&'’\-]*(?:\s+(?:&|{w}))*".format(w=PUBLISHER_WORD)
+PUBLISHER_RE = re.compile(
+    r"(?:^|(?<=[\s.]))(?P<publisher>{n}(?:,\s+{n})*)\s*,?\s*$".format(n=PUBLISHER_NAME))
+
+# "IS." / "1S." are OCR'd shilling prices, not the start of a publisher
+PRICE_WORD_RE = re.compile(r"^(?:[I1lT]S|is|Is)\.?\s+")
+
+# "Surname (Initials)-", "Qru mbino (J. C. F.)--", "Hodson (James) —", "Bersey, (W. C.) ed.-",
+# "Arey (A. L.) and Bryant (F. L.)-"
+AUTHOR_NAME = r"[A-Z][^\s()\-—–.,]*[.,]?(?:\s[A-Za-z'][^\s()\-—–,]*){0,3}\s?\([^()]{1,60}\)(?:\s?ed\.)?"
+AUTHOR_RE = re.compile(
+    r"^(?P<author>{n}(?:,?\s(?:and|&)\s{n})?)\s*(?P<dash>-+|—|–|‒)?\s*".format(n=AUTHOR_NAME))
+
+FORMAT_RE = re.compile(
+    r"(?:^|(?<=\s))(?P<format>(?:(?i:Cr|Crown|Imp|Roy|Ryl|Sm|Fcap|Fcp|Med|Demy|Post|Pott|Lg|Large|Obl|Oblong|gr|Sq|La|Ex|Super|Atlas)\.?\s+)*"
+    r"(?:\d{1,3}(?:mo|vo|to)|Fol|fol|Folio)[.,]?)(?=\s|$)")
+
+# things the prompt handles specially, which the rules do not try to
+CROSS_REFERENCE_RE = re.compile(r"\bSee\b")
+OPENING_JUNK_RE = re.compile(r"^[^A-Za-z(]")
+HEADING_DASH_RE = re.compile(r"^[^()]{0,50}?[-—–_]|^[^()]{0,40}\(")  # "Admiralty-", "Batty (J. A. Staunton-Our"
+CORPORATE_AUTHOR_RE = re.compile(r"\((?:[^()]*\sof|Royal|[^()]*Society[^()]*)\)")  # "(Department of)"
+SHOUTED_WORD_RE = re.compile(r"^[A-Z][A-Z']+\s")  # "BRADSHAW'S Brackenbury (G.)": a stray heading
+MERGED_DATE_RE = re.compile(r"{}\.?,?\s*'?[0-9Il]{{2}}\b".format(MONTHS))  # a second entry's date mid-text
+COUNT_BEFORE_FORMAT_RE = re.compile(r"\b\d+\s+(?:col\.\s+)?(?:illus|plates?|maps?|vols?)\.?,?$", flags=re.I)
+STRAY_TAIL_RE = re.compile(r"\s(?:[^\w\s]+|[A-Z]\.?)$")  # "herself. .", "Dorothy Gale. C." before an OCR'd format
+
+
+def parse_entry(entry):
+    """Split one entry into the seven fields; returns (fields, confidence)."""
+    fields = {k: "" for k in fieldnames}
+    text = str(entry).strip()
+    confidence = 1.0
+
+    date_match = DATE_RE.search(text)
+    if not date_match:
+        return fields, 0.0
+    fields["date"] = date_match.group("date")
+    body = text[:date_match.start()].rstrip()
+
+    publisher_match = PUBLISHER_RE.search(body)
+    if publisher_match and len(publisher_match.group("publisher").strip(".&'’- ")) >= 2:
+        publisher = publisher_match.group("publisher").rstrip()
+        price = PRICE_WORD_RE.match(publisher)
+        start = publisher_match.start() + (price.end() if price else 0)
+        fields["publisher"] = body[start:publisher_match.start() + len(publisher)]
+        body = body[:start].rstrip()
+    else:
+        confidence -= 0.5
+
+    if OPENING_JUNK_RE.match(body):
+        confidence -= 0.5
+    if MERGED_DATE_RE.search(body):
+        confidence -= 0.5
+
+    author_match = AUTHOR_RE.match(body)
+    if author_match:
+        fields["author(s)"] = author_match.group("author")
+        if not author_match.group("dash"):
+            confidence -= 0.2
+        if CORPORATE_AUTHOR_RE.search(author_match.group("author")) or SHOUTED_WORD_RE.match(author_match.group("author")):
+            confidence -= 0.5  # society/department headings go either way
+        body = body[author_match.end():]
+    elif HEADING_DASH_RE.match(body):
+        confidence -= 0.5  # "Admiralty-..." has no author, "Aristophanes.—..." does; OCR'd brackets too
+
+    format_match = FORMAT_RE.search(body)
+    if format_match:
+        fields["title"] = body[:format_match.start()].rstrip()
+        fields["format"] = format_match.group("format")
+        fields["little_bits"] = body[format_match.end():].strip()
+        if COUNT_BEFORE_FORMAT_RE.search(fields["title"]) or STRAY_TAIL_RE.search(fields["title"]):
+            confidence -= 0.3
+    else:
+        fields["title"] = body
+        confidence -= 0.4
+
+    if not fields["title"]:
+        confidence -= 0.5
+    if CROSS_REFERENCE_RE.search(fields["title"]):
+        confidence -= 0.4
+
+    return fields, max(confidence, 0.0)
+
+
+def parse_entries(entries):
+    """parse_entry over a sequence: ([fields], [confidence])."""
+    results = [parse_entry(entry) for entry in entries]
+    return [fields for fields, _ in results], [confidence for _, confidence in results]
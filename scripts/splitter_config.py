@@ -0,0 +1,200 @@
+"""Per-year splitter config for create_entries.py, read from splitters.json.
+
+Each year has a front pattern (the entries start after its first match), an
+appendix pattern (they end at its first match after that), the OCR variants
+of its two-digit year that close an entry, and optionally its own
+header_patterns; otherwise the top-level header_patterns are used, with
+{year} replaced by the two-digit year.
+
+The file is parsed and validated once per process, compiling every regex so
+a typo fails at load rather than partway through a run. `compile` saves the
+validated config to splitters.pickle, which later runs load instead while
+splitters.json is unchanged.
+
+    python splitter_config.py check
+    python splitter_config.py compile
+    python splitter_config.py validate --years 12 18
+"""
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import pickle
+import hashlib
+import argparse
+from pathlib import Path
+from collections import namedtuple
+from functools import lru_cache
+
+config_path = Path(__file__).parent / "splitters.json"
+cache_path = config_path.with_suffix(".pickle")
+
+YEAR_KEY_RE = re.compile(r"^\d{2}$")
+
+YearSplitters = namedtuple("YearSplitters", ["front", "appendix", "year_variants", "header_patterns"])
+
+
+class SplitterConfigError(ValueError):
+    pass
+
+
+def compile_checked(pattern, where, flags=0):
+    if not isinstance(pattern, str) or not pattern:
+        raise SplitterConfigError(f"{where}: expected a non-empty regex string, got {pattern!r}")
+    try:
+        return re.compile(pattern, flags)
+    except re.error as error:
+        raise SplitterConfigError(f"{where}: {error} in {pattern!r}") from None
+
+
+def parse_config(config):
+    """{year_string: YearSplitters} from the decoded JSON, raising SplitterConfigError on any problem."""
+    if not isinstance(config, dict) or not isinstance(config.get("years"), dict):
+        raise SplitterConfigError('expected an object with a "years" object')
+    unknown = set(config) - {"header_patterns", "years"}
+    if unknown:
+        raise SplitterConfigError(f"unknown top-level keys: {sorted(unknown)}")
+    default_headers = config.get("header_patterns", [])
+
+    splitters = {}
+    for year_string, year in config["years"].items():
+        where = f"years.{year_string}"
+        if not YEAR_KEY_RE.match(year_string):
+            raise SplitterConfigError(f"{where}: years are keyed by two digits")
+        if not isinstance(year, dict):
+            raise SplitterConfigError(f"{where}: expected an object")
+        missing = {"front", "appendix", "year_variants"} - set(year)
+        unknown = set(year) - {"front", "appendix", "year_variants", "header_patterns", "note"}
+        if missing or unknown:
+            raise SplitterConfigError(f"{where}: missing {sorted(missing)}, unknown {sorted(unknown)}")
+
+        variants = year["year_variants"]
+        if not isinstance(variants, list) or not variants or not all(isinstance(v, str) and v for v in variants):
+            raise SplitterConfigError(f"{where}.year_variants: expected a non-empty list of strings")
+        headers = year.get("header_patterns", default_headers)
+        if not isinstance(headers, list):
+            raise SplitterConfigError(f"{where}.header_patterns: expected a list")
+        headers = [header.replace("{year}", year_string) if isinstance(header, str) else header
+                   for header in headers]
+
+        compile_checked(year["front"], f"{where}.front")
+        compile_checked(year["appendix"], f"{where}.appendix", re.DOTALL)
+        compile_checked("|".join(variants), f"{where}.year_variants")
+        for i, header in enumerate(headers):
+            compile_checked(header, f"{where}.header_patterns[{i}]", re.MULTILINE)
+
+        splitters[year_string] = YearSplitters(year["front"], year["appendix"], tuple(variants), tuple(headers))
+    return splitters
+
+
+def config_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_splitters(path=config_path, cached=cache_path):
+    """{year_string: YearSplitters}, from the compiled cache if it matches splitters.json, else parsed and validated."""
+    data = Path(path).read_bytes()
+    digest = config_digest(data)
+    if cached is not None and os.path.exists(cached):
+        with open(cached, "rb") as f:
+            saved = pickle.load(f)
+        if saved["digest"] == digest:
+            return {year_string: YearSplitters(*fields) for year_string, fields in saved["splitters"].items()}
+    try:
+        config = json.loads(data)
+    except json.JSONDecodeError as error:
+        raise SplitterConfigError(f"{path}: {error}") from None
+    return parse_config(config)
+
+
+def year_splitters(year_string):
+    try:
+        return load_splitters()[year_string]
+    except KeyError:
+        raise SplitterConfigError(f"no splitters for year {year_string} in {config_path}") from None
+
+
+def save_compiled(path=config_path, cached=cache_path):
+    data = Path(path).read_bytes()
+    splitters = parse_config(json.loads(data))
+    temporary = Path(str(cached) + ".tmp")
+    with open(temporary, "wb") as f:
+        # plain tuples, so the pickle loads whichever module defined YearSplitters
+        fields = {year_string: tuple(year) for year_string, year in splitters.items()}
+        pickle.dump({"digest": config_digest(data), "splitters": fields}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    temporary.replace(cached)
+    return splitters
+
+
+def validate_year(year_string, cwd_path):
+    """Where one year's front and appendix patterns match in its OCR file, without splitting any entries."""
+    from create_entries import compile_year_patterns, get_file_path, iter_page_spans, match_splitters, open_ocr
+
+    started = time.perf_counter()
+    report = {"year": year_string, "error": None}
+    patterns = compile_year_patterns(year_string, year_splitters(year_string).header_patterns)
+    with open_ocr(get_file_path(year_string, cwd_path)) as mm:
+        spans = list(iter_page_spans(mm))
+        starts = [start for start, _ in spans]
+        front, next_front, appendix = match_splitters(mm, spans, patterns)
+
+    report.update({"file_pages": len(spans), "front": front, "next_front": next_front, "appendix": appendix})
+    if front is None:
+        report["error"] = "front pattern has no match"
+    elif appendix is None:
+        report["error"] = "appendix pattern has no match after the front match"
+    elif next_front and appendix[1] > next_front[0]:
+        report["error"] = "front pattern matches again before the appendix"
+    if front is not None:
+        report["front_page"] = bisect.bisect_right(starts, front[0])
+    if appendix is not None:
+        report["appendix_page"] = bisect.bisect_right(starts, appendix[0])
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def print_validation(reports):
+    print(f"{'year':<6}{'pages':>6}{'front at':>18}{'appendix at':>20}{'body pages':>12}{'seconds':>9}  problem")
+    for report in reports:
+        front = f"{report['front'][0]} (p.{report['front_page']})" if report["front"] else "-"
+        appendix = f"{report['appendix'][0]} (p.{report['appendix_page']})" if report["appendix"] else "-"
+        body = report["appendix_page"] - report["front_page"] + 1 if report["front"] and report["appendix"] else "-"
+        print(f"19{report['year']:<4}{report['file_pages']:>6}{front:>18}{appendix:>20}{body:>12}"
+              f"{report['seconds']:>9.2f}  {report['error'] or ''}")
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Check, compile or validate the splitter config against the OCR files.')
+    parser.add_argument("command", choices=["check", "compile", "validate"])
+    parser.add_argument("--years", type=str, nargs="+",
+            help="Two-digit catalogue years to validate.",
+            default=None)
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+
+    try:
+        if args.command == "compile":
+            splitters = save_compiled()
+            print(f"Compiled {len(splitters)} years to {cache_path}")
+            sys.exit()
+        splitters = load_splitters(cached=None)
+    except SplitterConfigError as error:
+        sys.exit(f"Invalid splitter config: {error}")
+
+    if args.command == "check":
+        print(f"{config_path.name}: {len(splitters)} years, all patterns compile")
+        sys.exit()
+
+    from create_entries import YEAR_STRINGS
+    cwd_path = os.path.abspath(os.getcwd()).replace("scripts", "")
+    reports = [validate_year(year_string, cwd_path) for year_string in args.years or YEAR_STRINGS]
+    print_validation(reports)
+    if any(report["error"] for report in reports):
+        sys.exit("Some years' splitters don't locate the body.")
@@ -0,0 +1,109 @@
+import sys, json, time, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# the stub answers anything after this marker (the tail of llm_parser.prompt)
+INPUT_MARKER = "Now here is the real input:"
+
+
+def argparse_create(args):
+    parser = argparse.ArgumentParser(description='Local stand-in for the Gemini generateContent endpoint.')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float,
+            help="Mean seconds spent on each request.",
+            default=0.2)
+    parser.add_argument("--quota", type=float,
+            help="Requests/sec served before answering 429 RESOURCE_EXHAUSTED (0 = unlimited).",
+            default=0)
+    return parser.parse_args(args)
+
+
+def stub_parse(entry):
+    """A stand-in model answer: the whole entry as the title, in the JSON shape gemini returns."""
+    fields = {"opening_bits": "", "author(s)": "", "title": entry, "format": "",
+              "little_bits": "", "publisher": "", "date": ""}
+    return "```json\n" + json.dumps(fields, ensure_ascii=False, indent=0) + "\n```"
+
+
+class QuotaWindow:
+    """One-second sliding window of accepted request times, shared by handler threads."""
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.accepted = []
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.quota:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.accepted = [t for t in self.accepted if now - t < 1.0]
+            if len(self.accepted) >= self.quota:
+                return False
+            self.accepted.append(now)
+            return True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse connections
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        server.requests += 1
+
+        if not server.quota_window.allow():
+            server.throttled += 1
+            self.send_json(429, {"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Stub quota exceeded.",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}],
+            }})
+            return
+
+        text = "".join(part.get("text", "") for content in request.get("contents", [])
+                       for part in content.get("parts", []))
+        answer = server.answer(text.split(INPUT_MARKER)[-1].strip())
+
+        if server.latency:
+            time.sleep(random.expovariate(1 / server.latency))
+
+        self.send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": answer}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": len(text) // 4, "candidatesTokenCount": len(answer) // 4},
+        })
+
+
+def start_stub_server(port=0, latency=0.2, quota=0, answer=stub_parse):
+    """Serve the stub on a background thread; returns (server, base_url). Call server.shutdown() to stop."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.quota_window = QuotaWindow(quota)
+    server.answer = answer
+    server.requests = 0
+    server.throttled = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+
+    args = argparse_create(sys.argv[1:])
+    server, base_url = start_stub_server(args.port, args.latency, args.quota)
+    print(f"Stub model server on {base_url} (latency {args.latency}s, quota {args.quota or 'unlimited'}/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()